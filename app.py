@@ -13,8 +13,12 @@ if "messages" not in st.session_state:
     st.session_state.messages = []
 if "last_uploaded_file" not in st.session_state:
     st.session_state.last_uploaded_file = None
-if "pdf_context" not in st.session_state:
-    st.session_state.pdf_context = None
+if "session_id" not in st.session_state:
+    st.session_state.session_id = None  # Assigned by the backend on the first response
+if "upload_ids" not in st.session_state:
+    st.session_state.upload_ids = {}  # Uploader file ID -> upload_id the backend returned for it
+if "doc_ids" not in st.session_state:
+    st.session_state.doc_ids = {}  # Uploader file ID -> doc_id of that PDF, sent only while it stays attached
 
 # Display chat history
 for message in st.session_state.messages:
@@ -29,6 +33,8 @@ for message in st.session_state.messages:
 
 # File uploader
 uploaded_file = st.file_uploader("Upload an image or PDF (optional)", type=["jpg", "jpeg", "png", "pdf"])
+if not uploaded_file:
+    st.session_state.doc_ids.clear()  # Removed from the uploader: later questions are not about it
 
 # Chat input
 user_input = st.chat_input("Enter your query...")
@@ -53,28 +59,48 @@ if user_input:
         message_placeholder = st.empty()
         message_placeholder.write("Processing...")
 
-        # Prepare request payload
-        history = json.dumps([{"role": msg["role"], "content": msg["content"]} for msg in st.session_state.messages])
+        # Prepare request payload (the backend keeps the history for this session)
         data = {
             "query": user_input if user_input else "Analyze the uploaded file.",
-            "history": history,
-            "pdf_context": st.session_state.pdf_context
+            "session_id": st.session_state.session_id,
+            "doc_id": st.session_state.doc_ids.get(uploaded_file.file_id) if uploaded_file else None
         }
         
+        # Send a file once; while it stays in the uploader, later messages refer to it by upload_id
         files = None
-        if uploaded_file:
-            files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
+        upload_id = st.session_state.upload_ids.get(uploaded_file.file_id) if uploaded_file else None
+        if upload_id:
+            data["upload_id"] = upload_id
+        elif uploaded_file:
+            uploaded_file.seek(0)
+            files = {"file": (uploaded_file.name, uploaded_file, uploaded_file.type)}
 
-        # Get response from backend
+        # Stream the response from the backend, rendering text as it arrives
+        bot_response = ""
+        sources = []
         try:
-            response = requests.post(f"{API_URL}/query/", data=data, files=files)
-            response_data = response.json()
-            bot_response = response_data.get("response", "No response received.")
-            sources = response_data.get("sources", [])
-            
-            if "pdf_context" in response_data:
-                st.session_state.pdf_context = response_data["pdf_context"]
-                
+            with requests.post(f"{API_URL}/query/stream", data=data, files=files, stream=True) as response:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if event.get("type") == "delta":
+                        bot_response += event["text"]
+                        message_placeholder.markdown(bot_response + "▌")
+                        continue
+                    if "error" in event:  # Plan/upload errors, or a plain 413 for an oversized file
+                        bot_response = f"⚠️ {event['error']}"
+                        if upload_id and event.get("status") == 404:  # Expired on the server: send it again
+                            st.session_state.upload_ids.pop(uploaded_file.file_id, None)
+                    else:
+                        bot_response = event.get("response", bot_response) or "No response received."
+                        sources = event.get("sources", [])
+                        if uploaded_file and "doc_id" in event:
+                            st.session_state.doc_ids[uploaded_file.file_id] = event["doc_id"]
+                        if uploaded_file and "upload_id" in event:
+                            st.session_state.upload_ids[uploaded_file.file_id] = event["upload_id"]
+                    if "session_id" in event:
+                        st.session_state.session_id = event["session_id"]
         except requests.exceptions.RequestException as e:
             bot_response = f"⚠️ Backend Error: {str(e)}"
             sources = []
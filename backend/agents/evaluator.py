@@ -1,25 +1,50 @@
 import sys
 import os
+import hashlib
 
 # Add the project root to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
 from backend.gpt_handler import evaluate_plan_with_gpt4o
+from backend.tools.semantic_cache import FOLLOW_UP, normalize_query
+from backend.agents.plan_graph import validate_steps
+from backend.utils.telemetry import traced
 
 class EvaluatingAgent:
-    """Evaluates the plan using GPT-4o-mini to determine its validity."""
+    """Validates plans and answers repeated queries from the session's memoised results."""
 
+    # Follow-ups whose meaning depends on the conversation so far ("tell me more", "why is that?")
+    # are never answered from the memo: repeating one asks for something new.
+    FOLLOW_UP = FOLLOW_UP
+
+    @traced("evaluator.evaluate")
     def evaluate(self, plan, history=None):
-        """Evaluates the plan using prior messages for better decision-making."""
-        history = history or []
+        """Checks the plan is executable; returns it, or an error dict."""
+        if plan.get("tool") == "dag":
+            try:
+                validate_steps(plan.get("steps", []))
+            except ValueError as e:
+                return {"error": str(e)}
+        return plan  # Otherwise, proceed normally
 
-        tool = plan.get("tool")
-        data = plan.get("data")
+    @staticmethod
+    def memo_key(query, doc_id=None):
+        """Hash of the normalised query (and the document it is about)."""
+        return hashlib.sha1(f"{normalize_query(query)}\0{doc_id or ''}".encode("utf-8")).hexdigest()
 
-        # If it's a GPT-based response, check for repeated queries in history
-        if tool == "gpt":
-            last_messages = " ".join([msg["content"] for msg in history[-5:]])
-            if data in last_messages:
-                return {"error": "This query was already answered recently."}
+    @traced("evaluator.recall")
+    def recall(self, query, history=None, doc_id=None):
+        """The answer this session already got for the same query, looked up by hash."""
+        if not hasattr(history, "recall") or self.FOLLOW_UP.search(query):
+            return None
+        return history.recall(self.memo_key(query, doc_id))
 
-        return plan  # Otherwise, proceed normally
+    def remember(self, query, history, result, doc_id=None):
+        """Memoise a successful answer so a repeat is served without planning or model calls."""
+        response = result.get("response", "")
+        if not hasattr(history, "remember") or not response or response.startswith(("❌", "⚠️")):
+            return
+        if self.FOLLOW_UP.search(query):
+            return
+        memo = {k: v for k, v in result.items() if k != "session_id"}
+        history.remember(self.memo_key(query, doc_id), memo)
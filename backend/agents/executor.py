@@ -1,20 +1,32 @@
 import sys
 import os
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
 # Add the project root to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
-from backend.tools.image_tools import process_image_with_gpt4o
-from backend.gpt_handler import process_with_gpt4o
-from backend.tools.pdf_tools import process_pdf_with_gpt4o
-from backend.tools.wiki_tool import search_wikipedia, fetch_full_page
+from backend.tools.image_tools import identify_species, aidentify_species, astream_identify_species
+from backend.gpt_handler import process_with_gpt4o, aprocess_with_gpt4o, astream_with_gpt4o
+from backend.tools.pdf_tools import process_pdf_with_gpt4o, aprocess_pdf_with_gpt4o, astream_pdf_with_gpt4o
+from backend.tools.pdf_index import retrieve_pdf_context
+from backend.utils.telemetry import traced
+from backend.agents.plan_graph import (
+    PLAN_STEP_TIMEOUT, validate_steps, final_steps, resolve_data, blocked_by
+)
+from backend.tools.wiki_tool import (
+    search_wikipedia, fetch_full_page, batch_page_details,
+    asearch_wikipedia, afetch_full_page, abatch_page_details
+)
 
 class ExecutingAgent:
     """Executes the validated plan and retrieves results."""
 
+    @traced("executor.execute")
     def execute(self, plan, history=None):
         """Executes the validated plan based on the tool selection"""
-        history = history or []
         response = {"response": "", "sources": []}
 
         try:
@@ -22,19 +34,23 @@ class ExecutingAgent:
             data = plan.get("data")
             file_type = plan.get("file_type")
 
+            if tool == "dag":
+                return self.combine_dag_results(plan, self.run_dag(plan, history))
+
             if tool == "gpt":
-                response["response"] = process_with_gpt4o(data)
+                response["response"] = process_with_gpt4o(data, plan.get("user_query"))
             
             elif tool == "image":
                 if file_type:
-                    response["response"] = process_image_with_gpt4o(data, file_type)
+                    response["response"] = identify_species(data, file_type, plan.get("user_query", "Identify this species."))
                 else:
                     response["response"] = "❌ Missing file type for image processing"
             
             elif tool == "pdf":
                 extracted_text = data.get("extracted_text", "")
                 user_query = data.get("user_query", "Summarize this document.")
-                response["response"] = process_pdf_with_gpt4o(extracted_text, user_query)
+                context = retrieve_pdf_context(extracted_text, user_query, data.get("doc_id"))
+                response["response"] = process_pdf_with_gpt4o(context, user_query)
             
             elif tool == "wiki":
                 result = search_wikipedia(data)
@@ -44,11 +60,80 @@ class ExecutingAgent:
                 response["sources"] = [result["url"]]
             
             elif tool == "wiki_full":
-                result = fetch_full_page(data)
+                result = fetch_full_page(data, plan.get("user_query"))
                 if "error" in result:
-                    return self.fallback_response(data, result)
+                    return self.fallback_response(plan.get("user_query", data), result)
+                response["response"] = self.format_full_wiki(result)
+                response["sources"] = [result["url"]]
+
+            elif tool == "wiki_batch":
+                results = batch_page_details(data)
+                for name, result in results.items():
+                    if "error" in result:  # Not an exact title; fall back to search
+                        results[name] = search_wikipedia(name)
+                response["response"] = self.format_wiki_batch(results)
+                response["sources"] = [r["url"] for r in results.values() if "url" in r]
+            
+            else:
+                response["response"] = "❌ Unknown tool selected"
+
+        except Exception as e:
+            response["response"] = f"⚠️ Execution Error: {str(e)}"
+
+        return {
+            "response": response["response"],
+            "sources": response.get("sources", [])
+        }
+
+    @traced("executor.execute")
+    async def aexecute(self, plan, history=None):
+        """Async variant of `execute`: awaits tool I/O so concurrent requests overlap"""
+        response = {"response": "", "sources": []}
+
+        try:
+            tool = plan.get("tool")
+            data = plan.get("data")
+            file_type = plan.get("file_type")
+
+            if tool == "dag":
+                return self.combine_dag_results(plan, await self.arun_dag(plan, history))
+
+            if tool == "gpt":
+                response["response"] = await aprocess_with_gpt4o(data, plan.get("user_query"))
+            
+            elif tool == "image":
+                if file_type:
+                    response["response"] = await aidentify_species(data, file_type, plan.get("user_query", "Identify this species."))
+                else:
+                    response["response"] = "❌ Missing file type for image processing"
+            
+            elif tool == "pdf":
+                extracted_text = data.get("extracted_text", "")
+                user_query = data.get("user_query", "Summarize this document.")
+                context = await asyncio.to_thread(retrieve_pdf_context, extracted_text, user_query, data.get("doc_id"))
+                response["response"] = await aprocess_pdf_with_gpt4o(context, user_query)
+            
+            elif tool == "wiki":
+                result = await asearch_wikipedia(data)
+                if "error" in result:
+                    return await self.afallback_response(data, result)
+                response["response"] = self.format_wiki_summary(result)
+                response["sources"] = [result["url"]]
+            
+            elif tool == "wiki_full":
+                result = await afetch_full_page(data, plan.get("user_query"))
+                if "error" in result:
+                    return await self.afallback_response(plan.get("user_query", data), result)
                 response["response"] = self.format_full_wiki(result)
                 response["sources"] = [result["url"]]
+
+            elif tool == "wiki_batch":
+                results = await abatch_page_details(data)
+                misses = [name for name, result in results.items() if "error" in result]
+                searched = await asyncio.gather(*(asearch_wikipedia(name) for name in misses))
+                results.update(zip(misses, searched))
+                response["response"] = self.format_wiki_batch(results)
+                response["sources"] = [r["url"] for r in results.values() if "url" in r]
             
             else:
                 response["response"] = "❌ Unknown tool selected"
@@ -56,15 +141,201 @@ class ExecutingAgent:
         except Exception as e:
             response["response"] = f"⚠️ Execution Error: {str(e)}"
 
-        # Update chat history
-        history.append({"role": "assistant", "content": response["response"]})
-        
         return {
             "response": response["response"],
-            "sources": response.get("sources", []),
-            "history": history
+            "sources": response.get("sources", [])
         }
 
+    def run_dag(self, plan, history=None):
+        """Sync variant of `arun_dag`, with each step's `execute` in a worker thread.
+
+        Works whether or not the calling thread already runs an event loop
+        (FastAPI handlers, notebooks). A timed-out step's thread cannot be
+        stopped; its result is dropped when it finishes.
+        """
+        steps = validate_steps(plan["steps"])
+        results, pending, running = {}, list(steps), {}
+        pool = ThreadPoolExecutor(max_workers=len(steps), thread_name_prefix="plan-step")
+        try:
+            while pending or running:
+                for step in [s for s in pending if all(d in results for d in s.get("depends_on", []))]:
+                    pending.remove(step)
+                    blocked = blocked_by(step, results)
+                    if blocked:
+                        results[step["id"]] = {"error": f"skipped because step '{blocked}' failed"}
+                        continue
+                    timeout = float(step.get("timeout", PLAN_STEP_TIMEOUT))
+                    context = contextvars.copy_context()  # Keeps the step's spans in the request's trace
+                    future = pool.submit(context.run, self.execute, self._step_input(step, results), history)
+                    running[future] = (step, timeout, time.monotonic() + timeout)
+                if not running:
+                    continue  # Skipped steps may have unblocked others
+                done, _ = wait(running, timeout=max(0.0, min(d for _, _, d in running.values()) - time.monotonic()),
+                               return_when=FIRST_COMPLETED)
+                for future in list(running):
+                    step, timeout, deadline = running[future]
+                    if future in done:
+                        results[step["id"]] = self._step_result(future.result())
+                    elif time.monotonic() >= deadline:
+                        results[step["id"]] = {"error": f"timed out after {timeout:g}s"}
+                    else:
+                        continue
+                    del running[future]
+        finally:
+            pool.shutdown(wait=False)
+        return results
+
+    async def arun_dag(self, plan, history=None, skip=()):
+        """Runs a multi-step plan, each step as soon as its dependencies are done.
+
+        Independent steps run concurrently. Every step has its own timeout;
+        a failed or timed-out step is recorded as ``{"error": ...}``. A step
+        whose whole input is that failed result is skipped, since it would have
+        nothing to run on (see `blocked_by`); steps that only mention it in
+        their text still run and see "(unavailable: ...)".
+        Returns ``{step_id: result}``; steps listed in ``skip`` are not run.
+        """
+        steps = validate_steps(plan["steps"])
+        results, tasks = {}, {}
+
+        async def run(step):
+            dependencies = [tasks[d] for d in step.get("depends_on", []) if d in tasks]
+            if dependencies:
+                await asyncio.gather(*dependencies)
+            results[step["id"]] = await self._arun_step(step, results, history)
+
+        for step in steps:  # Topological order, so dependencies already have tasks
+            if step["id"] not in skip:
+                tasks[step["id"]] = asyncio.create_task(run(step))
+        await asyncio.gather(*tasks.values())
+        return results
+
+    async def _arun_step(self, step, results, history=None):
+        blocked = blocked_by(step, results)
+        if blocked:
+            return {"error": f"skipped because step '{blocked}' failed"}
+        timeout = float(step.get("timeout", PLAN_STEP_TIMEOUT))
+        try:
+            result = await asyncio.wait_for(self.aexecute(self._step_input(step, results), history), timeout)
+        except asyncio.TimeoutError:
+            return {"error": f"timed out after {timeout:g}s"}
+        except Exception as e:
+            return {"error": str(e)}
+        return self._step_result(result)
+
+    @staticmethod
+    def _step_input(step, results):
+        """The step as a single-tool plan, with earlier results filled into its data."""
+        single = {k: v for k, v in step.items() if k not in ("id", "depends_on", "timeout")}
+        single["data"] = resolve_data(step.get("data"), results)
+        return single
+
+    @staticmethod
+    def _step_result(result):
+        if result["response"].startswith(("❌", "⚠️")):
+            return {"error": result["response"], "sources": result.get("sources", [])}
+        return result
+
+    @staticmethod
+    def combine_dag_results(plan, results: dict) -> dict:
+        """The final steps' answers, or whatever partial results exist if they failed."""
+        steps = plan["steps"]
+        finals = [results[s["id"]] for s in final_steps(steps) if "error" not in results.get(s["id"], {"error": ""})]
+        failed = {step_id: result["error"] for step_id, result in results.items() if "error" in result}
+        if finals:
+            text = "\n\n".join(result["response"] for result in finals)
+        else:
+            partial = [results[s["id"]]["response"] for s in steps if "response" in results.get(s["id"], {})]
+            text = "\n\n".join(partial) or "⚠️ No step of the plan succeeded."
+            text += "\n\n⚠️ Incomplete answer: " + "; ".join(f"{k}: {v}" for k, v in failed.items())
+        sources = []
+        for step in steps:
+            for source in results.get(step["id"], {}).get("sources", []):
+                if source not in sources:
+                    sources.append(source)
+        return {
+            "response": text,
+            "sources": sources,
+            "steps": {s["id"]: "ok" if s["id"] not in failed else failed[s["id"]] for s in steps if s["id"] in results}
+        }
+
+    @traced("executor.stream")
+    async def astream_execute(self, plan, history=None):
+        """Streaming variant of `aexecute`.
+
+        Yields ``{"type": "delta", "text": ...}`` events as the model produces
+        text, then one ``{"type": "done", "response": ..., "sources": [...]}``.
+        Wikipedia tools have no model output to stream and arrive as one delta.
+        """
+        tool = plan.get("tool")
+        data = plan.get("data")
+        stream = None
+
+        if tool == "dag":
+            async for event in self._astream_dag(plan, history):
+                yield event
+            return
+
+        try:
+            if tool == "gpt":
+                stream = astream_with_gpt4o(data, plan.get("user_query"))
+            elif tool == "image" and plan.get("file_type"):
+                stream = astream_identify_species(data, plan["file_type"], plan.get("user_query", "Identify this species."))
+            elif tool == "pdf":
+                user_query = data.get("user_query", "Summarize this document.")
+                context = await asyncio.to_thread(
+                    retrieve_pdf_context, data.get("extracted_text", ""), user_query, data.get("doc_id")
+                )
+                stream = astream_pdf_with_gpt4o(context, user_query)
+        except Exception as e:
+            result = {"response": f"⚠️ Execution Error: {str(e)}", "sources": []}
+            yield {"type": "delta", "text": result["response"]}
+            yield {"type": "done", **result}
+            return
+
+        if stream is None:
+            result = await self.aexecute(plan, history)
+            yield {"type": "delta", "text": result["response"]}
+            yield {"type": "done", **result}
+            return
+
+        parts = []
+        try:
+            async for delta in stream:
+                parts.append(delta)
+                yield {"type": "delta", "text": delta}
+        except Exception as e:
+            parts.append(f"⚠️ Execution Error: {str(e)}")
+            yield {"type": "delta", "text": parts[-1]}
+        yield {"type": "done", "response": "".join(parts), "sources": []}
+
+    async def _astream_dag(self, plan, history=None):
+        """Runs every step but the final one, then streams the final step's answer."""
+        try:
+            finals = final_steps(validate_steps(plan["steps"]))
+        except ValueError as e:
+            yield {"type": "delta", "text": f"⚠️ Execution Error: {str(e)}"}
+            yield {"type": "done", "response": f"⚠️ Execution Error: {str(e)}", "sources": []}
+            return
+
+        last = finals[0] if len(finals) == 1 else None
+        results = await self.arun_dag(plan, history, skip={last["id"]} if last else ())
+        if last is not None and not blocked_by(last, results):
+            async for event in self.astream_execute(self._step_input(last, results), history):
+                if event["type"] == "done":
+                    results[last["id"]] = {"response": event["response"], "sources": event["sources"]}
+                    break
+                yield event
+            combined = self.combine_dag_results(plan, results)
+            yield {"type": "done", **combined, "response": results[last["id"]]["response"]}
+            return
+
+        if last is not None:
+            results[last["id"]] = await self._arun_step(last, results, history)
+        combined = self.combine_dag_results(plan, results)
+        yield {"type": "delta", "text": combined["response"]}
+        yield {"type": "done", **combined}
+
     @staticmethod
     def format_wiki_summary(result: dict) -> str:
         return f"""🌿 **{result['title']}**  
@@ -72,6 +343,13 @@ class ExecutingAgent:
 📅 Last Updated: {result['last_updated'][:10]}  
 🔗 [Read More]({result['url']})"""
 
+    @classmethod
+    def format_wiki_batch(cls, results: dict) -> str:
+        return "\n\n".join(
+            f"❌ **{name}**: {result['error']}" if "error" in result else cls.format_wiki_summary(result)
+            for name, result in results.items()
+        )
+
     @staticmethod
     def format_full_wiki(result: dict) -> str:
         return f"""📖 **Full Article**: {result['url']}  
@@ -82,6 +360,12 @@ class ExecutingAgent:
     def fallback_response(query: str, error: dict) -> dict:
         return {
             "response": f"❌ Wikipedia Error: {error.get('error', 'Unknown error')}. GPT Response:\n{process_with_gpt4o(query)}",
-            "sources": [],
-            "history": []
-        }
\ No newline at end of file
+            "sources": []
+        }
+
+    @staticmethod
+    async def afallback_response(query: str, error: dict) -> dict:
+        return {
+            "response": f"❌ Wikipedia Error: {error.get('error', 'Unknown error')}. GPT Response:\n{await aprocess_with_gpt4o(query)}",
+            "sources": []
+        }
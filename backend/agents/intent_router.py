@@ -0,0 +1,136 @@
+import sys
+import os
+import re
+import threading
+import zlib
+import numpy as np
+
+# Add the project root to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+ROUTER_DATA_PATH = os.getenv(
+    "ROUTER_DATA_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "data", "intents.tsv")
+)
+# Below this confidence the planner asks generate_plan_with_gpt4o instead of trusting the route
+ROUTER_THRESHOLD = float(os.getenv("ROUTER_THRESHOLD", 0.6))
+ROUTER_DIM = 1 << 12  # Hashed feature space
+INTENTS = ("gpt", "wiki", "wiki_full")
+
+# Phrases that used to decide the route on their own; now they are features of the model
+WIKI_TRIGGERS = [
+    "wikipedia", "verified source", "scientific name", "taxonomy of",
+    "habitat of", "conservation status", "according to", "peer-reviewed",
+    "scientific consensus", "academic sources", "species classification",
+    "kingdom", "phylum", "genus", "family"
+]
+
+FULL_PAGE_KEYWORDS = [
+    "full article", "complete page", "detailed study",
+    "entire entry", "full text"
+]
+
+WORD = re.compile(r"[a-z0-9]+(?:['-][a-z0-9]+)*")
+
+
+def load_examples(path: str = ROUTER_DATA_PATH) -> list:
+    """Reads labelled queries (``intent<TAB>query`` per line) as (query, intent) pairs."""
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            intent, _, query = line.partition("\t")
+            if intent not in INTENTS:
+                raise ValueError(f"Unknown intent {intent!r} in {path}")
+            examples.append((query, intent))
+    return examples
+
+
+class IntentRouter:
+    """Hashed TF-IDF features plus keyword hits, scored by a softmax logistic regression.
+
+    Keyword phrases are found with one compiled alternation, so adding triggers
+    does not add scans. `route` returns the best intent and its probability.
+    """
+
+    def __init__(self, examples: list, keywords=WIKI_TRIGGERS + FULL_PAGE_KEYWORDS,
+                 epochs: int = 300, learning_rate: float = 2.0, l2: float = 1e-4):
+        phrases = sorted(set(keywords), key=len, reverse=True)
+        self.matcher = re.compile(r"\b(?:" + "|".join(re.escape(p) for p in phrases) + r")\b")
+        self.idf = np.ones(ROUTER_DIM, dtype=np.float32)
+        self.weights = np.zeros((ROUTER_DIM, len(INTENTS)), dtype=np.float32)
+        self.bias = np.zeros(len(INTENTS), dtype=np.float32)
+        self._train(examples, epochs, learning_rate, l2)
+
+    def features(self, query: str) -> set:
+        """Word unigrams and bigrams plus ``kw:`` keyword hits, hashed into ``ROUTER_DIM`` buckets."""
+        text = query.lower()
+        words = WORD.findall(text)
+        tokens = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        tokens += [f"kw:{hit}" for hit in self.matcher.findall(text)]
+        return {zlib.crc32(token.encode()) % ROUTER_DIM for token in tokens}
+
+    def _vector(self, buckets: set):
+        index = np.fromiter(buckets, dtype=np.int64, count=len(buckets))
+        values = self.idf[index]
+        norm = np.sqrt(np.dot(values, values))
+        return index, values / norm if norm else values
+
+    def _train(self, examples: list, epochs: int, learning_rate: float, l2: float):
+        """Full-batch gradient descent on the cross-entropy; a few hundred queries train in well under a second."""
+        buckets = [self.features(query) for query, _ in examples]
+        document_frequency = np.zeros(ROUTER_DIM, dtype=np.float32)
+        for row in buckets:
+            document_frequency[list(row)] += 1
+        self.idf = (np.log((1 + len(examples)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+        # Train on the buckets that occur; the rest keep zero weight
+        active = np.flatnonzero(document_frequency)
+        column = np.zeros(ROUTER_DIM, dtype=np.int64)
+        column[active] = np.arange(len(active))
+        X = np.zeros((len(examples), len(active)), dtype=np.float32)
+        for i, row in enumerate(buckets):
+            index, values = self._vector(row)
+            X[i, column[index]] = values
+        Y = np.eye(len(INTENTS), dtype=np.float32)[[INTENTS.index(intent) for _, intent in examples]]
+
+        weights = np.zeros((len(active), len(INTENTS)), dtype=np.float32)
+        for _ in range(epochs):
+            gradient = _softmax(X @ weights + self.bias) - Y
+            weights -= learning_rate * (X.T @ gradient / len(examples) + l2 * weights)
+            self.bias -= learning_rate * gradient.mean(axis=0)
+        self.weights[active] = weights
+
+    def scores(self, query: str) -> dict:
+        """Probability of each intent for ``query``."""
+        index, values = self._vector(self.features(query))
+        probs = _softmax(values @ self.weights[index] + self.bias)
+        return dict(zip(INTENTS, probs.tolist()))
+
+    def route(self, query: str) -> tuple:
+        """``(intent, confidence)`` for ``query``."""
+        index, values = self._vector(self.features(query))
+        probs = _softmax(values @ self.weights[index] + self.bias)
+        best = int(probs.argmax())
+        return INTENTS[best], float(probs[best])
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+_router = None
+_router_lock = threading.Lock()
+
+def get_router() -> IntentRouter:
+    """Returns the shared router, training it from ``ROUTER_DATA_PATH`` on first use."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = IntentRouter(load_examples())
+    return _router
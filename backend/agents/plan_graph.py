@@ -0,0 +1,133 @@
+import json
+import os
+import re
+
+# Multi-step plans are {"tool": "dag", "steps": [...]} where each step is a
+# single-tool plan with an "id" and optional "depends_on" / "timeout". A
+# step's "data" may reference earlier results: "{identify}" is that step's
+# response text and "{identify.species}" the species name found in it.
+PLAN_STEP_TIMEOUT = float(os.getenv("PLAN_STEP_TIMEOUT", 30))  # seconds
+PLAN_MAX_STEPS = int(os.getenv("PLAN_MAX_STEPS", 8))
+
+STEP_TOOLS = {"gpt", "image", "pdf", "wiki", "wiki_full", "wiki_batch"}
+
+_REFERENCE = re.compile(r"\{(\w+)(?:\.(species))?\}")
+_ITALIC_BINOMIAL = re.compile(r"(?<![*_])[*_]([A-Z][a-z]+ [a-z]+(?: [a-z]+)?)[*_](?![*_])")
+_BRACKET_BINOMIAL = re.compile(r"\(([A-Z][a-z]+ [a-z]{3,}(?: [a-z]{3,})?)\)")
+_BOLD = re.compile(r"\*\*([^*\n]{2,60})\*\*")
+
+
+def validate_steps(steps: list) -> list:
+    """Check ids, tools and dependencies, returning the steps in a runnable (topological) order.
+
+    Raises ValueError for unknown tools, duplicate ids, missing dependencies
+    or cycles.
+    """
+    if not steps or len(steps) > PLAN_MAX_STEPS:
+        raise ValueError(f"❌ A plan needs between 1 and {PLAN_MAX_STEPS} steps")
+    by_id = {}
+    for step in steps:
+        step_id = step.get("id")
+        if not step_id or step_id in by_id:
+            raise ValueError(f"❌ Missing or duplicate step id: {step_id!r}")
+        if step.get("tool") not in STEP_TOOLS:
+            raise ValueError(f"❌ Unknown tool in step {step_id!r}: {step.get('tool')!r}")
+        by_id[step_id] = step
+
+    ordered, state = [], {}  # state: 1 = visiting, 2 = done
+
+    def visit(step_id, path):
+        if state.get(step_id) == 2:
+            return
+        if state.get(step_id) == 1:
+            raise ValueError(f"❌ Cyclic plan: {' → '.join(path + [step_id])}")
+        if step_id not in by_id:
+            raise ValueError(f"❌ Step {path[-1]!r} depends on unknown step {step_id!r}")
+        state[step_id] = 1
+        for dependency in by_id[step_id].get("depends_on", []):
+            visit(dependency, path + [step_id])
+        state[step_id] = 2
+        ordered.append(by_id[step_id])
+
+    for step in steps:
+        visit(step["id"], [])
+    return ordered
+
+
+def final_steps(steps: list) -> list:
+    """Steps nothing else depends on; their responses form the answer."""
+    needed = {dependency for step in steps for dependency in step.get("depends_on", [])}
+    return [step for step in steps if step["id"] not in needed]
+
+
+def extract_species_name(text: str) -> str:
+    """Best-effort species name from an identification answer (binomial preferred)."""
+    for pattern in (_ITALIC_BINOMIAL, _BRACKET_BINOMIAL, _BOLD):
+        match = pattern.search(text or "")
+        if match:
+            return match.group(1).strip()
+    return (text or "").strip().split("\n", 1)[0][:100]
+
+
+def resolve_data(data, results: dict):
+    """Substitute ``{step}`` / ``{step.species}`` references with upstream results."""
+    if isinstance(data, list):
+        return [resolve_data(item, results) for item in data]
+    if not isinstance(data, str):
+        return data
+
+    def substitute(match):
+        result = results.get(match.group(1))
+        if result is None or "error" in result:
+            reason = result["error"] if result else "not run"
+            return f"(unavailable: {reason})"
+        if match.group(2) == "species":
+            return extract_species_name(result["response"])
+        return result["response"]
+
+    return _REFERENCE.sub(substitute, data)
+
+
+def blocked_by(step: dict, results: dict):
+    """The failed dependency whose output this step's input needs, if any.
+
+    Steps that only reference a failed result in their text (e.g. a synthesis
+    prompt) still run and see "(unavailable: ...)"; steps whose whole input
+    is a single reference (e.g. a Wikipedia lookup of "{identify.species}")
+    are skipped.
+    """
+    data = step.get("data")
+    if isinstance(data, str):
+        match = _REFERENCE.fullmatch(data.strip())
+        if match and "error" in results.get(match.group(1), {"error": ""}):
+            return match.group(1)
+    return None
+
+
+def parse_plan(text) -> dict:
+    """Turn a plan produced by `generate_plan_with_gpt4o` into a single-tool or DAG plan.
+
+    Accepts a JSON object (optionally inside a ```json fence) with either a
+    single ``tool`` or a ``steps`` list. Raises ValueError if it can't be used.
+    """
+    if isinstance(text, dict):
+        if "error" in text:
+            raise ValueError(text["error"])
+        plan = text
+    else:
+        match = re.search(r"\{.*\}", text or "", re.DOTALL)
+        if not match:
+            raise ValueError("❌ No JSON plan found")
+        try:
+            plan = json.loads(match.group(0))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"❌ Invalid JSON plan: {e}")
+
+    if "steps" in plan:
+        steps = [dict(step, id=str(step.get("id", f"step{i + 1}"))) for i, step in enumerate(plan["steps"])]
+        validate_steps(steps)
+        return {"tool": "dag", "steps": steps, "rationale": plan.get("rationale", "Multi-step plan")}
+    tool = plan.get("tool", "")
+    if tool not in STEP_TOOLS:
+        raise ValueError(f"❌ Unknown tool: {tool!r}")
+    return {"tool": tool, "data": plan.get("data", ""), "rationale": plan.get("rationale", "")}
@@ -1,30 +1,46 @@
 import sys
 import os
 import re
+import asyncio
 
 # Add the project root to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
-from backend.gpt_handler import generate_plan_with_gpt4o
+from backend.gpt_handler import generate_plan_with_gpt4o, agenerate_plan_with_gpt4o
 from backend.tools.image_tools import process_image_with_gpt4o
-from backend.tools.pdf_tools import extract_text_from_pdf
+from backend.tools.pdf_tools import extract_pages_from_pdf
+from backend.tools.document_store import document_store
+from backend.utils.conversation_store import recent_messages
+from backend.utils.token_budget import fit_prompt
+from backend.utils.telemetry import traced
+from backend.agents.plan_graph import parse_plan
+from backend.agents.intent_router import get_router, ROUTER_THRESHOLD
+
+# Ask GPT-4o-mini for a (possibly multi-step) plan for text queries instead of using heuristics alone
+PLANNER_GPT_PLANS = os.getenv("PLANNER_GPT_PLANS", "0") == "1"
+# Ask GPT-4o-mini only when the local intent router is unsure (confidence below ROUTER_THRESHOLD)
+PLANNER_ESCALATE = os.getenv("PLANNER_ESCALATE", "1") == "1"
 
 class PlanningAgent:
-    """Generates execution plans using GPT-4o and domain-specific heuristics"""
-    
-    WIKI_TRIGGERS = [
-        "wikipedia", "verified source", "scientific name", "taxonomy of",
-        "habitat of", "conservation status", "according to", "peer-reviewed",
-        "scientific consensus", "academic sources", "species classification",
-        "kingdom", "phylum", "genus", "family"
-    ]
-    
-    FULL_PAGE_KEYWORDS = [
-        "full article", "complete page", "detailed study", 
-        "entire entry", "full text"
-    ]
-
-    def plan(self, query, file_content=None, file_type=None, history=None):
+    """Generates execution plans using a local intent router, with GPT-4o for unsure cases"""
+
+    # "<aspect> of A, B and C" → batch lookup of A, B, C
+    TAXA_PREFIX = re.compile(
+        r'^.*?\b(?:taxonomy|habitats?|conservation status(?:es)?|scientific names?|classification|'
+        r'family|families|genus|genera)\s+(?:of|for)\s+',
+        re.IGNORECASE
+    )
+    TAXA_SEPARATOR = re.compile(r'\s*(?:,|;|&|\band\b|\bvs\.?|\bversus\b)\s*', re.IGNORECASE)
+    # "full article on the red fox's diet" → page "red fox"; the question keeps "diet" for section targeting
+    PAGE_PREFIX = re.compile(
+        r'^.*\b(?:article|page|entry|text|study|has)(?:\s+(?:on|about|for|of)\s+|\s*:\s*)', re.IGNORECASE
+    )
+    PAGE_SUFFIX = re.compile(
+        r"(?:['’]s\b|,|;|\s+-\s+|\s+(?:especially|focusing|including|with|from|please)\b).*$", re.IGNORECASE
+    )
+
+    @traced("planner.plan")
+    def plan(self, query, file_content=None, file_type=None, history=None, doc_id=None, filename=None):
         """Generate execution plan considering multiple data sources"""
         history = history or []
         plan = {"tool": "gpt", "data": query}  # Default plan
@@ -32,67 +48,175 @@ class PlanningAgent:
         try:
             # Prioritize file-based operations
             if file_content:
-                plan = self._handle_file_content(query, file_content, file_type)
-            
-            # Wikipedia detection takes precedence over GPT
-            elif self._requires_wikipedia(query):
-                plan = self._create_wiki_plan(query)
+                plan = self._handle_file_content(query, file_content, file_type, filename)
+
+            # Follow-up question about a previously uploaded document
+            elif doc_id:
+                plan = self._create_document_plan(query, doc_id)
             
-            # Fallback to GPT with context
+            # Model-generated plan (may run several tools), if enabled and usable
+            elif PLANNER_GPT_PLANS and (generated := self._create_generated_plan(query, history)):
+                plan = generated
+
+            # Local intent router; GPT-4o decides only when the router is unsure
             else:
-                plan = self._create_gpt_plan(query, history)
+                plan = self._create_routed_plan(query, history)
 
         except Exception as e:
             plan = self._create_error_plan(f"Planning error: {str(e)}")
 
         return plan
 
-    def _handle_file_content(self, query, file_content, file_type):
+    async def aplan(self, query, file_content=None, file_type=None, history=None, doc_id=None, filename=None):
+        """Async entry point; file handling (PDF extraction, document loads) runs in a worker thread
+        and text queries await GPT-4o-mini plans instead of blocking the event loop"""
+        if file_content or doc_id:
+            return await asyncio.to_thread(self.plan, query, file_content, file_type, history, doc_id, filename)
+        return await self._aplan_text(query, history or [])
+
+    @traced("planner.plan")
+    async def _aplan_text(self, query, history):
+        """`plan` for a text-only query, with the same order of choices"""
+        try:
+            if PLANNER_GPT_PLANS:
+                generated = self._generated_plan(await agenerate_plan_with_gpt4o(query), query, history)
+                if generated:
+                    return generated
+            intent, confidence = self._route(query)
+            if self._should_escalate(confidence):
+                generated = self._generated_plan(await agenerate_plan_with_gpt4o(query), query, history)
+                if generated:
+                    return generated
+            return self._intent_plan(intent, query, history)
+        except Exception as e:
+            return self._create_error_plan(f"Planning error: {str(e)}")
+
+    def _handle_file_content(self, query, file_content, file_type, filename=None):
         """Process files with validation and error handling"""
         if "image" in file_type:
+            if self._route(query)[0] != "gpt":
+                return self._create_identify_and_lookup_plan(query, file_content, file_type)
             return {
                 "tool": "image",
                 "data": file_content,
                 "file_type": file_type,
+                "user_query": query,
                 "rationale": "Image file uploaded for analysis"
             }
             
         if "pdf" in file_type:
-            if not isinstance(file_content, bytes):
-                raise ValueError("PDF content must be bytes")
+            if not isinstance(file_content, (bytes, str)):
+                raise ValueError("PDF content must be bytes or a file path")
                 
-            extracted_text = extract_text_from_pdf(file_content)
-            if "❌" in extracted_text:
-                raise ValueError(extracted_text)
-                
-            return {
-                "tool": "pdf",
-                "data": {
-                    "extracted_text": extracted_text,
-                    "user_query": query
-                },
-                "rationale": "PDF document processing"
-            }
+            try:
+                document = document_store.get_or_extract(file_content, extract_pages_from_pdf, filename)
+            except Exception as e:
+                raise ValueError(f"❌ Error extracting text from PDF: {str(e)}")
+
+            return self._pdf_plan(query, document)
         
         raise ValueError("Unsupported file type")
 
-    def _create_wiki_plan(self, query):
+    def _create_identify_and_lookup_plan(self, query, file_content, file_type):
+        """Identify the species, look it up on Wikipedia, then answer the question from both"""
+        return {
+            "tool": "dag",
+            "steps": [
+                {"id": "identify", "tool": "image", "data": file_content, "file_type": file_type,
+                 "user_query": "Identify this species."},
+                {"id": "wiki", "tool": "wiki", "data": "{identify.species}", "depends_on": ["identify"]},
+                {"id": "answer", "tool": "gpt", "depends_on": ["identify", "wiki"],
+                 "data": f"Answer the question using these results.\n\nQuestion: {query}\n\n"
+                         "Species identification:\n{identify}\n\nWikipedia:\n{wiki}"},
+            ],
+            "rationale": "Image identification followed by a Wikipedia lookup of the species"
+        }
+
+    def _create_routed_plan(self, query, history):
+        """Plan for the router's intent, escalating to generate_plan_with_gpt4o below ROUTER_THRESHOLD"""
+        intent, confidence = self._route(query)
+        if self._should_escalate(confidence):
+            generated = self._create_generated_plan(query, history)
+            if generated:
+                return generated
+        return self._intent_plan(intent, query, history)
+
+    def _should_escalate(self, confidence):
+        return PLANNER_ESCALATE and not PLANNER_GPT_PLANS and confidence < ROUTER_THRESHOLD
+
+    def _intent_plan(self, intent, query, history):
+        if intent == "gpt":
+            return self._create_gpt_plan(query, history)
+        return self._create_wiki_plan(query, full_page=intent == "wiki_full")
+
+    def _create_generated_plan(self, query, history):
+        """Plan from generate_plan_with_gpt4o for text-only tools, or None if unusable"""
+        return self._generated_plan(generate_plan_with_gpt4o(query), query, history)
+
+    def _generated_plan(self, raw, query, history):
+        """Plan from a generate_plan_with_gpt4o answer, or None if unusable"""
+        try:
+            plan = parse_plan(raw)
+        except ValueError:
+            return None
+        if plan["tool"] == "gpt":
+            return self._create_gpt_plan(query, history)  # Adds conversation context
+        if any(step["tool"] in ("image", "pdf") for step in plan.get("steps", [plan])):
+            return None  # No file attached to a text query
+        return plan
+
+    def _create_document_plan(self, query, doc_id):
+        """Answer a follow-up question from a stored document instead of re-sent text"""
+        document = document_store.get(doc_id)
+        if document is None:
+            raise ValueError("Unknown document ID; please upload the PDF again")
+        return self._pdf_plan(query, document)
+
+    def _pdf_plan(self, query, document):
+        return {
+            "tool": "pdf",
+            "data": {
+                "extracted_text": document["text"] or "No readable text found in the PDF.",
+                "user_query": query,
+                "doc_id": document["doc_id"]
+            },
+            "rationale": "PDF document processing"
+        }
+
+    def _create_wiki_plan(self, query, full_page=False):
         """Create Wikipedia-specific execution plan"""
         clean_query = self._clean_wiki_query(query)
-        needs_full = self._needs_full_page(query)
+
+        taxa = self._split_taxa(clean_query)
+        if not full_page and len(taxa) > 1:
+            return {
+                "tool": "wiki_batch",
+                "data": taxa,
+                "rationale": f"Wikipedia batch lookup for {len(taxa)} taxa: {', '.join(taxa)}"
+            }
         
+        if full_page:
+            title = self._page_title(clean_query)
+            return {
+                "tool": "wiki_full",
+                "data": title,
+                "user_query": clean_query,  # Picks the sections to fetch
+                "rationale": f"Wikipedia full page request for: {title}"
+            }
+
         return {
-            "tool": "wiki_full" if needs_full else "wiki",
+            "tool": "wiki",
             "data": clean_query,
-            "rationale": f"Wikipedia {'full page' if needs_full else 'summary'} request for: {clean_query}"
+            "rationale": f"Wikipedia summary request for: {clean_query}"
         }
 
     def _create_gpt_plan(self, query, history):
-        """Create GPT plan with conversation context"""
-        context = self._build_conversation_context(history)
+        """Create GPT plan with conversation context, trimmed to GPT-4o-mini's token budget"""
+        parts = fit_prompt({"history": self._build_conversation_context(history), "query": query}, "gpt-4o-mini")
         return {
             "tool": "gpt",
-            "data": f"{context}\n\n{query}",
+            "data": f"{parts['history']}\n\n{parts['query']}",
+            "user_query": query,
             "rationale": "General ecological query with conversation context"
         }
 
@@ -103,14 +227,9 @@ class PlanningAgent:
             "rationale": "Error handling fallback"
         }
 
-    def _requires_wikipedia(self, query: str) -> bool:
-        """Check if query requires Wikipedia verification"""
-        query_lower = query.lower()
-        return any(trigger in query_lower for trigger in self.WIKI_TRIGGERS)
-
-    def _needs_full_page(self, query: str) -> bool:
-        """Determine if full Wikipedia page is needed"""
-        return any(kw in query.lower() for kw in self.FULL_PAGE_KEYWORDS)
+    def _route(self, query: str) -> tuple:
+        """``(intent, confidence)`` from the intent router; intent is "gpt", "wiki" or "wiki_full"."""
+        return get_router().route(query)
 
     def _clean_wiki_query(self, query: str) -> str:
         """Normalize Wikipedia search query"""
@@ -119,9 +238,32 @@ class PlanningAgent:
         clean = re.sub(r'\bwikipedia\b', '', clean, flags=re.IGNORECASE)
         return clean.strip()[:150]  # Limit to 150 characters
 
+    def _page_title(self, query: str) -> str:
+        """The page a full-article request names ("Show me the full article on the red fox's diet" → "red fox")"""
+        match = self.PAGE_PREFIX.match(query)
+        subject = query[match.end():] if match else query
+        subject = self.PAGE_SUFFIX.sub('', subject)
+        subject = re.sub(r'^(?:the|a|an)\s+', '', subject.strip(' ?.!"\''), flags=re.IGNORECASE)
+        return subject or query
+
+    def _split_taxa(self, query: str) -> list:
+        """Split "conservation status of A, B and C" into ["A", "B", "C"] (or return [query])"""
+        match = self.TAXA_PREFIX.match(query)
+        if not match:
+            return [query]
+        names = [
+            re.sub(r'^(?:the|a|an)\s+', '', name.strip(' ?.!"\''), flags=re.IGNORECASE)
+            for name in self.TAXA_SEPARATOR.split(query[match.end():])
+        ]
+        names = [name for name in names if name]
+        if len(names) < 2 or any(len(name.split()) > 4 for name in names):
+            return [query]
+        return names
+
     def _build_conversation_context(self, history):
-        """Build context from last 3 messages"""
-        return "\n".join(
-            f"{msg['role']}: {msg['content']}" 
-            for msg in history[-3:]
-        )
\ No newline at end of file
+        """Build context from the session summary and the last 3 messages"""
+        lines = [f"{msg['role']}: {msg['content']}" for msg in recent_messages(history, 3)]
+        summary = getattr(history, "summary", "")
+        if summary:
+            lines.insert(0, f"Earlier in this conversation:\n{summary}")
+        return "\n".join(lines)
\ No newline at end of file
@@ -0,0 +1,51 @@
+"""Build the offline Wikipedia species index from a local dump.
+
+    python backend/build_wiki_index.py enwiki-latest-pages-articles.xml.bz2
+    python backend/build_wiki_index.py specieswiki-latest-pages-articles.xml.bz2 --all
+    python backend/build_wiki_index.py enwiki-cirrussearch-content.json.gz --index /data/wiki_index.db
+
+Accepts MediaWiki XML exports and JSON-lines (CirrusSearch) dumps, plain,
+.bz2 or .gz. The dump is streamed page by page; only taxon articles are kept
+(taxoboxes, IUCN status, species/fauna/flora/conservation categories) unless
+``--all``. Progress is committed every ``--batch`` pages, so re-running the
+same command after an interruption resumes where it stopped.
+
+wiki_tool answers from the index at WIKI_INDEX_PATH whenever it exists;
+set WIKI_LIVE_FALLBACK=0 to never call the live API.
+"""
+import argparse
+import os
+import sys
+
+# Add the project root to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.tools.wiki_index import build_index, WIKI_INDEX_PATH, WIKI_INDEX_BATCH
+
+
+def report(stats: dict):
+    done = stats["offset"] / stats["size"] if stats["size"] else 0
+    print(f"{done:6.1%}  {stats['pages']} pages, {stats['redirects']} redirects, {stats['skipped']} skipped",
+          flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dump", help="XML or JSON-lines dump (.bz2/.gz allowed)")
+    parser.add_argument("--index", default=WIKI_INDEX_PATH, help="SQLite index file (default: WIKI_INDEX_PATH)")
+    parser.add_argument("--all", action="store_true", help="Index every article (e.g. Wikispecies)")
+    parser.add_argument("--batch", type=int, default=WIKI_INDEX_BATCH, help="Pages per commit/checkpoint")
+    parser.add_argument("--base-url", help="Article URL prefix (default: from the dump, else en.wikipedia.org)")
+    parser.add_argument("--restart", action="store_true", help="Ignore saved progress and start over")
+    args = parser.parse_args()
+
+    stats = build_index(args.dump, args.index, all_pages=args.all, batch=args.batch, base_url=args.base_url,
+                        restart=args.restart, progress=report)
+    if stats["resumed_at"]:
+        print(f"Resumed at byte {stats['resumed_at']}")
+    print(f"Done in {stats['seconds']}s: {stats['pages']} pages, {stats['redirects']} redirects, "
+          f"{stats['skipped']} skipped → {args.index} ({os.path.getsize(args.index) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,41 @@
-from openai import OpenAI
-import os
+import asyncio
+import time
+from backend.tools.openai_client import chat_completion, achat_completion, astream_chat  # Shared, rate-limited OpenAI calls
+from backend.utils.telemetry import traced
+from backend.tools.semantic_cache import (
+    SemanticCache, FOLLOW_UP, lexical_embedding, TEXT_CACHE_SIMILARITY, TEXT_CACHE_LEXICAL_SIMILARITY
+)
 
-# Load API Key
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)
+def _query_embedding(text):
+    """BioTrove-CLIP text embedding when the model is already loaded, else the lexical fallback."""
+    from backend.tools.image_tools import local_model_status
+    if local_model_status() == "loaded":
+        from backend.image_classifier import embed_text
+        return "clip", embed_text(text)
+    return "lexical", lexical_embedding(text)
 
-def generate_plan_with_gpt4o(query):
-    """Generates a structured plan using GPT-4o-mini to decide how to answer the query."""
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": """
+# Answers to earlier paraphrases of the same question
+text_cache = SemanticCache(
+    _query_embedding, {"clip": TEXT_CACHE_SIMILARITY, "lexical": TEXT_CACHE_LEXICAL_SIMILARITY}
+)
+
+def text_cache_stats() -> dict:
+    return text_cache.stats()
+
+def _cache_key(query, user_query):
+    """Key the answer is cached under, or None to bypass the cache. With ``user_query`` (the user's
+    question without conversation context) the cache is used only when the prompt is that question
+    alone and it is not a follow-up, so an answer never depends on one session's history."""
+    if not user_query:
+        return query
+    if query.strip() != user_query.strip() or FOLLOW_UP.search(user_query):
+        return None
+    return user_query
+
+def _plan_messages(query):
+    """Builds the chat messages asking GPT-4o-mini for a structured plan."""
+    return [
+        {"role": "system", "content": """
 You are **EcoBot**, an **AI-powered ecological planning agent**. 
 Your goal is to create a structured plan to answer user questions using these tools:
 
@@ -39,24 +63,53 @@ Your goal is to create a structured plan to answer user questions using these to
     "data": "clean query string",
     "rationale": "explicit reason matching guidelines"
 }
+```
+
+If multiple tools are needed, return steps instead. Steps without `depends_on` run in parallel;
+`{step_id}` in `data` is replaced by that step's result:
+```json
+{
+    "steps": [
+        {"id": "fox", "tool": "wiki", "data": "Red fox"},
+        {"id": "wolf", "tool": "wiki", "data": "Gray wolf"},
+        {"id": "answer", "tool": "gpt", "depends_on": ["fox", "wolf"],
+         "data": "Compare their diets using: {fox} {wolf}"}
+    ],
+    "rationale": "explicit reason matching guidelines"
+}
+```
 
 🛑 **Do NOT generate a direct answer. Instead, return a structured plan** specifying which tool(s) to use. 
-If multiple tools are needed, outline a step-by-step approach. If unsure, explain why. 
+If unsure, explain why. 
 """},
 
-                {"role": "user", "content": f"User query: {query}. What is the best way to answer this?"}
-            ],
-            max_tokens=500,
-        )
+        {"role": "user", "content": f"User query: {query}. What is the best way to answer this?"}
+    ]
+
+@traced("gpt.plan")
+def generate_plan_with_gpt4o(query):
+    """Generates a structured plan using GPT-4o-mini to decide how to answer the query."""
+    try:
+        response = chat_completion(model="gpt-4o-mini", messages=_plan_messages(query), max_tokens=500)
         return response.choices[0].message.content  # Now returns a structured plan
     except Exception as e:
         return {"error": f"❌ Planning Error: {str(e)}"}
 
+@traced("gpt.plan")
+async def agenerate_plan_with_gpt4o(query):
+    """Async variant of `generate_plan_with_gpt4o` that does not block the event loop."""
+    try:
+        response = await achat_completion(model="gpt-4o-mini", messages=_plan_messages(query), max_tokens=500)
+        return response.choices[0].message.content
+    except Exception as e:
+        return {"error": f"❌ Planning Error: {str(e)}"}
+
 
+@traced("gpt.evaluate")
 def evaluate_plan_with_gpt4o(plan):
     """Evaluates the plan to determine if the selected tool is correct."""
     try:
-        response = client.chat.completions.create(
+        response = chat_completion(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": """
@@ -80,24 +133,79 @@ Always return a structured JSON response:
     except Exception as e:
         return {"error": f"❌ Evaluation Error: {str(e)}"}
 
-def process_with_gpt4o(query):
-    """Sends a validated query to GPT-4o for text-based responses."""
-    
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": """
+def _text_messages(query):
+    """Builds the chat messages for a text-based EcoBot response."""
+    return [
+        {"role": "system", "content": """
 You are **EcoBot**, an AI-powered ecological assistant. 
 Your job is to provide **scientific and informative responses** about biodiversity, species identification, and ecosystems. 
 Ensure that your responses are **concise, factual, and well-structured**.
 If the query refers to an **image or a PDF**, defer to the appropriate tool.
 """},
-                {"role": "user", "content": query}
-            ],
+        {"role": "user", "content": query}
+    ]
+
+@traced("gpt.answer")
+def process_with_gpt4o(query, user_query=None):
+    """Sends a validated query to GPT-4o for text-based responses (paraphrases hit the cache).
+
+    ``user_query`` is the user's question without the conversation context in ``query``.
+    """
+    cache_key = _cache_key(query, user_query)
+    cached = text_cache.lookup(cache_key) if cache_key else None
+    if cached is not None:
+        return cached
+    try:
+        started = time.perf_counter()
+        response = chat_completion(
+            model="gpt-4o-mini",
+            messages=_text_messages(query),
+            max_tokens=500
+        )
+        answer = response.choices[0].message.content  # Extract response
+        if cache_key:
+            text_cache.store(cache_key, answer, time.perf_counter() - started)
+        return answer
+    except Exception as e:
+        return f"❌ Error calling GPT-4o: {str(e)}"
+
+@traced("gpt.answer")
+async def aprocess_with_gpt4o(query, user_query=None):
+    """Async variant of `process_with_gpt4o` that does not block the event loop."""
+    cache_key = _cache_key(query, user_query)
+    cached = await asyncio.to_thread(text_cache.lookup, cache_key) if cache_key else None
+    if cached is not None:
+        return cached
+    try:
+        started = time.perf_counter()
+        response = await achat_completion(
+            model="gpt-4o-mini",
+            messages=_text_messages(query),
             max_tokens=500
         )
-        return response.choices[0].message.content  # Extract response
+        answer = response.choices[0].message.content
+        if cache_key:
+            await asyncio.to_thread(text_cache.store, cache_key, answer, time.perf_counter() - started)
+        return answer
     except Exception as e:
         return f"❌ Error calling GPT-4o: {str(e)}"
 
+@traced("gpt.answer_stream")
+async def astream_with_gpt4o(query, user_query=None):
+    """Streaming variant of `aprocess_with_gpt4o`: yields the answer in chunks as GPT-4o produces it."""
+    cache_key = _cache_key(query, user_query)
+    cached = await asyncio.to_thread(text_cache.lookup, cache_key) if cache_key else None
+    if cached is not None:
+        yield cached
+        return
+    parts = []
+    try:
+        started = time.perf_counter()
+        async for delta in astream_chat(model="gpt-4o-mini", messages=_text_messages(query), max_tokens=500):
+            parts.append(delta)
+            yield delta
+    except Exception as e:
+        yield f"❌ Error calling GPT-4o: {str(e)}"
+        return
+    if cache_key:
+        await asyncio.to_thread(text_cache.store, cache_key, "".join(parts), time.perf_counter() - started)
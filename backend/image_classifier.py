@@ -1,21 +1,200 @@
 import open_clip
 import torch
+import numpy as np
 from PIL import Image
+import hashlib
 import io
+import os
+import threading
+from backend.utils.batching import MicroBatcher
+
+MODEL_ID = 'hf-hub:BGLab/BioTrove-CLIP'
+LABELS_PATH = os.getenv(
+    "BIOTROVE_LABELS_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "species_labels.tsv")
+)
+EMBEDDINGS_DIR = os.getenv(
+    "BIOTROVE_EMBEDDINGS_DIR",
+    os.path.join(os.path.dirname(__file__), ".cache")
+)
+PROMPT_TEMPLATE = "a photo of {common_name}, {scientific_name}."
+
+# Micro-batching of concurrent async classification requests
+BATCH_MAX_SIZE = int(os.getenv("BIOTROVE_BATCH_SIZE", 16))
+BATCH_MAX_WAIT_MS = float(os.getenv("BIOTROVE_BATCH_WAIT_MS", 10))
 
-# Load BioTrove-CLIP model
 device = "cuda" if torch.cuda.is_available() else "cpu"
-model, preprocess_train, preprocess_val = open_clip.create_model_and_transforms('hf-hub:BGLab/BioTrove-CLIP')
-tokenizer = open_clip.get_tokenizer('hf-hub:BGLab/BioTrove-CLIP')
-model.to(device).eval()
 
-def classify_with_biotrove(image_bytes: bytes):
-    """Run BioTrove-CLIP for zero-shot classification without predefined labels."""
-    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    image = preprocess_val(image).unsqueeze(0).to(device)
+def load_labels(path: str = LABELS_PATH) -> list:
+    """Reads the species vocabulary (``scientific_name<TAB>common_name`` per line)."""
+    labels = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            scientific_name, _, common_name = line.partition("\t")
+            labels.append({"scientific_name": scientific_name, "common_name": common_name or scientific_name})
+    return labels
 
+def _embeddings_path(labels: list) -> str:
+    """Cache file name tied to the model, prompt and vocabulary so edits trigger a rebuild."""
+    digest = hashlib.sha256(
+        "\n".join([MODEL_ID, PROMPT_TEMPLATE] + [PROMPT_TEMPLATE.format(**l) for l in labels]).encode("utf-8")
+    ).hexdigest()[:16]
+    return os.path.join(EMBEDDINGS_DIR, f"biotrove_labels_{digest}.npy")
+
+def build_label_embeddings(model, tokenizer, labels: list, batch_size: int = 256) -> np.ndarray:
+    """Encodes every label prompt once with the CLIP text tower (L2-normalised, float32)."""
+    prompts = [PROMPT_TEMPLATE.format(**label) for label in labels]
+    batches = []
     with torch.no_grad():
-        image_features = model.encode_image(image)
-        predicted_species = model(image_features)  # Let the model infer species directly
+        for start in range(0, len(prompts), batch_size):
+            tokens = tokenizer(prompts[start:start + batch_size]).to(device)
+            features = model.encode_text(tokens)
+            features = features / features.norm(dim=-1, keepdim=True)
+            batches.append(features.float().cpu().numpy())
+    return np.concatenate(batches).astype(np.float32)
+
+def load_label_embeddings(model, tokenizer, labels: list) -> np.ndarray:
+    """Returns the label-embedding matrix, memory-mapped from the ``.npy`` cache when present."""
+    path = _embeddings_path(labels)
+    if os.path.exists(path):
+        embeddings = np.load(path, mmap_mode="r")
+        if embeddings.shape[0] == len(labels):
+            return embeddings
+
+    embeddings = build_label_embeddings(model, tokenizer, labels)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, embeddings)
+    os.replace(tmp_path, path)
+    return np.load(path, mmap_mode="r")
+
+class BioTroveModel:
+    """BioTrove-CLIP weights, transforms, tokenizer and the label-embedding matrix."""
+
+    def __init__(self):
+        self.model, _, self.preprocess_val = open_clip.create_model_and_transforms(MODEL_ID)
+        self.tokenizer = open_clip.get_tokenizer(MODEL_ID)
+        self.model.to(device).eval()
+        self.labels = load_labels()
+        self.label_embeddings = load_label_embeddings(self.model, self.tokenizer, self.labels)
+        self.logit_scale = self.model.logit_scale.exp().item()
+
+_biotrove = None
+_biotrove_lock = threading.Lock()
+_status = "not_loaded"
+
+def get_biotrove() -> BioTroveModel:
+    """Returns the shared model, loading it on first use (thread-safe, loads at most once)."""
+    global _biotrove, _status
+    if _biotrove is None:
+        with _biotrove_lock:
+            if _biotrove is None:
+                _status = "loading"
+                try:
+                    _biotrove = BioTroveModel()
+                except Exception as e:
+                    _status = f"failed: {e}"
+                    raise
+                _status = "loaded"
+    return _biotrove
+
+def model_status() -> str:
+    """One of ``not_loaded``, ``loading``, ``loaded`` or ``failed: <reason>``."""
+    return _status
+
+def warm_up(forward: bool = True):
+    """Loads the model and runs one dummy forward pass so the first real request is fast.
+
+    ``forward=False`` only loads the weights and label embeddings, for a process that forks afterwards.
+    """
+    biotrove = get_biotrove()
+    if not forward:
+        return
+    blank = Image.new("RGB", (224, 224))
+    with torch.no_grad():
+        biotrove.model.encode_image(biotrove.preprocess_val(blank).unsqueeze(0).to(device))
+
+def rank_labels(image_features: np.ndarray, embeddings: np.ndarray, labels: list,
+                logit_scale: float, top_k: int = 5) -> list:
+    """Scores normalised image features against every label with one matrix multiply."""
+    logits = logit_scale * (image_features @ embeddings.T)  # (batch, n_labels)
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    probs = np.exp(logits)
+    probs /= probs.sum(axis=-1, keepdims=True)
+
+    results = []
+    for row in probs:
+        top = np.argpartition(-row, min(top_k, len(row) - 1))[:top_k]
+        top = top[np.argsort(-row[top])]
+        results.append([
+            {**labels[i], "label": f"{labels[i]['common_name']} ({labels[i]['scientific_name']})",
+             "probability": float(row[i])}
+            for i in top
+        ])
+    return results
+
+def preprocess_image(image_bytes):
+    """Decodes and transforms one image (bytes or a file path) into a model-ready tensor (no batch dimension)."""
+    biotrove = get_biotrove()
+    image = Image.open(image_bytes if isinstance(image_bytes, str) else io.BytesIO(image_bytes)).convert("RGB")
+    return biotrove.preprocess_val(image)
+
+def classify_batch(images: list, top_k: int = 5) -> list:
+    """Classifies preprocessed image tensors with a single ``encode_image`` forward pass."""
+    biotrove = get_biotrove()
+    batch = torch.stack(images).to(device)
+
+    with torch.no_grad():
+        image_features = biotrove.model.encode_image(batch)
+        image_features = image_features / image_features.norm(dim=-1, keepdim=True)
+
+    return rank_labels(
+        image_features.float().cpu().numpy(), biotrove.label_embeddings, biotrove.labels,
+        biotrove.logit_scale, top_k
+    )
+
+def embed_image(image: Image.Image) -> np.ndarray:
+    """L2-normalised BioTrove-CLIP embedding of a decoded image (used for near-duplicate lookup)."""
+    biotrove = get_biotrove()
+    tensor = biotrove.preprocess_val(image.convert("RGB")).unsqueeze(0).to(device)
+    with torch.no_grad():
+        features = biotrove.model.encode_image(tensor)
+        features = features / features.norm(dim=-1, keepdim=True)
+    return features[0].float().cpu().numpy()
+
+def embed_text(text: str) -> np.ndarray:
+    """L2-normalised BioTrove-CLIP text embedding (used by the semantic response cache)."""
+    biotrove = get_biotrove()
+    with torch.no_grad():
+        features = biotrove.model.encode_text(biotrove.tokenizer([text]).to(device))
+        features = features / features.norm(dim=-1, keepdim=True)
+    return features[0].float().cpu().numpy()
+
+def classify_with_biotrove(image_bytes: bytes, top_k: int = 5) -> list:
+    """Run BioTrove-CLIP zero-shot classification against the species vocabulary.
+
+    Returns the top-k taxa as dicts with ``label``, ``scientific_name``,
+    ``common_name`` and ``probability``, most likely first.
+    """
+    return classify_batch([preprocess_image(image_bytes)], top_k)[0]
+
+def _classify_requests(requests: list) -> list:
+    """Batch entry point: ``requests`` are ``(tensor, top_k)`` pairs."""
+    predictions = classify_batch([tensor for tensor, _ in requests], max(k for _, k in requests))
+    return [p[:k] for p, (_, k) in zip(predictions, requests)]
+
+def _preprocess_request(request: tuple) -> tuple:
+    image_bytes, top_k = request
+    return preprocess_image(image_bytes), top_k
+
+batcher = MicroBatcher(
+    _classify_requests, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS,
+    preprocess=_preprocess_request
+)
 
-    return predicted_species
+async def aclassify_with_biotrove(image_bytes: bytes, top_k: int = 5) -> list:
+    """Async variant of `classify_with_biotrove`: concurrent calls share one batched forward pass."""
+    return await batcher.submit((image_bytes, top_k))
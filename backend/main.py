@@ -1,62 +1,281 @@
 from fastapi import FastAPI, UploadFile, File, Form
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from agents.planner import PlanningAgent
 from agents.evaluator import EvaluatingAgent
 from agents.executor import ExecutingAgent
+from backend.agents.intent_router import get_router
+from backend.tools.wiki_tool import aclose_http_client, wiki_cache_stats, full_page_stats
+from backend.gpt_handler import text_cache_stats
+from backend.tools.openai_client import client_stats
+from backend.utils.token_budget import fit_prompt, budget_stats
+from backend.utils.conversation_store import create_conversation_store, new_session_id
+from backend.utils.telemetry import TracingMiddleware, register_collector, render_metrics
+from backend.tools.image_tools import warm_up_local_model, local_model_status, image_metrics, image_cache_stats
+from backend.tools.document_store import document_store
+from backend.utils.uploads import UploadLimitMiddleware, UploadRejected, upload_store
+from starlette.background import BackgroundTask
+import asyncio
 import json
+import os
+import threading
+import time
 
 app = FastAPI()
+app.add_middleware(UploadLimitMiddleware)  # 413 for oversized bodies before they are spooled
+app.add_middleware(TracingMiddleware)  # Request IDs, per-stage spans, /metrics counters
 
 # Initialize agents
 planner = PlanningAgent()
 evaluator = EvaluatingAgent()
 executor = ExecutingAgent()
 
-MAX_RETRIES = 3
-chat_history = []  # Persistent Chat History
+BIOTROVE_WARMUP = os.getenv("BIOTROVE_WARMUP", "1") == "1"
+conversations = create_conversation_store()  # Per-session chat history
+
+# Time-to-first-token and total latency of streamed answers
+_stream_metrics = {"requests": 0, "ttft_ms_total": 0.0, "ttft_ms_max": 0.0, "total_ms_total": 0.0}
+_stream_metrics_lock = threading.Lock()
+
+def _record_stream(ttft_ms, total_ms):
+    with _stream_metrics_lock:
+        _stream_metrics["requests"] += 1
+        _stream_metrics["ttft_ms_total"] += ttft_ms
+        _stream_metrics["ttft_ms_max"] = max(_stream_metrics["ttft_ms_max"], ttft_ms)
+        _stream_metrics["total_ms_total"] += total_ms
+
+register_collector("cache", "cache", lambda: {
+    "wiki": wiki_cache_stats(), "image_answers": image_cache_stats(), "text_answers": text_cache_stats()
+})
+register_collector("sessions", "backend", lambda: {conversations.stats()["backend"]: conversations.stats()})
+register_collector("openai", "client", lambda: {"shared": client_stats()})
+register_collector("images", "pipeline", lambda: {"vision": image_metrics()})
+register_collector("stream", "endpoint", lambda: {"query_stream": dict(_stream_metrics)})
+register_collector("wiki_full_page", "mode", full_page_stats)
+register_collector("uploads", "store", lambda: {"files": upload_store.stats()})
+
+@app.on_event("startup")
+async def startup():
+    """Train the intent router and start loading the local model in the background; /ready reports the model."""
+    loop = asyncio.get_running_loop()
+    loop.run_in_executor(None, get_router)
+    if BIOTROVE_WARMUP:
+        loop.run_in_executor(None, warm_up_local_model)
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 while the local model is still loading."""
+    status = local_model_status()
+    is_ready = not BIOTROVE_WARMUP or status in ("loaded", "unavailable") or status.startswith("failed")
+    return JSONResponse({"ready": is_ready, "model": status}, status_code=200 if is_ready else 503)
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Release pooled HTTP connections."""
+    await aclose_http_client()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: stage/OpenAI/HTTP latency histograms, error counts, in-flight requests and cache stats."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Reports cache hit/miss/eviction counters for sizing."""
+    return {"wiki": wiki_cache_stats(), "image_answers": image_cache_stats(), "text_answers": text_cache_stats()}
+
+@app.get("/stream/stats")
+async def stream_stats():
+    """Reports mean/max time-to-first-token and mean total latency of /query/stream."""
+    with _stream_metrics_lock:
+        metrics = dict(_stream_metrics)
+    n = metrics["requests"] or 1
+    return {
+        "requests": metrics["requests"],
+        "ttft_ms_mean": round(metrics["ttft_ms_total"] / n, 1),
+        "ttft_ms_max": round(metrics["ttft_ms_max"], 1),
+        "total_ms_mean": round(metrics["total_ms_total"] / n, 1),
+    }
+
+@app.get("/sessions/stats")
+async def session_stats():
+    """Reports live sessions and how many were evicted or compacted."""
+    return conversations.stats()
+
+@app.get("/images/stats")
+async def image_stats():
+    """Reports bytes saved by image preprocessing and per-image vision latency."""
+    return image_metrics()
+
+@app.get("/uploads/stats")
+async def upload_stats():
+    """Reports uploads received, how many were already known by hash, and rejections."""
+    return upload_store.stats()
+
+@app.get("/openai/stats")
+async def openai_stats():
+    """Reports OpenAI retries, throttling, circuit breaker state, token usage and prompt trimming."""
+    return dict(client_stats(), prompt_budget=budget_stats())
+
+async def _read_request(query, doc_id, pdf_context, file, upload_id=None):
+    """Returns ``(query, file_content, file_type, filename, doc_id, upload_id)`` for an incoming form.
+
+    An upload (or the ``upload_id`` of an earlier one) becomes the path of its
+    copy in `upload_store`, hashed and size-checked in chunks rather than read
+    into memory, and pinned there until the caller releases ``upload_id``. A
+    PDF whose hash is already a stored document is answered from that
+    document without being opened. Raises `UploadRejected`.
+    """
+    file_content = None
+    file_type = None
+    filename = None
+
+    if file or upload_id:
+        if file:
+            upload = await asyncio.to_thread(upload_store.save, file.file, file.content_type, True)
+            file_type = file.content_type
+            filename = file.filename
+        else:
+            upload = upload_store.get(upload_id, pin=True)
+            if upload is None:
+                raise UploadRejected("❌ Unknown upload ID; please upload the file again", 404)
+            file_type = upload["content_type"]
+        upload_id = upload["upload_id"]
+        if "pdf" in (file_type or ""):
+            doc_id = upload_id  # Document IDs are the same content hash
+            if not document_store.exists(doc_id):
+                file_content = upload["path"]
+        else:
+            file_content = upload["path"]
+    
+    # Use PDF context if available (older clients that don't send doc_id)
+    if pdf_context and not file and not doc_id:
+        parts = fit_prompt({"query": query, "document": pdf_context}, "gpt-4o-mini")
+        query = f"{parts['query']}\nPDF Context: {parts['document']}"
+    return query, file_content, file_type, filename, doc_id, upload_id
+
+async def _plan_request(query, file_content, file_type, history, doc_id, filename):
+    """Plans and evaluates the request once, returning the validated plan or an error dict."""
+    # **Step 1: Plan**
+    plan = await planner.aplan(query, file_content, file_type, history, doc_id=doc_id, filename=filename)
+
+    # **Step 2: Evaluate**
+    return evaluator.evaluate(plan, history)
+
+def _recall(query, history, doc_id, upload_id=None):
+    """Memoised answer to a repeat of an earlier query in this session, about the same upload if any."""
+    memo = evaluator.recall(query, history, upload_id or doc_id)
+    return dict(memo, memoised=True) if memo else None
+
+def _finish_result(result, evaluation, history, query, session_id, doc_id=None, memoise=True, upload_id=None):
+    """Validates the response structure, records the turn and memoises the answer."""
+    if evaluation.get("tool") == "pdf":
+        result["doc_id"] = evaluation["data"]["doc_id"]
+    if upload_id:
+        result["upload_id"] = upload_id  # Send this instead of the file to ask about it again
+    if not result.get("response"):
+        result["response"] = "⚠️ No response generated"
+    if "sources" not in result:
+        result["sources"] = []
+    history.append("user", query)
+    history.append("assistant", result["response"])  # Store response once
+    if memoise:
+        evaluator.remember(query, history, result, upload_id or doc_id)
+    result["session_id"] = session_id
+    return result
 
 @app.post("/query/")
 async def process_query(
     query: str = Form(...),
-    pdf_context: str = Form(None),           # <--- NEW PARAM
+    session_id: str = Form(None),            # Conversation ID returned by a previous response
+    doc_id: str = Form(None),                # ID of a previously uploaded PDF
+    pdf_context: str = Form(None),           # Deprecated: full text re-sent by older clients
+    upload_id: str = Form(None),             # ID of an earlier upload, sent instead of the same file
     file: UploadFile = File(None)
 ):
-    """Handles user input and maintains chat history."""
-    
-    global chat_history  # Ensure history is shared across requests
-    
-    file_content = None
-    file_type = None
+    """Handles user input and maintains per-session chat history."""
+    session_id = session_id or new_session_id()
+    history = conversations.session(session_id)
+    try:
+        query, file_content, file_type, filename, doc_id, upload_id = await _read_request(
+            query, doc_id, pdf_context, file, upload_id
+        )
+    except UploadRejected as e:
+        return JSONResponse({"error": str(e), "session_id": session_id}, status_code=e.status)
 
-    if file:
-        file_content = await file.read()
-        file_type = file.content_type
-    
-    # Use PDF context if available
-    if pdf_context and not file:
-        query = f"{query}\nPDF Context: {pdf_context}"
-
-    attempt = 0
-    while attempt < MAX_RETRIES:
-        # **Step 1: Plan**
-        plan = planner.plan(query, file_content, file_type, chat_history)
-
-        # **Step 2: Evaluate**
-        evaluation = evaluator.evaluate(plan, chat_history)
-
-        if "error" not in evaluation:
-            # **Step 3: Execute**
-            result = executor.execute(evaluation, chat_history)
-            if file and "pdf" in file_type:
-                result["pdf_context"] = evaluation.get("extracted_text", "")
-            # Validate response structure
-            if not result.get("response"):
-                result["response"] = "⚠️ No response generated"
-            if "sources" not in result:
-                result["sources"] = []
-            chat_history.append({"role": "assistant", "content": result["response"]})  # Store response
-            return result  # Successfully executed
-
-        # **If evaluation fails, retry planning**
-        attempt += 1
-
-    return {"error": "Failed to generate a valid plan after multiple attempts."}
+    try:
+        memo = _recall(query, history, doc_id, upload_id)
+        if memo:
+            return _finish_result(memo, {}, history, query, session_id, memoise=False, upload_id=upload_id)
+
+        evaluation = await _plan_request(query, file_content, file_type, history, doc_id, filename)
+        if "error" in evaluation:
+            return {"error": evaluation["error"], "session_id": session_id}
+
+        # **Step 3: Execute**
+        result = await executor.aexecute(evaluation, history)
+        return _finish_result(result, evaluation, history, query, session_id, doc_id, upload_id=upload_id)
+    finally:
+        upload_store.release(upload_id)
+
+@app.post("/query/stream")
+async def stream_query(
+    query: str = Form(...),
+    session_id: str = Form(None),
+    doc_id: str = Form(None),
+    pdf_context: str = Form(None),
+    upload_id: str = Form(None),
+    file: UploadFile = File(None)
+):
+    """Streaming variant of /query/: newline-delimited JSON events.
+
+    ``{"type": "delta", "text": ...}`` lines carry the answer as it is
+    generated; the last line is ``{"type": "done", ...}`` with the same fields
+    as a /query/ response plus ``ttft_ms`` and ``total_ms`` (or
+    ``{"type": "error", ...}`` if the plan or the upload was invalid).
+    """
+    started = time.perf_counter()
+    session_id = session_id or new_session_id()
+    history = conversations.session(session_id)
+    try:
+        query, file_content, file_type, filename, doc_id, upload_id = await _read_request(
+            query, doc_id, pdf_context, file, upload_id
+        )
+    except UploadRejected as e:
+        error = {"type": "error", "error": str(e), "status": e.status, "session_id": session_id}
+        return StreamingResponse(iter([json.dumps(error) + "\n"]), status_code=e.status,
+                                 media_type="application/x-ndjson")
+
+    async def events():
+        memo = _recall(query, history, doc_id, upload_id)
+        if memo:
+            result = _finish_result(memo, {}, history, query, session_id, memoise=False, upload_id=upload_id)
+            total_ms = (time.perf_counter() - started) * 1000
+            yield json.dumps({"type": "delta", "text": result["response"]}) + "\n"
+            yield json.dumps({"type": "done", **result, "ttft_ms": round(total_ms, 1),
+                              "total_ms": round(total_ms, 1)}) + "\n"
+            return
+
+        evaluation = await _plan_request(query, file_content, file_type, history, doc_id, filename)
+        if "error" in evaluation:
+            yield json.dumps({"type": "error", "error": evaluation["error"], "session_id": session_id}) + "\n"
+            return
+
+        ttft_ms = None
+        async for event in executor.astream_execute(evaluation, history):
+            if event["type"] == "delta":
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - started) * 1000
+                yield json.dumps(event) + "\n"
+                continue
+            result = _finish_result(
+                {k: v for k, v in event.items() if k != "type"}, evaluation, history, query, session_id,
+                doc_id, upload_id=upload_id
+            )
+            total_ms = (time.perf_counter() - started) * 1000
+            _record_stream(ttft_ms or total_ms, total_ms)
+            yield json.dumps({"type": "done", **result, "ttft_ms": round(ttft_ms or total_ms, 1),
+                              "total_ms": round(total_ms, 1)}) + "\n"
+
+    # Released once the stream ends, or the client goes away
+    return StreamingResponse(events(), media_type="application/x-ndjson",
+                             background=BackgroundTask(upload_store.release, upload_id))
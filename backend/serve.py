@@ -0,0 +1,141 @@
+"""Pre-fork multi-worker launcher for the EcoBot API.
+
+    python backend/serve.py --host 0.0.0.0 --port 8000 [--workers N]
+
+The master process imports the app and loads BioTrove-CLIP once, then forks
+the workers so they share the model weights copy-on-write instead of each
+loading its own copy. The master never runs a forward pass: torch's OpenMP
+thread pool is not fork-safe once started, so each worker runs its warm-up
+pass after the fork. Workers accept connections on one shared listening
+socket. Session history and the answer caches live in SQLite files (WAL mode)
+shared by all workers; the master restarts any worker that dies.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+# Add the project root and backend directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+
+def available_cores() -> int:
+    """CPU cores this process may run on (honours affinity masks and container CPU sets)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def default_workers() -> int:
+    return int(os.getenv("WEB_CONCURRENCY", available_cores()))
+
+
+def configure_shared_state(workers: int):
+    """Points process-local state at shared files. Must run before the app is imported."""
+    from backend.utils.shared_state import state_path
+    if workers > 1:
+        os.environ.setdefault("CONVERSATION_BACKEND", "sqlite")
+        os.environ.setdefault("TEXT_CACHE_PATH", state_path("text_cache.db"))
+    # Split the cores between workers so PDF extraction and torch don't oversubscribe them
+    per_worker = str(max(1, available_cores() // workers))
+    os.environ.setdefault("PDF_EXTRACT_WORKERS", per_worker)
+    os.environ.setdefault("OMP_NUM_THREADS", per_worker)
+
+
+def bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, threads: int):
+    import uvicorn
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    server = uvicorn.Server(uvicorn.Config(app, log_level=os.getenv("LOG_LEVEL", "info")))
+    server.run(sockets=[sock])
+
+
+def serve(host: str = "127.0.0.1", port: int = 8000, workers: int = None, preload: bool = True):
+    workers = workers or default_workers()
+    configure_shared_state(workers)
+
+    from main import app
+    if preload:
+        from backend.tools.image_tools import warm_up_local_model
+        try:
+            import torch
+            torch.set_num_threads(1)  # Building uncached label embeddings must not start the OpenMP pool
+        except ImportError:
+            pass
+        warm_up_local_model(forward=False)  # Workers run the dummy pass on startup (BIOTROVE_WARMUP)
+    gc.freeze()  # Keep preloaded objects out of GC passes so their pages stay shared
+
+    sock = bind(host, port)
+    threads = max(1, available_cores() // workers)
+    children = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(app, sock, threads)
+            finally:
+                os._exit(0)
+        children[pid] = time.time()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    print(f"EcoBot serving on http://{host}:{port} with {workers} workers", flush=True)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        print(f"Worker {pid} exited with status {status}; restarting", file=sys.stderr, flush=True)
+        if time.time() - started < 1:
+            time.sleep(1)  # Don't spin if workers crash on startup
+        spawn()
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=None, help="Default: WEB_CONCURRENCY or the core count")
+    parser.add_argument("--no-preload", action="store_true", help="Let each worker load the model itself")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, preload=not args.no_preload)
+
+
+if __name__ == "__main__":
+    main()
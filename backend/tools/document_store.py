@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from backend.utils.telemetry import traced
+from backend.utils.uploads import FileSource, sha256_stream
+
+# Where extracted documents are kept between requests and restarts
+DOCUMENT_STORE_PATH = os.getenv(
+    "DOCUMENT_STORE_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".cache", "documents"))
+)
+
+_DOC_ID = re.compile(r'^[0-9a-f]{64}$')
+
+
+class DocumentStore:
+    """Content-addressed store of extracted PDF text, keyed by the SHA-256 of the upload.
+
+    Each document lives in ``<root>/<id[:2]>/<id>/`` as ``text.txt`` plus a
+    ``meta.json`` holding page metadata. Clients hold on to the short document
+    ID instead of the extracted text, and re-uploading a known file skips
+    extraction entirely.
+    """
+
+    def __init__(self, root: str = DOCUMENT_STORE_PATH):
+        self.root = root
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def document_id(file_content: FileSource) -> str:
+        """SHA-256 of the PDF's bytes; a path is hashed in chunks rather than read whole."""
+        if isinstance(file_content, str):
+            with open(file_content, "rb") as f:
+                return sha256_stream(f)[0]
+        return hashlib.sha256(file_content).hexdigest()
+
+    @staticmethod
+    def is_valid_id(doc_id: str) -> bool:
+        return bool(doc_id) and bool(_DOC_ID.match(doc_id))
+
+    def _dir(self, doc_id: str) -> str:
+        return os.path.join(self.root, doc_id[:2], doc_id)
+
+    def path(self, doc_id: str, name: str) -> str:
+        """Path of a file stored alongside a document (text, metadata, indexes)."""
+        return os.path.join(self._dir(doc_id), name)
+
+    def exists(self, doc_id: str) -> bool:
+        return self.is_valid_id(doc_id) and os.path.exists(self.path(doc_id, "meta.json"))
+
+    def get(self, doc_id: str) -> Optional[Dict]:
+        """Return the document's metadata plus its full text, or None if unknown."""
+        if not self.exists(doc_id):
+            return None
+        with open(self.path(doc_id, "meta.json"), encoding="utf-8") as f:
+            document = json.load(f)
+        with open(self.path(doc_id, "text.txt"), encoding="utf-8") as f:
+            document["text"] = f.read()
+        return document
+
+    def put(self, doc_id: str, pages: List[str], filename: Optional[str] = None) -> Dict:
+        """Store per-page text for a document and return it with its metadata."""
+        page_meta, parts, offset = [], [], 0
+        for number, page_text in enumerate(pages, start=1):
+            if not page_text:
+                continue
+            if parts:
+                offset += 1  # joining newline
+            page_meta.append({"page": number, "offset": offset, "chars": len(page_text)})
+            parts.append(page_text)
+            offset += len(page_text)
+
+        text = "\n".join(parts)
+        meta = {
+            "doc_id": doc_id,
+            "filename": filename,
+            "page_count": len(pages),
+            "pages": page_meta,
+            "chars": len(text),
+            "created_at": time.time()
+        }
+
+        with self._lock:
+            os.makedirs(self._dir(doc_id), exist_ok=True)
+            self._write(self.path(doc_id, "text.txt"), text)
+            self._write(self.path(doc_id, "meta.json"), json.dumps(meta))  # written last: marks completion
+        return {**meta, "text": text}
+
+    @traced("documents.get_or_extract")
+    def get_or_extract(self, file_content: FileSource, extract: Callable[[FileSource], List[str]],
+                       filename: Optional[str] = None) -> Dict:
+        """Return the stored document for these bytes (or this file), extracting and storing it on first sight."""
+        doc_id = self.document_id(file_content)
+        document = self.get(doc_id)
+        if document is None:
+            document = self.put(doc_id, extract(file_content), filename)
+        return document
+
+    @staticmethod
+    def _write(path: str, content: str):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+
+document_store = DocumentStore()
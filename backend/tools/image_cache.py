@@ -0,0 +1,175 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+import numpy as np
+from PIL import Image
+
+from backend.utils.shared_state import SQLiteDatabase
+
+# Cache configuration (set IMAGE_CACHE_PATH="" to keep the cache in memory only)
+IMAGE_CACHE_PATH = os.getenv(
+    "IMAGE_CACHE_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".cache", "image_cache.db"))
+)
+IMAGE_CACHE_MAX_ENTRIES = int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", 2000))
+IMAGE_CACHE_HASH_DISTANCE = int(os.getenv("IMAGE_CACHE_HASH_DISTANCE", 6))  # of 64 bits
+IMAGE_CACHE_SIMILARITY = float(os.getenv("IMAGE_CACHE_SIMILARITY", 0.95))  # cosine, CLIP embeddings
+
+IMAGE_CACHE_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS image_answers ("
+    "id INTEGER PRIMARY KEY, query TEXT NOT NULL, phash TEXT NOT NULL, embedding BLOB, "
+    "answer TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL);"
+)
+
+
+def perceptual_hash(image: Image.Image) -> int:
+    """64-bit difference hash: stable across re-compression, resizing and small edits."""
+    pixels = np.asarray(image.convert("L").resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+
+def _normalize_query(query: str) -> str:
+    return re.sub(r'\s+', ' ', query or "").strip().lower()
+
+
+class ImageAnswerCache:
+    """Vision answers keyed by image similarity, persisted in SQLite and bounded in size.
+
+    A lookup first compares 64-bit perceptual hashes (exact re-sends and
+    re-compressed copies) and then, when an ``embedder`` is available, the
+    cosine similarity of BioTrove-CLIP image embeddings (crops and other near
+    duplicates). Entries are only matched against answers to the same
+    normalised question. The least recently used entries are evicted once the
+    cache holds more than ``max_entries``. Entries written by other worker
+    processes sharing the file are picked up on the next lookup.
+    """
+
+    def __init__(self, path: str = IMAGE_CACHE_PATH, max_entries: int = IMAGE_CACHE_MAX_ENTRIES,
+                 hash_distance: int = IMAGE_CACHE_HASH_DISTANCE, similarity: float = IMAGE_CACHE_SIMILARITY,
+                 embedder: Optional[Callable[[Image.Image], Optional[np.ndarray]]] = None):
+        self.max_entries = max_entries
+        self.hash_distance = hash_distance
+        self.similarity = similarity
+        self.embedder = embedder
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # id -> (query, phash, embedding or None), LRU order
+        self._stats = {"exact_hits": 0, "hash_hits": 0, "embedding_hits": 0, "misses": 0, "evictions": 0}
+        self._database = SQLiteDatabase(path, IMAGE_CACHE_SCHEMA)
+        self._synced_id = 0
+        with self._lock:
+            self._sync("ORDER BY last_used")
+            self._conn.commit()
+
+    @property
+    def _conn(self):
+        return self._database.connection()
+
+    def _sync(self, order: str = "ORDER BY id"):
+        """Load rows added since the last sync (by this or another worker process)."""
+        for row_id, query, phash, embedding in self._conn.execute(
+            f"SELECT id, query, phash, embedding FROM image_answers WHERE id > ? {order}", (self._synced_id,)
+        ):
+            vector = np.frombuffer(embedding, dtype=np.float32) if embedding else None
+            self._entries[row_id] = (query, int(phash), vector)
+            self._synced_id = max(self._synced_id, row_id)
+        self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._conn.execute("DELETE FROM image_answers WHERE id = ?", (evicted,))
+            self._stats["evictions"] += 1
+
+    def _embed(self, image: Image.Image) -> Optional[np.ndarray]:
+        if self.embedder is None:
+            return None
+        try:
+            vector = self.embedder(image)
+        except Exception:
+            return None
+        return None if vector is None else np.asarray(vector, dtype=np.float32).ravel()
+
+    def _hash_match(self, query: str, phash: int):
+        """Closest entry within the Hamming threshold, plus embedding candidates as a fallback."""
+        best = None
+        candidates = []
+        for row_id, (entry_query, entry_hash, vector) in self._entries.items():
+            if entry_query != query:
+                continue
+            distance = (entry_hash ^ phash).bit_count()
+            if distance <= self.hash_distance and (best is None or distance < best[0]):
+                best = (distance, row_id)
+            if vector is not None:
+                candidates.append((row_id, vector))
+        if best is not None:
+            return (best[1], "exact_hits" if best[0] == 0 else "hash_hits"), []
+        return None, candidates
+
+    def _embedding_match(self, image: Image.Image, candidates: list):
+        vector = self._embed(image)
+        if vector is None or not candidates:
+            return None
+        similarities = np.stack([v for _, v in candidates]) @ vector
+        i = int(np.argmax(similarities))
+        return (candidates[i][0], "embedding_hits") if similarities[i] >= self.similarity else None
+
+    def lookup(self, image: Image.Image, query: str) -> Optional[str]:
+        """Cached answer for this (or a near-identical) image and question, if any."""
+        if image is None:
+            return None
+        query = _normalize_query(query)
+        phash = perceptual_hash(image)
+        with self._lock:
+            self._sync()
+            self._conn.commit()
+            match, candidates = self._hash_match(query, phash)
+        if match is None and candidates:
+            match = self._embedding_match(image, candidates)  # model inference: outside the lock
+
+        with self._lock:
+            if match is None or match[0] not in self._entries:
+                self._stats["misses"] += 1
+                return None
+            row_id, kind = match
+            row = self._conn.execute("SELECT answer FROM image_answers WHERE id = ?", (row_id,)).fetchone()
+            if row is None:  # Evicted by another worker
+                del self._entries[row_id]
+                self._stats["misses"] += 1
+                return None
+            self._stats[kind] += 1
+            self._entries.move_to_end(row_id)
+            self._conn.execute("UPDATE image_answers SET last_used = ? WHERE id = ?", (time.time(), row_id))
+            self._conn.commit()
+        return row[0]
+
+    def store(self, image: Image.Image, query: str, answer: str):
+        """Remember the answer for this image, evicting least recently used entries past the limit."""
+        if image is None or not answer:
+            return
+        query = _normalize_query(query)
+        phash = perceptual_hash(image)
+        vector = self._embed(image)
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO image_answers (query, phash, embedding, answer, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (query, str(phash), vector.tobytes() if vector is not None else None, answer, now, now)
+            )
+            self._entries[cursor.lastrowid] = (query, phash, vector)
+            self._synced_id = max(self._synced_id, cursor.lastrowid)
+            self._evict()
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        hits = stats["exact_hits"] + stats["hash_hits"] + stats["embedding_hits"]
+        stats["hit_rate"] = round(hits / (hits + stats["misses"]), 4) if hits + stats["misses"] else 0.0
+        return stats
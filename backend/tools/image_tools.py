@@ -1,36 +1,406 @@
+import asyncio
 import base64
 import io
-from backend.tools.openai_client import client  # Use shared OpenAI client
+import os
+import re
+import sys
+import threading
+import time
+from PIL import Image, ImageOps
+from backend.tools.openai_client import chat_completion, achat_completion, astream_chat  # Shared, rate-limited OpenAI calls
+from backend.tools.image_cache import ImageAnswerCache
+from backend.utils.telemetry import traced
+from backend.utils.uploads import FileSource, source_buffer, source_size
 
-def encode_image(file_content: bytes, file_type: str) -> str:
-    """Encodes an image to Base64 format for GPT-4o processing."""
+# Answer from the local BioTrove-CLIP model when its top label is at least this likely
+BIOTROVE_CONFIDENCE = float(os.getenv("BIOTROVE_CONFIDENCE", 0.6))
+
+@traced("image.encode")
+def encode_image(file_content: FileSource, file_type: str) -> str:
+    """Encodes an image (bytes, or a file path that is memory-mapped) to Base64 format for GPT-4o processing."""
     try:
-        base64_encoded = base64.b64encode(file_content).decode("utf-8")
+        with source_buffer(file_content) as buffer:
+            base64_encoded = base64.b64encode(buffer).decode("utf-8")
         return f"data:image/{file_type.split('/')[-1]};base64,{base64_encoded}"
     except Exception as e:
         return None
 
-def process_image_with_gpt4o(file_content: bytes, file_type: str, query="Identify this species.") -> str:
-    """Sends an image to GPT-4o for species identification."""
-    image_data_url = encode_image(file_content, file_type)
-
-    if not image_data_url:
-        return "❌ Error: Image encoding failed."
-
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": query},
-                        {"type": "image_url", "image_url": {"url": image_data_url, "detail": "high"}},
-                    ],
-                }
+# Vision payload settings: GPT-4o fits "high" images in 2048x2048 then scales the short side
+# to 768px, and "low" images are processed at 512x512, so anything larger is wasted upload.
+VISION_DETAIL = os.getenv("VISION_DETAIL", "auto")  # auto | low | high
+VISION_HIGH_MAX_SIDE = 2048
+VISION_HIGH_SHORT_SIDE = 768
+VISION_LOW_SIDE = 512
+VISION_FORMAT = os.getenv("VISION_IMAGE_FORMAT", "JPEG")  # JPEG or WEBP
+VISION_QUALITY = int(os.getenv("VISION_IMAGE_QUALITY", 85))
+VISION_NATIVE_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif")  # accepted as-is by the API
+
+# Answers matching this are treated as uncertain and retried at high detail
+UNCERTAIN_ANSWER = re.compile(
+    r"\b(?:unclear|uncertain|not (?:entirely )?(?:sure|certain|clear)|can(?:not|'t|not be) (?:determine|identify|tell|be sure)|"
+    r"difficult to (?:identify|determine|tell|say)|hard to (?:identify|determine|tell|say)|unable to (?:identify|determine)|"
+    r"(?:too )?(?:blurry|low[- ]resolution|pixelated)|higher[- ]resolution|closer (?:look|image)|more detail)",
+    re.IGNORECASE
+)
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    "images": 0, "original_bytes": 0, "sent_bytes": 0, "escalations": 0, "undecodable": 0,
+    "preprocess_ms_total": 0.0, "request_ms_total": 0.0, "request_ms_max": 0.0
+}
+
+def _record(**values):
+    with _metrics_lock:
+        for key, value in values.items():
+            if key == "request_ms_max":
+                _metrics[key] = max(_metrics[key], value)
+            else:
+                _metrics[key] += value
+
+def image_metrics() -> dict:
+    """Bytes saved by preprocessing and per-image latency for vision calls."""
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    images = metrics["images"] or 1
+    metrics["bytes_saved"] = metrics["original_bytes"] - metrics["sent_bytes"]
+    metrics["avg_preprocess_ms"] = round(metrics["preprocess_ms_total"] / images, 2)
+    metrics["avg_request_ms"] = round(metrics["request_ms_total"] / images, 2)
+    return metrics
+
+
+class PreparedImage:
+    """An upload decoded once and re-encoded at the resolution each vision detail level uses.
+
+    ``file_content`` is the image's bytes or the path of the uploaded file;
+    a path is decoded straight from disk. Falls back to sending the original
+    bytes when Pillow cannot decode the file.
+    """
+
+    def __init__(self, file_content: FileSource, file_type: str):
+        start = time.perf_counter()
+        self.file_content = file_content
+        self.file_type = file_type
+        self.original_bytes = source_size(file_content)
+        self._urls = {}
+        self.sent_bytes = 0
+        try:
+            image = Image.open(file_content if isinstance(file_content, str) else io.BytesIO(file_content))
+            image.draft("RGB", (VISION_HIGH_MAX_SIDE, VISION_HIGH_MAX_SIDE))  # JPEG: decode at reduced scale
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            image.thumbnail(self._high_size(image.size), Image.LANCZOS)
+            self.image = image
+        except Exception:
+            self.image = None
+        self.preprocess_ms = (time.perf_counter() - start) * 1000
+
+    @staticmethod
+    def _high_size(size) -> tuple:
+        width, height = size
+        scale = min(1.0, VISION_HIGH_MAX_SIDE / max(width, height))
+        scale = min(scale, VISION_HIGH_SHORT_SIDE / max(1, min(width, height) * scale) * scale)
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    @traced("image.encode")
+    def data_url(self, detail: str) -> str:
+        """Base64 data URL sized for ``detail`` (``low`` or ``high``), encoded at most once per level."""
+        if detail in self._urls:
+            return self._urls[detail]
+        start = time.perf_counter()
+        if self.image is None:
+            url = encode_image(self.file_content, self.file_type)
+            payload = self.original_bytes
+        else:
+            image = self.image
+            if detail == "low":
+                image = image.copy()
+                image.thumbnail((VISION_LOW_SIDE, VISION_LOW_SIDE), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, format=VISION_FORMAT, quality=VISION_QUALITY)
+            if buffer.tell() < self.original_bytes or self.file_type not in VISION_NATIVE_TYPES:
+                payload = buffer.tell()
+                url = encode_image(buffer.getvalue(), f"image/{VISION_FORMAT.lower()}")
+            else:  # Already compact and small enough: re-encoding would only add bytes
+                payload = self.original_bytes
+                url = encode_image(self.file_content, self.file_type)
+        self.preprocess_ms += (time.perf_counter() - start) * 1000
+        self.sent_bytes += payload
+        self._urls[detail] = url
+        return url
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+def _local_embedding(image):
+    """BioTrove-CLIP embedding for the answer cache, only if the model is already loaded."""
+    if local_model_status() != "loaded":
+        return None
+    from backend.image_classifier import embed_image
+    return embed_image(image)
+
+def get_answer_cache() -> ImageAnswerCache:
+    """Shared near-duplicate answer cache, opened on first use."""
+    global _answer_cache
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = ImageAnswerCache(embedder=_local_embedding)
+    return _answer_cache
+
+def image_cache_stats() -> dict:
+    return get_answer_cache().stats()
+
+def _image_messages(image_data_url: str, query: str, detail: str = "high") -> list:
+    """Builds the vision chat messages for a single image."""
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": query},
+                {"type": "image_url", "image_url": {"url": image_data_url, "detail": detail}},
             ],
-            max_tokens=500,
-        )
-        return response.choices[0].message.content
+        }
+    ]
+
+def _detail_levels(detail: str) -> list:
+    """``auto`` tries the cheap low-detail pass first and escalates only if needed."""
+    return ["low", "high"] if detail == "auto" else [detail]
+
+def is_uncertain(answer: str) -> bool:
+    return bool(UNCERTAIN_ANSWER.search(answer or ""))
+
+def _finish(prepared: PreparedImage, started: float, escalated: bool):
+    request_ms = (time.perf_counter() - started) * 1000
+    _record(
+        images=1, original_bytes=prepared.original_bytes, sent_bytes=prepared.sent_bytes,
+        escalations=int(escalated), undecodable=int(prepared.image is None),
+        preprocess_ms_total=prepared.preprocess_ms, request_ms_total=request_ms, request_ms_max=request_ms
+    )
+
+@traced("image.answer")
+def process_image_with_gpt4o(file_content: FileSource, file_type: str, query="Identify this species.",
+                             detail: str = VISION_DETAIL) -> str:
+    """Sends an image to GPT-4o for species identification."""
+    started = time.perf_counter()
+    prepared = PreparedImage(file_content, file_type)
+    cached = get_answer_cache().lookup(prepared.image, query)
+    if cached is not None:
+        return cached
+    levels = _detail_levels(detail)
+    answer = None
+
+    try:
+        for level in levels:
+            image_data_url = prepared.data_url(level)
+            if not image_data_url:
+                return "❌ Error: Image encoding failed."
+            response = chat_completion(
+                model="gpt-4o",
+                messages=_image_messages(image_data_url, query, level),
+                max_tokens=500,
+            )
+            answer = response.choices[0].message.content
+            if not is_uncertain(answer):
+                break
+        _finish(prepared, started, escalated=len(prepared._urls) > 1)
+        get_answer_cache().store(prepared.image, query, answer)
+        return answer
+    except Exception as e:
+        return f"❌ Error processing image: {str(e)}"
+
+@traced("image.answer")
+async def aprocess_image_with_gpt4o(file_content: FileSource, file_type: str, query="Identify this species.",
+                                    detail: str = VISION_DETAIL) -> str:
+    """Async variant of `process_image_with_gpt4o`; decoding and encoding run off the event loop."""
+    started = time.perf_counter()
+    prepared = await asyncio.to_thread(PreparedImage, file_content, file_type)
+    cached = await asyncio.to_thread(get_answer_cache().lookup, prepared.image, query)
+    if cached is not None:
+        return cached
+    levels = _detail_levels(detail)
+    answer = None
+
+    try:
+        for level in levels:
+            image_data_url = await asyncio.to_thread(prepared.data_url, level)
+            if not image_data_url:
+                return "❌ Error: Image encoding failed."
+            response = await achat_completion(
+                model="gpt-4o",
+                messages=_image_messages(image_data_url, query, level),
+                max_tokens=500,
+            )
+            answer = response.choices[0].message.content
+            if not is_uncertain(answer):
+                break
+        _finish(prepared, started, escalated=len(prepared._urls) > 1)
+        await asyncio.to_thread(get_answer_cache().store, prepared.image, query, answer)
+        return answer
     except Exception as e:
         return f"❌ Error processing image: {str(e)}"
+
+@traced("image.answer_stream")
+async def astream_image_with_gpt4o(file_content: FileSource, file_type: str, query="Identify this species.",
+                                   detail: str = VISION_DETAIL):
+    """Streaming variant of `aprocess_image_with_gpt4o`.
+
+    Only the final detail level is streamed: a low-detail answer has to be
+    complete before we know whether to escalate, so it is sent in one piece.
+    """
+    started = time.perf_counter()
+    prepared = await asyncio.to_thread(PreparedImage, file_content, file_type)
+    cached = await asyncio.to_thread(get_answer_cache().lookup, prepared.image, query)
+    if cached is not None:
+        yield cached
+        return
+    levels = _detail_levels(detail)
+    answer = None
+
+    try:
+        for i, level in enumerate(levels):
+            image_data_url = await asyncio.to_thread(prepared.data_url, level)
+            if not image_data_url:
+                yield "❌ Error: Image encoding failed."
+                return
+            messages = _image_messages(image_data_url, query, level)
+            if i < len(levels) - 1:
+                response = await achat_completion(
+                    model="gpt-4o", messages=messages, max_tokens=500
+                )
+                answer = response.choices[0].message.content
+                if not is_uncertain(answer):
+                    yield answer
+                    break
+                continue
+            parts = []
+            async for delta in astream_chat(model="gpt-4o", messages=messages, max_tokens=500):
+                parts.append(delta)
+                yield delta
+            answer = "".join(parts)
+    except Exception as e:
+        yield f"❌ Error processing image: {str(e)}"
+        return
+    _finish(prepared, started, escalated=len(prepared._urls) > 1)
+    await asyncio.to_thread(get_answer_cache().store, prepared.image, query, answer)
+
+_local_model_unavailable = False
+
+def warm_up_local_model(forward: bool = True):
+    """Loads BioTrove-CLIP ahead of the first image request (no-op without torch/open_clip).
+
+    ``forward=False`` skips the dummy forward pass (see `backend.image_classifier.warm_up`).
+    """
+    global _local_model_unavailable
+    try:
+        from backend.image_classifier import warm_up  # Optional: needs torch + open_clip
+    except ImportError:
+        _local_model_unavailable = True
+        return
+    try:
+        warm_up(forward)
+    except Exception:
+        pass  # Reported through local_model_status()
+
+def local_model_status() -> str:
+    """Status of the local model without triggering an import or load."""
+    if _local_model_unavailable:
+        return "unavailable"
+    classifier = sys.modules.get("backend.image_classifier")
+    return classifier.model_status() if classifier else "not_loaded"
+
+@traced("image.classify_local")
+def classify_image_locally(file_content: FileSource, top_k: int = 5):
+    """Top-k taxa from the local BioTrove-CLIP model, or None if it is unavailable."""
+    global _local_model_unavailable
+    if _local_model_unavailable:
+        return None
+    try:
+        from backend.image_classifier import classify_with_biotrove  # Optional: needs torch + open_clip
+    except ImportError:
+        _local_model_unavailable = True
+        return None
+    try:
+        return classify_with_biotrove(file_content, top_k)
+    except Exception:
+        return None
+
+@traced("image.classify_local")
+async def aclassify_image_locally(file_content: FileSource, top_k: int = 5):
+    """Async variant of `classify_image_locally`; concurrent requests are micro-batched."""
+    global _local_model_unavailable
+    if _local_model_unavailable:
+        return None
+    try:
+        from backend.image_classifier import aclassify_with_biotrove  # Optional: needs torch + open_clip
+    except ImportError:
+        _local_model_unavailable = True
+        return None
+    try:
+        return await aclassify_with_biotrove(file_content, top_k)
+    except Exception:
+        return None
+
+def format_local_identification(predictions: list) -> str:
+    best = predictions[0]
+    others = ", ".join(f"{p['label']} ({p['probability']:.0%})" for p in predictions[1:4])
+    return (
+        f"🔬 **{best['common_name']}** (*{best['scientific_name']}*), "
+        f"{best['probability']:.0%} confidence (local BioTrove-CLIP model)."
+        + (f"  \nOther candidates: {others}" if others else "")
+    )
+
+def _escalation_query(query: str, predictions) -> str:
+    """Pass the local model's guesses to GPT-4o as hints."""
+    if not predictions:
+        return query
+    best = predictions[0]
+    if best["probability"] >= BIOTROVE_CONFIDENCE:
+        return f"{query}\n\nA local classifier identified it as {best['label']} ({best['probability']:.0%} confidence)."
+    candidates = ", ".join(f"{p['label']} ({p['probability']:.0%})" for p in predictions[:5])
+    return f"{query}\n\nA local classifier suggested (low confidence): {candidates}"
+
+_SUBJECT = r"(?:species|animal|plant|bird|insect|creature|fungus|mushroom|tree|flower|fish|organism)"
+# Questions the local label answers on its own ("What species is this?"); anything else goes to GPT-4o
+IDENTIFICATION_REQUEST = re.compile(
+    rf"(?:(?:can you |please )?(?:identify|name) (?:this|the|it)(?: {_SUBJECT})?"
+    rf"|what(?:s| is) (?:this|that|it)(?: {_SUBJECT})?"
+    rf"|what (?:(?:kind|type|sort) of )?{_SUBJECT} is (?:this|that|it))?(?: please)?"
+)
+
+def is_identification_request(query: str) -> bool:
+    normalized = re.sub(r"\s+", " ", re.sub(r"[^\w\s]", "", (query or "").lower())).strip()
+    return IDENTIFICATION_REQUEST.fullmatch(normalized) is not None
+
+def _answers_locally(query: str, predictions) -> bool:
+    """A confident local label is the whole answer only when the user just asked what it is."""
+    return bool(predictions) and predictions[0]["probability"] >= BIOTROVE_CONFIDENCE and is_identification_request(query)
+
+@traced("image.identify")
+def identify_species(file_content: FileSource, file_type: str, query="Identify this species.") -> str:
+    """Identifies the species with the local model first, escalating to GPT-4o when unsure.
+
+    A confident local label answers plain identification requests; other questions about the
+    image go to GPT-4o with that label as a hint.
+    """
+    predictions = classify_image_locally(file_content)
+    if _answers_locally(query, predictions):
+        return format_local_identification(predictions)
+    return process_image_with_gpt4o(file_content, file_type, _escalation_query(query, predictions))
+
+@traced("image.identify")
+async def aidentify_species(file_content: FileSource, file_type: str, query="Identify this species.") -> str:
+    """Async variant of `identify_species`; local inference is micro-batched off the event loop."""
+    predictions = await aclassify_image_locally(file_content)
+    if _answers_locally(query, predictions):
+        return format_local_identification(predictions)
+    return await aprocess_image_with_gpt4o(file_content, file_type, _escalation_query(query, predictions))
+
+@traced("image.identify_stream")
+async def astream_identify_species(file_content: FileSource, file_type: str, query="Identify this species."):
+    """Streaming variant of `aidentify_species`; a confident local result is yielded in one piece."""
+    predictions = await aclassify_image_locally(file_content)
+    if _answers_locally(query, predictions):
+        yield format_local_identification(predictions)
+        return
+    async for delta in astream_image_with_gpt4o(file_content, file_type, _escalation_query(query, predictions)):
+        yield delta
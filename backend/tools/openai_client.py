@@ -1,11 +1,394 @@
+import asyncio
+import contextlib
+import email.utils
 import os
-from openai import OpenAI
+import random
+import threading
+import time
 
-# Load OpenAI API Key
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+import httpx
+import openai
+from openai import OpenAI, AsyncOpenAI
+from backend.utils.token_budget import fit_messages
+from backend.utils.telemetry import traced, openai_seconds
 
-if not OPENAI_API_KEY:
-    raise ValueError("❌ Missing OpenAI API Key. Set OPENAI_API_KEY in your environment variables.")
+# Connection pool and timeouts shared by every OpenAI call in the process
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", 60))  # seconds per request
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", 5))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", 50))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", 20))
+# At most this many requests in flight (per process, and per event loop for async calls)
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", 16))
+# Requests per minute per model, e.g. "gpt-4o=500,gpt-4o-mini=1000"; other models use the default
+OPENAI_RATE_LIMITS = os.getenv("OPENAI_RATE_LIMITS", "")
+OPENAI_DEFAULT_RPM = float(os.getenv("OPENAI_DEFAULT_RPM", 500))
+OPENAI_RATE_BURST = float(os.getenv("OPENAI_RATE_BURST", 10))
+# Retries of transient failures (429, 5xx, timeouts, dropped connections)
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", 3))
+OPENAI_BACKOFF_BASE = float(os.getenv("OPENAI_BACKOFF_BASE", 0.5))  # seconds
+OPENAI_BACKOFF_MAX = float(os.getenv("OPENAI_BACKOFF_MAX", 8))
+OPENAI_MAX_RETRY_AFTER = float(os.getenv("OPENAI_MAX_RETRY_AFTER", 20))  # longer waits fail instead
+# Fail fast after this many consecutive failed calls, for the cool-down period
+OPENAI_BREAKER_THRESHOLD = int(os.getenv("OPENAI_BREAKER_THRESHOLD", 5))
+OPENAI_BREAKER_COOLDOWN = float(os.getenv("OPENAI_BREAKER_COOLDOWN", 30))
 
-# Initialize OpenAI Client
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Shared OpenAI clients, created on first use so importing the backend stays cheap
+_client = None
+_async_client = None
+_lock = threading.Lock()
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the API while the circuit breaker is open."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests per second with bursts of up to `capacity`.
+
+    `reserve()` takes a token and returns how long the caller must wait before
+    using it, so the same bucket serves threads (time.sleep) and coroutines
+    (asyncio.sleep).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; after `cooldown` seconds one probe call is let through."""
+
+    def __init__(self, threshold: int = OPENAI_BREAKER_THRESHOLD, cooldown: float = OPENAI_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        """Raises `CircuitOpenError` while open; True if the caller is the half-open probe.
+
+        The probe must call `release_probe` when its attempt ends, however it ends.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            remaining = self.cooldown - (time.monotonic() - self.opened_at)
+            if remaining > 0 or self._probing:
+                raise CircuitOpenError(
+                    f"OpenAI API unavailable after {self.failures} consecutive failures; "
+                    f"retrying in {max(remaining, 0):.0f}s"
+                )
+            self._probing = True
+            return True
+
+    def release_probe(self):
+        """Let the next caller probe (after a cancelled probe, or one that left the state unchanged)."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+def _parse_rate_limits(spec: str) -> dict:
+    limits = {}
+    for item in spec.split(","):
+        model, _, rpm = item.partition("=")
+        if model.strip() and rpm.strip():
+            limits[model.strip()] = float(rpm)
+    return limits
+
+
+_rate_limits = _parse_rate_limits(OPENAI_RATE_LIMITS)
+_buckets = {}
+breaker = CircuitBreaker()
+_sync_slots = threading.BoundedSemaphore(OPENAI_MAX_CONCURRENCY)
+_async_slots = None
+_async_slots_loop = None
+_stats = {"requests": 0, "retries": 0, "failures": 0, "rejected": 0, "throttled_seconds": 0.0}
+_usage = {}  # model -> {"calls", "input_tokens", "output_tokens"}
+
+
+def _bucket(model: str) -> TokenBucket:
+    bucket = _buckets.get(model)
+    if bucket is None:
+        with _lock:
+            bucket = _buckets.setdefault(
+                model, TokenBucket(_rate_limits.get(model, OPENAI_DEFAULT_RPM) / 60, OPENAI_RATE_BURST)
+            )
+    return bucket
+
+
+def _get_async_slots() -> asyncio.Semaphore:
+    """The async concurrency limit, recreated if the event loop changed."""
+    global _async_slots, _async_slots_loop
+    loop = asyncio.get_running_loop()
+    if _async_slots is None or _async_slots_loop is not loop:
+        _async_slots = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+        _async_slots_loop = loop
+    return _async_slots
+
+
+def _retry_after(error) -> float:
+    """Seconds the server asked us to wait (Retry-After / retry-after-ms), or None."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_transient(error) -> bool:
+    if isinstance(error, openai.APIConnectionError):  # Includes timeouts
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+def _retry_delay(error, attempt: int):
+    """Seconds to wait before retrying after `error`, or None to give up."""
+    if attempt >= OPENAI_MAX_RETRIES or not _is_transient(error):
+        return None
+    # Full jitter keeps workers that failed together from retrying together
+    delay = random.uniform(0, min(OPENAI_BACKOFF_MAX, OPENAI_BACKOFF_BASE * 2 ** attempt))
+    retry_after = _retry_after(error)
+    if retry_after is not None:
+        if retry_after > OPENAI_MAX_RETRY_AFTER:
+            return None
+        delay = retry_after + random.uniform(0, OPENAI_BACKOFF_BASE)
+    return delay
+
+
+def _record(error):
+    """Update the breaker after a call that will not be retried any more."""
+    if error is None or (isinstance(error, openai.APIStatusError) and not _is_transient(error)):
+        breaker.record_success()  # A 4xx such as 400 or 404 is a bad request; the API itself is up
+    elif _is_transient(error):
+        breaker.record_failure()  # Includes a 429 still returned after every retry: stop piling on
+    if error is not None:
+        _count("failures")
+
+
+def _count(stat: str, amount=1):
+    """Add to a client stat; calls from many threads update them at once."""
+    with _lock:
+        _stats[stat] += amount
+
+
+def _budgeted(kwargs: dict) -> dict:
+    """Request arguments with the messages trimmed to the model's prompt budget."""
+    if "messages" not in kwargs:
+        return kwargs
+    return dict(kwargs, messages=fit_messages(kwargs["messages"], kwargs.get("model", "")))
+
+
+def _record_usage(model: str, usage):
+    """Add a response's token counts to the per-model totals."""
+    if usage is None:
+        return
+    with _lock:
+        totals = _usage.setdefault(model, {"calls": 0, "input_tokens": 0, "output_tokens": 0})
+        totals["calls"] += 1
+        totals["input_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+        totals["output_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+
+def _observe(model: str, started: float, error=None):
+    """Latency of one API attempt, labelled by model and outcome (ok, HTTP status or error type)."""
+    if error is None:
+        outcome = "ok"
+    else:
+        outcome = str(getattr(error, "status_code", "") or type(error).__name__)
+    openai_seconds.observe(time.perf_counter() - started, model=model, outcome=outcome)
+
+
+def _api_key() -> str:
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("❌ Missing OpenAI API Key. Set OPENAI_API_KEY in your environment variables.")
+    return api_key
+
+
+def _http_options() -> dict:
+    return {
+        "timeout": httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        "limits": httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                               max_keepalive_connections=OPENAI_MAX_KEEPALIVE),
+    }
+
+
+def get_client() -> OpenAI:
+    """Returns the process-wide sync OpenAI client (for scripts, tests and worker threads)."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                # Retries are ours (see `chat_completion`), so the SDK's own are disabled
+                _client = OpenAI(api_key=_api_key(), max_retries=0,
+                                 http_client=openai.DefaultHttpxClient(**_http_options()))
+    return _client
+
+
+def get_async_client() -> AsyncOpenAI:
+    """Returns the process-wide async OpenAI client used on the FastAPI event loop."""
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                _async_client = AsyncOpenAI(api_key=_api_key(), max_retries=0,
+                                            http_client=openai.DefaultAsyncHttpxClient(**_http_options()))
+    return _async_client
+
+
+@traced("openai.chat")
+def chat_completion(**kwargs):
+    """`chat.completions.create` with prompt budgeting, rate limiting, bounded concurrency,
+    retries and circuit breaking."""
+    kwargs = _budgeted(kwargs)
+    bucket = _bucket(kwargs.get("model", ""))
+    attempt = 0
+    while True:
+        try:
+            probe = breaker.allow()
+        except CircuitOpenError:
+            _count("rejected")
+            raise
+        try:
+            wait = bucket.reserve()
+            if wait:
+                _count("throttled_seconds", wait)
+                time.sleep(wait)
+            _count("requests")
+            started = time.perf_counter()
+            try:
+                with _sync_slots:
+                    response = get_client().chat.completions.create(**kwargs)
+            except Exception as e:
+                _observe(kwargs.get("model", ""), started, e)
+                delay = _retry_delay(e, attempt)
+                if delay is None:
+                    _record(e)
+                    raise
+                _count("retries")
+                attempt += 1
+                time.sleep(delay)
+                continue
+        finally:
+            if probe:
+                breaker.release_probe()
+        _observe(kwargs.get("model", ""), started)
+        _record(None)
+        _record_usage(kwargs.get("model", ""), getattr(response, "usage", None))
+        return response
+
+
+@traced("openai.chat")
+async def achat_completion(**kwargs):
+    """Async variant of `chat_completion`; waits and backoffs never block the event loop."""
+    return await _arequest(kwargs, hold_slot=True)
+
+
+async def _arequest(kwargs: dict, hold_slot: bool):
+    kwargs = _budgeted(kwargs)
+    bucket = _bucket(kwargs.get("model", ""))
+    attempt = 0
+    while True:
+        try:
+            probe = breaker.allow()
+        except CircuitOpenError:
+            _count("rejected")
+            raise
+        try:
+            wait = bucket.reserve()
+            if wait:
+                _count("throttled_seconds", wait)
+                await asyncio.sleep(wait)
+            _count("requests")
+            started = time.perf_counter()
+            try:
+                async with _get_async_slots() if hold_slot else contextlib.nullcontext():
+                    response = await get_async_client().chat.completions.create(**kwargs)
+            except Exception as e:
+                _observe(kwargs.get("model", ""), started, e)
+                delay = _retry_delay(e, attempt)
+                if delay is None:
+                    _record(e)
+                    raise
+                _count("retries")
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+        finally:
+            if probe:  # Also on cancellation, so a dropped probe cannot leave the breaker stuck open
+                breaker.release_probe()
+        _observe(kwargs.get("model", ""), started)  # Time to the first byte when streaming
+        _record(None)
+        if not kwargs.get("stream"):
+            _record_usage(kwargs.get("model", ""), getattr(response, "usage", None))
+        return response
+
+
+@traced("openai.stream")
+async def astream_chat(**kwargs):
+    """Yields the text deltas of a streamed chat completion as they arrive.
+
+    Opening the stream goes through `achat_completion`; once text has been
+    yielded a failure is raised rather than retried, and the concurrency slot
+    is held until the stream ends.
+    """
+    async with _get_async_slots():
+        stream = await _arequest(dict(kwargs, stream=True, stream_options={"include_usage": True}),
+                                 hold_slot=False)
+        async for chunk in stream:
+            _record_usage(kwargs.get("model", ""), getattr(chunk, "usage", None))  # Only on the last chunk
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+def client_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+        usage = {model: dict(totals) for model, totals in _usage.items()}
+    return dict(stats, breaker=breaker.state, consecutive_failures=breaker.failures,
+                throttled_seconds=round(stats["throttled_seconds"], 3), usage=usage)
@@ -0,0 +1,197 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional
+
+from backend.tools.document_store import document_store
+from backend.utils.telemetry import traced
+from backend.utils.token_budget import count_tokens
+
+# Retrieval settings
+PDF_RETRIEVAL_THRESHOLD = int(os.getenv("PDF_RETRIEVAL_THRESHOLD", 12000))  # chars; smaller docs are sent whole
+PDF_CHUNK_CHARS = int(os.getenv("PDF_CHUNK_CHARS", 1500))
+PDF_CONTEXT_TOKENS = int(os.getenv("PDF_CONTEXT_TOKENS", 3000))
+PDF_TOP_K = int(os.getenv("PDF_TOP_K", 8))
+
+INDEX_FILE = "bm25.json"
+INDEX_VERSION = 1
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+_STOPWORDS = frozenset("""
+a an and are as at be been but by can could did do does for from had has have how i if in into is it its
+may might of on or our should so such than that the their them then there these they this those to was
+we were what when where which while who why will with would you your
+""".split())
+_HEADING = re.compile(
+    r"^(?:\d+(?:\.\d+)*\.?\s+)?(?:abstract|introduction|background|methods?|materials and methods|results|"
+    r"discussion|conclusions?|references|acknowledg(?:e)?ments|case presentation|limitations)\b",
+    re.IGNORECASE
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS and len(t) > 1]
+
+
+def _is_heading(line: str) -> bool:
+    line = line.strip()
+    if not line or len(line) > 80:
+        return False
+    return bool(_HEADING.match(line)) or (line.isupper() and len(line.split()) <= 8)
+
+
+def _split_long_line(line: str, limit: int) -> List[str]:
+    """Cut an over-long line on word boundaries so no chunk exceeds the limit."""
+    if len(line) <= limit:
+        return [line]
+    pieces, current = [], ""
+    for word in line.split(" "):
+        if current and len(current) + len(word) + 1 > limit:
+            pieces.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    return pieces + [current] if current else pieces
+
+
+def chunk_document(document: Dict, chunk_chars: int = PDF_CHUNK_CHARS) -> List[Dict]:
+    """Split a stored document into page- and section-aware chunks.
+
+    Chunks never span pages, are cut on line boundaries, and carry the most
+    recent section heading so the model can cite where an excerpt came from.
+    """
+    text = document["text"]
+    pages = document.get("pages") or [{"page": 1, "offset": 0, "chars": len(text)}]
+    chunks, section = [], None
+
+    for page in pages:
+        buffer = []
+        size = 0
+
+        def flush():
+            body = "\n".join(buffer).strip()
+            if body:
+                chunks.append({"id": len(chunks), "page": page["page"], "section": section, "text": body})
+
+        page_text = text[page["offset"]:page["offset"] + page["chars"]]
+        lines = [piece for line in page_text.split("\n") for piece in _split_long_line(line, chunk_chars)]
+        for line in lines:
+            if _is_heading(line):
+                flush()
+                buffer, size = [], 0
+                section = line.strip()
+            if size + len(line) > chunk_chars and buffer:
+                flush()
+                buffer, size = [], 0
+            buffer.append(line)
+            size += len(line) + 1
+        flush()
+
+    return chunks
+
+
+class BM25Index:
+    """Okapi BM25 over document chunks; small enough to persist as JSON."""
+
+    def __init__(self, chunks: List[Dict], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(tokenize(c["text"])) for c in chunks]
+        self.lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        doc_freqs = Counter(term for tf in self.term_freqs for term in tf)
+        n = len(chunks)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freqs.items()}
+
+    def search(self, query: str, k: int = PDF_TOP_K) -> List[Dict]:
+        """Return up to k chunks ranked by BM25 score (each with a ``score`` field)."""
+        terms = [t for t in set(tokenize(query)) if t in self.idf]
+        if not terms:
+            return []
+        scored = []
+        for i, tf in enumerate(self.term_freqs):
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / (self.avg_length or 1))
+            score = sum(self.idf[t] * tf[t] * (self.k1 + 1) / (tf[t] + norm) for t in terms if t in tf)
+            if score > 0:
+                scored.append((score, i))
+        scored.sort(reverse=True)
+        return [{**self.chunks[i], "score": round(score, 4)} for score, i in scored[:k]]
+
+    def to_dict(self) -> Dict:
+        return {"version": INDEX_VERSION, "k1": self.k1, "b": self.b, "chunks": self.chunks}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "BM25Index":
+        return cls(data["chunks"], data["k1"], data["b"])
+
+
+_loaded = OrderedDict()
+_loaded_lock = threading.Lock()
+_MAX_LOADED = 16
+
+
+def load_or_build_index(document: Dict) -> BM25Index:
+    """Return the document's index, building and persisting it next to the text on first use."""
+    doc_id = document.get("doc_id")
+    with _loaded_lock:
+        if doc_id in _loaded:
+            _loaded.move_to_end(doc_id)
+            return _loaded[doc_id]
+
+    index = None
+    path = document_store.path(doc_id, INDEX_FILE) if document_store.exists(doc_id) else None
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == INDEX_VERSION:
+            index = BM25Index.from_dict(data)
+
+    if index is None:
+        index = BM25Index(chunk_document(document))
+        if path:
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(index.to_dict(), f)
+            os.replace(tmp_path, path)
+
+    if doc_id:
+        with _loaded_lock:
+            _loaded[doc_id] = index
+            while len(_loaded) > _MAX_LOADED:
+                _loaded.popitem(last=False)
+    return index
+
+
+def select_context(index: BM25Index, query: str, token_budget: int = PDF_CONTEXT_TOKENS,
+                   k: int = PDF_TOP_K) -> Optional[str]:
+    """Top-k chunks for the query that fit the token budget, in document order."""
+    selected, used = [], 0
+    for chunk in index.search(query, k):
+        cost = count_tokens(chunk["text"])
+        if used + cost > token_budget:
+            continue
+        selected.append(chunk)
+        used += cost
+    if not selected:
+        return None
+    selected.sort(key=lambda c: c["id"])
+    return "\n\n".join(
+        f"[Page {c['page']}{' · ' + c['section'] if c['section'] else ''}]\n{c['text']}" for c in selected
+    )
+
+
+@traced("pdf.retrieve")
+def retrieve_pdf_context(extracted_text: str, query: str, doc_id: Optional[str] = None) -> str:
+    """Text to send to the model: the whole document if small, otherwise the relevant excerpts."""
+    if len(extracted_text) <= PDF_RETRIEVAL_THRESHOLD:
+        return extracted_text
+    document = document_store.get(doc_id) if doc_id else None
+    if document is None:
+        document = {"doc_id": None, "text": extracted_text}
+    context = select_context(load_or_build_index(document), query)
+    # Nothing matched (e.g. "summarize this"): fall back to the opening of the document
+    return context or extracted_text[:PDF_CONTEXT_TOKENS * 4]
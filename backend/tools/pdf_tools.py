@@ -1,40 +1,207 @@
+import atexit
 import io
+import os
+import tempfile
+import threading
 import pdfplumber
-from backend.tools.openai_client import client  # Use shared OpenAI client
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Iterator, List, Optional, Tuple, Union
+from backend.tools.openai_client import chat_completion, achat_completion, astream_chat  # Shared, rate-limited OpenAI calls
+from backend.utils.token_budget import fit_prompt
+from backend.utils.telemetry import traced
 
-def extract_text_from_pdf(file_content: bytes) -> str:
-    """Extracts text from a PDF file."""
+# Extraction engine settings
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", min(4, os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 4))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", 500))
+PDF_MAX_CHARS = int(os.getenv("PDF_MAX_CHARS", 2_000_000))
+
+PdfSource = Union[bytes, str]
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """Shared process pool per worker count (spawned, so it is safe from threaded servers)."""
+    pool = _pools.get(workers)
+    if pool is None:
+        with _pools_lock:  # Concurrent first callers (e.g. from asyncio.to_thread) must not each spawn a pool
+            pool = _pools.get(workers)
+            if pool is None:
+                pool = _pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+    return pool
+
+@atexit.register
+def _shutdown_pools():
+    for pool in _pools.values():
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _open_pdf(source: PdfSource):
+    return pdfplumber.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+def _extract_page_range(source: PdfSource, start: int, stop: int) -> List[str]:
+    """Extract pages [start, stop) (0-based); runs inside a pool worker."""
+    texts = []
+    with _open_pdf(source) as pdf:
+        for page in pdf.pages[start:stop]:
+            texts.append(page.extract_text() or "")
+            page.close()  # drop pdfplumber's per-page object cache
+    return texts
+
+def count_pdf_pages(source: PdfSource) -> int:
+    with _open_pdf(source) as pdf:
+        return len(pdf.pages)
+
+def iter_pdf_pages(source: PdfSource, workers: Optional[int] = None,
+                   page_range: Optional[Tuple[int, int]] = None,
+                   max_pages: Optional[int] = None, max_chars: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """Yields ``(page_number, text)`` in page order, extracting pages across a process pool.
+
+    ``page_range`` is 1-based and inclusive. Extraction stops once ``max_pages``
+    pages or ``max_chars`` characters have been produced (the last page is cut
+    to fit), and no further work is scheduled after that.
+    """
+    if not isinstance(source, (bytes, str)):
+        raise ValueError("Expected bytes or a file path, but received a different format.")
+
+    workers = workers or PDF_EXTRACT_WORKERS
+    total = count_pdf_pages(source)
+    first, last = page_range or (1, total)
+    first, last = max(first, 1), min(last, total)
+    if max_pages is not None:
+        last = min(last, first + max_pages - 1)
+    if first > last:
+        return
+
+    starts = range(first - 1, last, PDF_PAGES_PER_TASK)
+    chars = 0
+
+    def emit(start, texts):
+        nonlocal chars
+        for number, text in enumerate(texts, start=start + 1):
+            if max_chars is not None and chars + len(text) >= max_chars:
+                yield number, text[:max_chars - chars]
+                chars = max_chars
+                return
+            chars += len(text)
+            yield number, text
+
+    if workers <= 1:
+        for start in starts:
+            yield from emit(start, _extract_page_range(source, start, min(start + PDF_PAGES_PER_TASK, last)))
+            if max_chars is not None and chars >= max_chars:
+                return
+        return
+
+    tmp_path = None
+    if isinstance(source, bytes):  # Ship a path to workers rather than pickling the bytes per task
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+            tmp.write(source)
+        tmp_path = source = tmp.name
+
+    pool = _get_pool(workers)
+    pending = deque()
+    tasks = iter(starts)
     try:
-        if not isinstance(file_content, bytes):  # ✅ Ensure input is bytes
-            raise ValueError("Expected bytes, but received a different format.")
+        # Keep a bounded window in flight so a char budget stops the work early
+        for start in tasks:
+            pending.append((start, pool.submit(_extract_page_range, source, start, min(start + PDF_PAGES_PER_TASK, last))))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            start, future = pending.popleft()
+            yield from emit(start, future.result())
+            if max_chars is not None and chars >= max_chars:
+                return
+            next_start = next(tasks, None)
+            if next_start is not None:
+                pending.append((next_start, pool.submit(_extract_page_range, source, next_start, min(next_start + PDF_PAGES_PER_TASK, last))))
+    finally:
+        for _, future in pending:
+            future.cancel()
+        if tmp_path:
+            for _, future in pending:  # let running tasks finish with the file before removing it
+                if not future.cancelled():
+                    future.exception()
+            os.unlink(tmp_path)
 
-        with pdfplumber.open(io.BytesIO(file_content)) as pdf:
-            extracted_text = "\n".join([page.extract_text() for page in pdf.pages if page.extract_text()])
+@traced("pdf.extract")
+def extract_text_from_pdf(file_content: PdfSource, workers: Optional[int] = None) -> str:
+    """Extracts text from a PDF file."""
+    try:
+        extracted_text = "\n".join(
+            text for _, text in iter_pdf_pages(file_content, workers, max_pages=PDF_MAX_PAGES, max_chars=PDF_MAX_CHARS)
+            if text
+        )
         return extracted_text.strip() if extracted_text else "No readable text found in the PDF."
     except Exception as e:
         return f"❌ Error extracting text from PDF: {str(e)}"
 
+@traced("pdf.extract")
+def extract_pages_from_pdf(file_content: PdfSource, workers: Optional[int] = None) -> List[str]:
+    """Extracts the text of every page (empty string for pages without text), within the page/char budget."""
+    return [text for _, text in iter_pdf_pages(file_content, workers, max_pages=PDF_MAX_PAGES, max_chars=PDF_MAX_CHARS)]
+
+def _pdf_messages(extracted_text: str, query: str, model: str = "gpt-4o") -> list:
+    """Builds the chat messages for answering a question about a document, within the model's token budget."""
+    parts = fit_prompt({
+        "system": """You are EcoBot, an AI-powered ecological assistant. 
+            Provide scientific and informative responses about biodiversity, 
+            species identification, and ecosystems using the provided document text.""",
+        "document": extracted_text,
+        "query": query,
+    }, model)
+    return [
+        {  # Add system message for context
+            "role": "system",
+            "content": parts["system"]
+        },
+        {
+            "role": "user", 
+            "content": f"{parts['query']}\n\nExtracted text:\n{parts['document']}"
+        }
+    ]
+
+@traced("pdf.answer")
 def process_pdf_with_gpt4o(extracted_text: str, query: str) -> str:
     """Sends extracted PDF text to GPT-4o for processing using the user's query."""
     if not extracted_text:
         return "No text extracted from the PDF."
     try:
-        response = client.chat.completions.create(
+        response = chat_completion(
             model="gpt-4o",
-            messages=[
-                {  # Add system message for context
-                    "role": "system",
-                    "content": """You are EcoBot, an AI-powered ecological assistant. 
-                    Provide scientific and informative responses about biodiversity, 
-                    species identification, and ecosystems using the provided document text."""
-                },
-                {
-                    "role": "user", 
-                    "content": f"{query}\n\nExtracted text:\n{extracted_text}"
-                }
-            ],
+            messages=_pdf_messages(extracted_text, query),
             max_tokens=500,
         )
         return response.choices[0].message.content
     except Exception as e:
         return f"❌ Error processing PDF with GPT-4o: {str(e)}"
+
+@traced("pdf.answer")
+async def aprocess_pdf_with_gpt4o(extracted_text: str, query: str) -> str:
+    """Async variant of `process_pdf_with_gpt4o`."""
+    if not extracted_text:
+        return "No text extracted from the PDF."
+    try:
+        response = await achat_completion(
+            model="gpt-4o",
+            messages=_pdf_messages(extracted_text, query),
+            max_tokens=500,
+        )
+        return response.choices[0].message.content
+    except Exception as e:
+        return f"❌ Error processing PDF with GPT-4o: {str(e)}"
+
+@traced("pdf.answer_stream")
+async def astream_pdf_with_gpt4o(extracted_text: str, query: str):
+    """Streaming variant of `aprocess_pdf_with_gpt4o`: yields the answer in chunks."""
+    if not extracted_text:
+        yield "No text extracted from the PDF."
+        return
+    try:
+        async for delta in astream_chat(model="gpt-4o", messages=_pdf_messages(extracted_text, query), max_tokens=500):
+            yield delta
+    except Exception as e:
+        yield f"❌ Error processing PDF with GPT-4o: {str(e)}"
@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from backend.utils.shared_state import SQLiteDatabase
+
+# Cache configuration (TEXT_CACHE_PATH shares answers between worker processes; "" keeps them in memory)
+TEXT_CACHE_PATH = os.getenv("TEXT_CACHE_PATH", "")
+TEXT_CACHE_TTL = int(os.getenv("TEXT_CACHE_TTL", 24 * 3600))  # seconds
+TEXT_CACHE_MAX_ENTRIES = int(os.getenv("TEXT_CACHE_MAX_ENTRIES", 5000))
+TEXT_CACHE_MAX_QUERY_CHARS = int(os.getenv("TEXT_CACHE_MAX_QUERY_CHARS", 500))  # longer prompts carry context
+TEXT_CACHE_SIMILARITY = float(os.getenv("TEXT_CACHE_SIMILARITY", 0.93))  # cosine, CLIP text embeddings
+# Before CLIP loads: 1.0 serves only the same normalized question (n-gram similarity cannot tell
+# "Do foxes eat voles?" from "Do voles eat foxes?")
+TEXT_CACHE_LEXICAL_SIMILARITY = float(os.getenv("TEXT_CACHE_LEXICAL_SIMILARITY", 1.0))
+
+LEXICAL_DIM = 512
+
+TEXT_CACHE_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS text_answers ("
+    "id INTEGER PRIMARY KEY, space TEXT NOT NULL, query TEXT NOT NULL, numbers TEXT NOT NULL, "
+    "answer TEXT NOT NULL, latency REAL NOT NULL, vector BLOB NOT NULL, expires REAL NOT NULL);"
+)
+
+# Questions whose meaning depends on the conversation so far ("tell me more", "what do they eat?")
+FOLLOW_UP = re.compile(
+    r"^\s*(?:tell me more|more|why|how so|go on|continue|and|what about|what else|explain)\b"
+    r"|\b(?:it|its|this|that|they|them|their|these|those|he|she|above|previous)\b",
+    re.IGNORECASE
+)
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+# "t" is what normalize_query leaves of "n't"
+_NEGATION = re.compile(r"\b(?:not|no|never|without|cannot|nor|t|dont|doesnt|isnt|arent|cant|wont|didnt)\b")
+
+
+def normalize_query(query: str) -> str:
+    """Lower-case, drop punctuation and collapse whitespace."""
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s.]|(?<!\d)\.|\.(?!\d)", " ", (query or "").lower())).strip()
+
+
+def _guards(normalized: str) -> tuple:
+    """Terms two queries must share to match: their numbers, and whether they are negated."""
+    return tuple(_NUMBER.findall(normalized)) + (("not",) if _NEGATION.search(normalized) else ())
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith(("xes", "ches", "shes", "sses")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def lexical_embedding(text: str) -> np.ndarray:
+    """Hashed word and character-trigram vector; a cheap stand-in when CLIP is not loaded."""
+    vector = np.zeros(LEXICAL_DIM, dtype=np.float32)
+    for word in text.split():
+        word = _stem(word)
+        features = [f"w:{word}"] + [f"c:{t}" for t in (f" {word} "[i:i + 3] for i in range(len(word)))]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=4).digest()
+            vector[int.from_bytes(digest, "little") % LEXICAL_DIM] += 2.0 if feature[0] == "w" else 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticCache:
+    """Answers to previous queries, looked up by embedding similarity.
+
+    ``embedder(text)`` returns ``(space, vector)``; vectors are compared only
+    with entries from the same space (so answers cached with the lexical
+    fallback are dropped once CLIP takes over) against that space's threshold
+    in ``similarity``. Embeddings live in a preallocated ``max_entries x dim``
+    matrix so the footprint is fixed; entries expire after ``ttl`` seconds and
+    the least recently used one is evicted when the matrix is full. Queries
+    must also mention the same numbers ("in 1990" vs "in 2020") and agree on
+    negation to match; a threshold of 1.0 or more means the normalized
+    queries must be identical.
+
+    With a ``path``, answers are also written to SQLite and every lookup first
+    pulls in rows added by other worker processes, so all workers share one
+    cache while each keeps its own in-memory index.
+    """
+
+    def __init__(self, embedder: Callable[[str], Tuple[str, np.ndarray]], similarity: Dict[str, float],
+                 ttl: int = TEXT_CACHE_TTL, max_entries: int = TEXT_CACHE_MAX_ENTRIES,
+                 max_query_chars: int = TEXT_CACHE_MAX_QUERY_CHARS, path: str = TEXT_CACHE_PATH):
+        self.embedder = embedder
+        self.similarity = similarity
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_query_chars = max_query_chars
+        self._lock = threading.Lock()
+        self._space = None
+        self._vectors = None  # (max_entries, dim) float32, allocated for the first space seen
+        self._expires = np.zeros(max_entries)  # 0 marks a free slot
+        self._slots = OrderedDict()  # slot -> (normalized query, guards, answer, latency), LRU order
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "saved_latency_s": 0.0}
+        self._database = SQLiteDatabase(path, TEXT_CACHE_SCHEMA) if path else None
+        self._synced_id = 0
+        self._own_ids = set()  # rows this process wrote after another worker's unsynced rows
+        self._writes = 0
+
+    def _embed(self, query: str):
+        if len(query) > self.max_query_chars:
+            return None
+        normalized = normalize_query(query)
+        if not normalized:
+            return None
+        try:
+            space, vector = self.embedder(normalized)
+        except Exception:
+            return None
+        return normalized, space, np.asarray(vector, dtype=np.float32).ravel()
+
+    def _reset(self, space: str, dim: int):
+        self._space = space
+        self._vectors = np.zeros((self.max_entries, dim), dtype=np.float32)
+        self._expires[:] = 0
+        self._slots.clear()
+
+    def _free(self, slot: int):
+        self._expires[slot] = 0
+        self._slots.pop(slot, None)
+
+    def _place(self, space: str, vector: np.ndarray, expires: float, entry: tuple):
+        """Put an entry in a free (or expired) slot, evicting the least recently used if full."""
+        if space != self._space or self._vectors.shape[1] != len(vector):
+            self._reset(space, len(vector))
+        free = np.flatnonzero(self._expires <= time.time())  # never used, released or expired
+        if len(free):
+            slot = int(free[0])
+            self._free(slot)
+        else:
+            slot, _ = self._slots.popitem(last=False)
+            self._stats["evictions"] += 1
+        self._vectors[slot] = vector
+        self._expires[slot] = expires
+        self._slots[slot] = entry
+
+    def _sync(self, space: str):
+        """Load answers other workers have written since the last sync."""
+        if self._database is None:
+            return
+        rows = self._database.connection().execute(
+            "SELECT id, query, numbers, answer, latency, vector, expires FROM text_answers "
+            "WHERE id > ? AND space = ? AND expires > ? ORDER BY id", (self._synced_id, space, time.time())
+        ).fetchall()
+        for row_id, normalized, guards, answer, latency, vector, expires in rows:
+            self._synced_id = max(self._synced_id, row_id)
+            if row_id in self._own_ids:
+                self._own_ids.discard(row_id)
+                continue
+            self._place(space, np.frombuffer(vector, dtype=np.float32), expires,
+                        (normalized, tuple(json.loads(guards)), answer, latency))
+
+    def lookup(self, query: str) -> Optional[str]:
+        """Cached answer for a sufficiently similar earlier query, if any."""
+        embedded = self._embed(query)
+        if embedded is None:
+            return None
+        normalized, space, vector = embedded
+        guards = _guards(normalized)
+        now = time.time()
+
+        with self._lock:
+            self._sync(space)
+            if space != self._space or not self._slots:
+                self._stats["misses"] += 1
+                return None
+            expired = np.flatnonzero((self._expires > 0) & (self._expires <= now))
+            for slot in expired:
+                self._free(int(slot))
+            self._stats["expirations"] += len(expired)
+
+            scores = self._vectors @ vector
+            scores[self._expires == 0] = -1.0
+            threshold = self.similarity.get(space, TEXT_CACHE_SIMILARITY)
+            exact = threshold >= 1.0
+            for slot in np.argsort(-scores)[:8]:
+                slot = int(slot)
+                if scores[slot] < min(threshold, 1.0 - 1e-4):  # float32 rounding of identical vectors
+                    break
+                entry_query, entry_guards, answer, latency = self._slots[slot]
+                if entry_guards != guards or (exact and entry_query != normalized):
+                    continue
+                self._slots.move_to_end(slot)
+                self._stats["hits"] += 1
+                self._stats["saved_latency_s"] += latency
+                return answer
+            self._stats["misses"] += 1
+            return None
+
+    def store(self, query: str, answer: str, latency: float = 0.0):
+        """Remember an answer and how long it took to produce."""
+        if not answer or answer.startswith(("❌", "⚠️")):
+            return
+        embedded = self._embed(query)
+        if embedded is None:
+            return
+        normalized, space, vector = embedded
+        guards = _guards(normalized)
+        expires = time.time() + self.ttl
+
+        with self._lock:
+            self._place(space, vector, expires, (normalized, guards, answer, latency))
+            if self._database is not None:
+                self._persist(space, vector, expires, normalized, guards, answer, latency)
+
+    def _persist(self, space, vector, expires, normalized, guards, answer, latency):
+        conn = self._database.connection()
+        cursor = conn.execute(
+            "INSERT INTO text_answers (space, query, numbers, answer, latency, vector, expires) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (space, normalized, json.dumps(guards), answer, latency, vector.tobytes(), expires)
+        )
+        if cursor.lastrowid == self._synced_id + 1:
+            self._synced_id = cursor.lastrowid  # Nothing from other workers in between
+        else:
+            self._own_ids.add(cursor.lastrowid)
+        self._writes += 1
+        if self._writes % 100 == 0:
+            conn.execute(
+                "DELETE FROM text_answers WHERE expires <= ? OR id <= "
+                "(SELECT COALESCE(MAX(id), 0) FROM text_answers) - ?", (time.time(), self.max_entries)
+            )
+        conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._slots)
+            stats["space"] = self._space
+            stats["index_bytes"] = self._vectors.nbytes if self._vectors is not None else 0
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["saved_latency_s"] = round(stats["saved_latency_s"], 3)
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._space = None
+            self._vectors = None
+            self._expires[:] = 0
+            self._slots.clear()
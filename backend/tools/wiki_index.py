@@ -0,0 +1,417 @@
+import bz2
+import gzip
+import json
+import os
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+import zlib
+from typing import Dict, List, Optional
+
+from backend.utils.shared_state import SQLiteDatabase, state_path
+from backend.utils.telemetry import traced
+
+# Offline Wikipedia/Wikispecies index, built from a dump by backend/build_wiki_index.py.
+# wiki_tool answers from it whenever the file exists.
+WIKI_INDEX_PATH = os.getenv("WIKI_INDEX_PATH", state_path("wiki_index.db"))
+WIKI_INDEX_BATCH = int(os.getenv("WIKI_INDEX_BATCH", 1000))  # Pages per transaction (and resume checkpoint)
+DEFAULT_BASE_URL = "https://en.wikipedia.org/wiki/"
+
+WIKI_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    pageid INTEGER PRIMARY KEY, key TEXT NOT NULL UNIQUE, title TEXT NOT NULL,
+    revid INTEGER, timestamp TEXT, lead TEXT NOT NULL, body BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS redirects (key TEXT PRIMARY KEY, target TEXT NOT NULL) WITHOUT ROWID;
+CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(
+    title, lead, content='pages', content_rowid='pageid', tokenize='porter unicode61'
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS build_state (
+    source TEXT PRIMARY KEY, size INTEGER NOT NULL, offset INTEGER NOT NULL,
+    pages INTEGER NOT NULL, redirects INTEGER NOT NULL, skipped INTEGER NOT NULL, done INTEGER NOT NULL
+);
+"""
+
+# Which Wikipedia articles are about taxa (or their habitat/conservation): taxoboxes, IUCN status, categories
+SPECIES_TEMPLATE = re.compile(
+    r"\{\{\s*(?:template:)?(?:speciesbox|taxobox|automatic taxobox|subspeciesbox|infraspeciesbox|virusbox|"
+    r"hybridbox|ichnobox|oobox|iucn)",
+    re.IGNORECASE
+)
+SPECIES_CATEGORY = re.compile(
+    r"\b(?:species|taxa|genera|subspecies|fauna|flora|habitats?|conservation|endangered|extinct)\b",
+    re.IGNORECASE
+)
+
+# Query words that name the aspect asked about rather than the taxon
+QUERY_STOPWORDS = frozenset("""
+a an and are as at be by can do does for from has have how i in is it its me of on or please show tell the
+their this to was what when where which who why with about according wikipedia article page full complete
+entire entry text detailed study habitat habitats conservation status taxonomy scientific name names
+classification family genus phylum kingdom species verified source
+""".split())
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+SUMMARY_COLUMNS = "pageid, title, timestamp, lead"
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"“(])')
+
+
+def _key(title: str) -> str:
+    """Case-, underscore- and whitespace-insensitive title key."""
+    return re.sub(r"[\s_]+", " ", title).strip().lower()
+
+
+def first_sentences(text: str, count: int) -> str:
+    return " ".join(_SENTENCE_END.split(text, maxsplit=count)[:count]).strip()
+
+
+# --- Wikitext → plain text -------------------------------------------------
+
+_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+_REF = re.compile(r"<ref\b[^>/]*/>|<ref\b[^>]*>.*?</ref\s*>", re.DOTALL | re.IGNORECASE)
+_DROP_TAGS = re.compile(r"<(gallery|math|score|timeline|syntaxhighlight)\b.*?</\1\s*>", re.DOTALL | re.IGNORECASE)
+_INNER_TEMPLATE = re.compile(r"\{\{[^{}]*\}\}")
+_INNER_TABLE = re.compile(r"\{\|(?:(?!\{\|).)*?\|\}", re.DOTALL)
+_FILE_LINK = re.compile(r"\[\[(?:file|image|category|media):[^\[\]]*(?:\[\[[^\[\]]*\]\][^\[\]]*)*\]\]", re.IGNORECASE)
+_LINK = re.compile(r"\[\[(?:[^|\[\]]*\|)?([^\[\]]*)\]\]")
+_EXTERNAL_LINK = re.compile(r"\[(?:https?:)?//[^\s\]]+\s*([^\]]*)\]")
+_HTML_TAG = re.compile(r"</?[a-zA-Z][^>]*>")
+_HEADING = re.compile(r"^(={2,6})\s*(.+?)\s*\1\s*$", re.MULTILINE)
+_SKIP_SECTIONS = {"references", "external links", "further reading", "notes", "see also", "bibliography",
+                  "sources", "citations", "footnotes"}
+
+
+def _strip_nested(pattern, text: str) -> str:
+    while True:
+        stripped = pattern.sub("", text)
+        if stripped == text:
+            return text
+        text = stripped
+
+
+def _plain(wikitext: str) -> str:
+    text = _LINK.sub(r"\1", _FILE_LINK.sub("", wikitext))
+    text = _EXTERNAL_LINK.sub(r"\1", text)
+    text = _HTML_TAG.sub("", text.replace("'''", "").replace("''", ""))
+    text = text.replace("&nbsp;", " ").replace("&ndash;", "–").replace("&amp;", "&")
+    lines = [line.strip() for line in text.splitlines()]
+    lines = [line.lstrip("*#:; ") for line in lines if line and not line.startswith(("|", "!", "__"))]
+    return re.sub(r"[ \t]+", " ", "\n".join(lines)).strip()
+
+
+def wikitext_sections(wikitext: str) -> tuple:
+    """``(lead, [(heading, text), ...])`` from article wikitext, without templates, tables or references."""
+    text = _DROP_TAGS.sub("", _REF.sub("", _COMMENT.sub("", wikitext)))
+    text = _strip_nested(_INNER_TABLE, _strip_nested(_INNER_TEMPLATE, text))
+    parts = _HEADING.split(text)  # [lead, "==", heading, body, "==", heading, body, ...]
+    sections = [
+        (_plain(heading), _plain(body)) for heading, body in zip(parts[2::3], parts[3::3])
+        if _plain(heading).lower() not in _SKIP_SECTIONS
+    ]
+    return _plain(parts[0]), [(heading, body) for heading, body in sections if body]
+
+
+# --- Dump readers ---------------------------------------------------------
+
+def _open_dump(path: str):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def _xml_pages(f, offset: int):
+    """``(page dict or None, end offset)`` per ``<page>`` of a MediaWiki XML export, from ``offset`` on.
+
+    Pages are cut out line by line (the export puts ``<page>`` and
+    ``</page>`` on lines of their own), so each end offset is an exact
+    resume point and memory use is one page.
+    """
+    lines, inside = [], False
+    for line in f:
+        offset += len(line)
+        stripped = line.strip()
+        if not inside:
+            inside = stripped.startswith(b"<page>")
+        if inside:
+            lines.append(line)
+            if stripped.endswith(b"</page>"):
+                inside = False
+                element = ET.fromstring(b"".join(lines))
+                lines = []
+                yield _xml_page(element), offset
+
+
+def _xml_page(element) -> Optional[Dict]:
+    if element.findtext("ns", "0") != "0":
+        return None
+    redirect = element.find("redirect")
+    return {
+        "pageid": int(element.findtext("id")),
+        "title": element.findtext("title", ""),
+        "redirect": redirect.get("title") if redirect is not None else None,
+        "revid": int(element.findtext("revision/id") or 0) or None,
+        "timestamp": element.findtext("revision/timestamp"),
+        "wikitext": element.findtext("revision/text") or "",
+    }
+
+
+def _json_pages(f, offset: int):
+    """``(page dict or None, end offset)`` per document of a JSON-lines dump (CirrusSearch format or one page per line)."""
+    pageid = None
+    for line in f:
+        offset += len(line)
+        if not line.strip():
+            continue
+        doc = json.loads(line)
+        if "index" in doc:  # CirrusSearch action line: the next line is the page
+            pageid = int(doc["index"].get("_id", 0)) or None
+            continue
+        if doc.get("namespace", 0) != 0:
+            yield None, offset
+            continue
+        yield {
+            "pageid": int(doc.get("page_id") or doc.get("pageid") or pageid or 0),
+            "title": doc.get("title", ""),
+            "redirects": [r["title"] for r in doc.get("redirect", []) if r.get("namespace", 0) == 0],
+            "revid": doc.get("version") or doc.get("revid"),
+            "timestamp": doc.get("timestamp"),
+            "text": doc.get("text", ""),
+            "lead": doc.get("opening_text"),
+            "headings": doc.get("heading", []),
+            "templates": doc.get("template", []),
+            "categories": doc.get("category", []),
+            "wikitext": doc.get("source_text"),
+        }, offset
+        pageid = None
+
+
+def _is_species_page(page: Dict) -> bool:
+    if page.get("wikitext"):
+        text = page["wikitext"]
+        categories = re.findall(r"\[\[Category:([^\]|]*)", text, re.IGNORECASE)
+        return bool(SPECIES_TEMPLATE.search(text)) or any(SPECIES_CATEGORY.search(c) for c in categories)
+    templates = " ".join("{{" + t for t in page.get("templates", []))
+    return bool(SPECIES_TEMPLATE.search(templates)) or any(SPECIES_CATEGORY.search(c) for c in page.get("categories", []))
+
+
+def _page_content(page: Dict) -> tuple:
+    """``(lead, sections)`` for a dump page."""
+    if page.get("wikitext"):
+        return wikitext_sections(page["wikitext"])
+    # CirrusSearch plaintext has no section breaks: keep it whole after the opening text
+    lead = page.get("lead") or first_sentences(page.get("text", ""), 3)
+    rest = page.get("text", "")[len(lead):].strip() if page.get("text", "").startswith(lead) else page.get("text", "")
+    return lead, [("Article", rest)] if rest else []
+
+
+# --- Index ----------------------------------------------------------------
+
+class WikiIndex:
+    """Read side of the offline index: exact title/redirect lookups and FTS5 search over titles and leads.
+
+    Opened lazily; `available` is False until a built index exists at ``path``.
+    """
+
+    def __init__(self, path: str = WIKI_INDEX_PATH):
+        self.path = path
+        self._database = SQLiteDatabase(path, WIKI_INDEX_SCHEMA) if path else None
+        self._lock = threading.Lock()
+        self._base_url = None
+
+    def available(self) -> bool:
+        return bool(self.path) and os.path.exists(self.path)
+
+    def _db(self):
+        return self._database.connection()
+
+    def base_url(self) -> str:
+        if self._base_url is None:
+            row = self._db().execute("SELECT value FROM meta WHERE key = 'base_url'").fetchone()
+            self._base_url = row[0] if row else DEFAULT_BASE_URL
+        return self._base_url
+
+    def _result(self, row, sentences: int) -> Dict:
+        pageid, title, timestamp, lead = row
+        return {
+            "title": title,
+            "summary": first_sentences(lead, sentences),
+            "url": self.base_url() + title.replace(" ", "_"),
+            "pageid": pageid,
+            "last_updated": timestamp or "",
+            "wordcount": len(lead.split()),
+        }
+
+    def _by_key(self, key: str, columns: str):
+        return self._db().execute(
+            f"SELECT {columns} FROM pages WHERE key = coalesce((SELECT target FROM redirects WHERE key = ?), ?)",
+            (key, key)
+        ).fetchone()
+
+    def _find(self, query: str, columns: str):
+        """Row for a free-text query: exact title, then all terms in the title, then in title or lead.
+
+        Pages matching only some of the terms are not returned, so the live API answers instead.
+        """
+        words = _TOKEN.findall(query.lower())
+        terms = [w for w in words if w not in QUERY_STOPWORDS] or words
+        if not terms:
+            return None
+        row = self._by_key(_key(query), columns) or self._by_key(" ".join(terms), columns)
+        if row:
+            return row
+        phrase = " ".join(f'"{t}"' for t in terms)
+        for match in (f"title : ({phrase})", f"{{title lead}} : ({phrase})"):
+            row = self._db().execute(
+                f"SELECT {', '.join('pages.' + c.strip() for c in columns.split(','))} FROM pages_fts "
+                "JOIN pages ON pages.pageid = pages_fts.rowid WHERE pages_fts MATCH ? "
+                "ORDER BY bm25(pages_fts, 10.0, 1.0) LIMIT 1", (match,)
+            ).fetchone()
+            if row:
+                return row
+        return None
+
+    @traced("wiki.index")
+    def title(self, title: str, sentences: int = 3) -> Optional[Dict]:
+        """The page with this title (or redirect), as a `search_wikipedia`-style result."""
+        with self._lock:
+            row = self._by_key(_key(title), SUMMARY_COLUMNS)
+            return self._result(row, sentences) if row else None
+
+    @traced("wiki.index")
+    def page(self, pageid: int, sentences: int = 3) -> Optional[Dict]:
+        with self._lock:
+            row = self._db().execute(f"SELECT {SUMMARY_COLUMNS} FROM pages WHERE pageid = ?", (pageid,)).fetchone()
+            return self._result(row, sentences) if row else None
+
+    @traced("wiki.index")
+    def search(self, query: str, sentences: int = 3) -> Optional[Dict]:
+        """Best page for a free-text query, as a `search_wikipedia`-style result."""
+        with self._lock:
+            row = self._find(query, SUMMARY_COLUMNS)
+            return self._result(row, sentences) if row else None
+
+    @traced("wiki.index")
+    def document(self, title: str) -> Optional[Dict]:
+        """Lead and ``[(heading, text)]`` sections of the page best matching ``title``, for full-page answers."""
+        with self._lock:
+            row = self._find(title, "pageid, title, revid, lead, body")
+        if not row:
+            return None
+        pageid, title, revid, lead, body = row
+        return {
+            "pageid": pageid, "title": title, "revid": revid, "lead": lead,
+            "sections": json.loads(zlib.decompress(body)),
+            "url": self.base_url() + title.replace(" ", "_"),
+        }
+
+    def stats(self) -> Dict:
+        if not self.available():
+            return {"pages": 0, "redirects": 0}
+        with self._lock:
+            db = self._db()
+            return {
+                "pages": db.execute("SELECT COUNT(*) FROM pages").fetchone()[0],
+                "redirects": db.execute("SELECT COUNT(*) FROM redirects").fetchone()[0],
+                "bytes": os.path.getsize(self.path),
+            }
+
+
+wiki_index = WikiIndex()
+
+
+# --- Build ----------------------------------------------------------------
+
+def _store_page(db, page: Dict, lead: str, sections: List) -> None:
+    old = db.execute("SELECT title, lead FROM pages WHERE pageid = ?", (page["pageid"],)).fetchone()
+    if old:  # External-content FTS rows must be deleted with their old values
+        db.execute("INSERT INTO pages_fts (pages_fts, rowid, title, lead) VALUES ('delete', ?, ?, ?)",
+                   (page["pageid"], *old))
+    db.execute("DELETE FROM pages WHERE key = ? AND pageid != ?", (_key(page["title"]), page["pageid"]))
+    db.execute(
+        "INSERT OR REPLACE INTO pages (pageid, key, title, revid, timestamp, lead, body) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (page["pageid"], _key(page["title"]), page["title"], page.get("revid"), page.get("timestamp"), lead,
+         zlib.compress(json.dumps(sections, ensure_ascii=False).encode("utf-8"), 6))
+    )
+    db.execute("INSERT INTO pages_fts (rowid, title, lead) VALUES (?, ?, ?)", (page["pageid"], page["title"], lead))
+
+
+def build_index(source: str, path: str = WIKI_INDEX_PATH, all_pages: bool = False, batch: int = WIKI_INDEX_BATCH,
+                limit: Optional[int] = None, base_url: Optional[str] = None, restart: bool = False,
+                progress=None) -> Dict:
+    """Stream ``source`` (MediaWiki XML or JSON lines, optionally .bz2/.gz) into the index at ``path``.
+
+    Only taxon articles are kept unless ``all_pages`` (e.g. for Wikispecies).
+    Pages are committed ``batch`` at a time together with the dump offset,
+    so an interrupted build picks up where it stopped when run again
+    (``restart`` starts over). ``limit`` stops after that many dump pages.
+    Returns the build counters.
+    """
+    source = os.path.abspath(source)
+    size = os.path.getsize(source)
+    db = SQLiteDatabase(path, WIKI_INDEX_SCHEMA).connection()
+    row = db.execute("SELECT size, offset, pages, redirects, skipped, done FROM build_state WHERE source = ?",
+                     (source,)).fetchone()
+    if row and (restart or row[0] != size):
+        row = None  # A different dump under the same name: start over
+    offset, pages, redirects, skipped, done = row[1:] if row else (0, 0, 0, 0, 0)
+    stats = {"source": source, "resumed_at": offset, "pages": pages, "redirects": redirects, "skipped": skipped}
+    if done:
+        return dict(stats, done=True, seconds=0.0)
+
+    started = time.perf_counter()
+    is_json = re.search(r"\.jsonl?(?:\.(?:bz2|gz))?$|\.ndjson", source) is not None
+    with _open_dump(source) as f:
+        if not is_json and not row:
+            match = re.search(rb"<base>(.*?)</base>", f.read(1 << 16))  # siteinfo comes before the first page
+            if match and not base_url:
+                base_url = match.group(1).decode().rsplit("/", 1)[0] + "/"
+        if base_url:
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('base_url', ?)", (base_url,))
+        f.seek(offset)
+        reader = _json_pages(f, offset) if is_json else _xml_pages(f, offset)
+
+        seen = 0
+        for page, offset in reader:
+            seen += 1
+            if page is not None and page.get("redirect"):
+                db.execute("INSERT OR REPLACE INTO redirects (key, target) VALUES (?, ?)",
+                           (_key(page["title"]), _key(page["redirect"])))
+                stats["redirects"] += 1
+            elif page is not None and page["title"] and (all_pages or _is_species_page(page)):
+                lead, sections = _page_content(page)
+                _store_page(db, page, lead, sections)
+                for title in page.get("redirects", []):
+                    db.execute("INSERT OR REPLACE INTO redirects (key, target) VALUES (?, ?)",
+                               (_key(title), _key(page["title"])))
+                    stats["redirects"] += 1
+                stats["pages"] += 1
+            else:
+                stats["skipped"] += 1
+
+            if seen % batch == 0:
+                _checkpoint(db, source, size, offset, stats, done=False)
+                if progress:
+                    progress(dict(stats, offset=offset, size=size))
+            if limit and seen >= limit:
+                _checkpoint(db, source, size, offset, stats, done=False)
+                return dict(stats, done=False, seconds=round(time.perf_counter() - started, 3))
+
+    # Redirects to pages that were not indexed are dead weight
+    db.execute("DELETE FROM redirects WHERE target NOT IN (SELECT key FROM pages)")
+    db.execute("INSERT INTO pages_fts (pages_fts) VALUES ('optimize')")
+    _checkpoint(db, source, size, offset, stats, done=True)
+    db.execute("PRAGMA wal_checkpoint(TRUNCATE)")  # The finished index is one self-contained file
+    stats["redirects"] = db.execute("SELECT COUNT(*) FROM redirects").fetchone()[0]
+    return dict(stats, done=True, seconds=round(time.perf_counter() - started, 3))
+
+
+def _checkpoint(db, source: str, size: int, offset: int, stats: Dict, done: bool):
+    db.execute(
+        "INSERT OR REPLACE INTO build_state (source, size, offset, pages, redirects, skipped, done) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (source, size, offset, stats["pages"], stats["redirects"], stats["skipped"], int(done))
+    )
+    db.commit()
@@ -1,16 +1,316 @@
+import asyncio
+import codecs
+import httpx
+import json
+import os
 import requests
-from typing import Dict, Optional
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 import re
 import time
+from html.parser import HTMLParser
+from backend.utils.shared_state import SQLiteDatabase
+from backend.tools.wiki_index import wiki_index
+from backend.utils.telemetry import traced
 
-WIKIPEDIA_API = "https://en.wikipedia.org/w/api.php"
+WIKIPEDIA_API = os.getenv("WIKIPEDIA_API", "https://en.wikipedia.org/w/api.php")
 HEADERS = {
     "User-Agent": "EcoBot/1.0 (https://github.com/namikazi25/Ecobot; contact@ecobot.org)"
 }
 
-def search_wikipedia(query: str, sentences: int = 3) -> Dict:
-    """Search Wikipedia with exponential backoff and proper error handling"""
-    params = {
+# Cache configuration (set WIKI_CACHE_PATH="" to keep the cache in memory only)
+WIKI_CACHE_PATH = os.getenv(
+    "WIKI_CACHE_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".cache", "wiki_cache.db"))
+)
+WIKI_CACHE_TTL = float(os.getenv("WIKI_CACHE_TTL", 6 * 3600))
+WIKI_CACHE_MAX_ENTRIES = int(os.getenv("WIKI_CACHE_MAX_ENTRIES", 512))
+WIKI_CACHE_MAX_DISK_ENTRIES = int(os.getenv("WIKI_CACHE_MAX_DISK_ENTRIES", 20000))
+
+WIKI_CACHE_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS wiki_cache ("
+    "key TEXT PRIMARY KEY, entry TEXT NOT NULL, fetched_at REAL NOT NULL);"
+)
+
+# With an offline index (backend/build_wiki_index.py), ask the live API only for what it lacks;
+# WIKI_LIVE_FALLBACK=0 answers "not found" instead (no network at all)
+WIKI_LIVE_FALLBACK = os.getenv("WIKI_LIVE_FALLBACK", "1") == "1"
+
+# Full-page requests: fetch the section index, then only the sections the query asks about
+# (or the plaintext extract), streamed and cut off at WIKI_FULL_PAGE_CHARS characters.
+# WIKI_SECTION_FETCH=0 downloads the whole parsed article as before.
+WIKI_SECTION_FETCH = os.getenv("WIKI_SECTION_FETCH", "1") == "1"
+WIKI_FULL_PAGE_CHARS = int(os.getenv("WIKI_FULL_PAGE_CHARS", 2500))
+WIKI_MAX_SECTIONS = int(os.getenv("WIKI_MAX_SECTIONS", 3))
+STREAM_CHUNK_SIZE = 16 * 1024
+
+# MediaWiki accepts 50 titles/pageids per query, but TextExtracts returns at most 20 intro extracts
+BATCH_LIMIT = 20
+
+
+class WikiCache:
+    """Two-tier Wikipedia cache: an in-memory LRU with TTL backed by SQLite.
+
+    Entries are dicts of the form
+    ``{"value": <tool result>, "validator": <revision marker>, "ref": <pageids/titles param>}``.
+    Once an entry is older than the TTL it is *stale* rather than gone: callers
+    revalidate it with a cheap revisions query and refresh it if the page has
+    not changed since it was cached.
+    """
+
+    def __init__(self, path=WIKI_CACHE_PATH, max_entries=WIKI_CACHE_MAX_ENTRIES,
+                 ttl=WIKI_CACHE_TTL, max_disk_entries=WIKI_CACHE_MAX_DISK_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._database = SQLiteDatabase(path, WIKI_CACHE_SCHEMA) if path else None
+        self._writes = 0
+        self._stats = {
+            "memory_hits": 0, "disk_hits": 0, "misses": 0, "stale": 0,
+            "revalidated": 0, "evictions": 0
+        }
+
+    def _db(self):
+        return self._database.connection() if self._database else None
+
+    def _remember(self, key, entry, fetched_at):
+        self._memory[key] = (entry, fetched_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get(self, key):
+        """Return ``(entry, fresh)`` for a key, or ``None`` on a miss."""
+        with self._lock:
+            if key in self._memory:
+                entry, fetched_at = self._memory[key]
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+            else:
+                db = self._db()
+                row = db.execute(
+                    "SELECT entry, fetched_at FROM wiki_cache WHERE key = ?", (key,)
+                ).fetchone() if db else None
+                if row is None:
+                    self._stats["misses"] += 1
+                    return None
+                entry, fetched_at = json.loads(row[0]), row[1]
+                self._remember(key, entry, fetched_at)
+                self._stats["disk_hits"] += 1
+
+            fresh = time.time() - fetched_at < self.ttl
+            if not fresh:
+                self._stats["stale"] += 1
+            return entry, fresh
+
+    def set(self, key, entry):
+        """Store an entry in both tiers."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, entry, now)
+            db = self._db()
+            if db:
+                db.execute(
+                    "INSERT OR REPLACE INTO wiki_cache (key, entry, fetched_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(entry), now)
+                )
+                self._writes += 1
+                if self._writes % 100 == 0:
+                    self._prune_disk(db)
+                db.commit()
+
+    def refresh(self, key):
+        """Mark a stale entry as fresh again after a successful revalidation."""
+        now = time.time()
+        with self._lock:
+            self._stats["revalidated"] += 1
+            if key in self._memory:
+                self._memory[key] = (self._memory[key][0], now)
+            db = self._db()
+            if db:
+                db.execute("UPDATE wiki_cache SET fetched_at = ? WHERE key = ?", (now, key))
+                db.commit()
+
+    def _prune_disk(self, db):
+        db.execute(
+            "DELETE FROM wiki_cache WHERE key NOT IN "
+            "(SELECT key FROM wiki_cache ORDER BY fetched_at DESC LIMIT ?)",
+            (self.max_disk_entries,)
+        )
+
+    def stats(self) -> Dict:
+        """Hit/miss/eviction counters plus current sizes."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            db = self._db()
+            stats["disk_entries"] = db.execute("SELECT COUNT(*) FROM wiki_cache").fetchone()[0] if db else 0
+            lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+            stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """Drop every entry from both tiers (counters are kept)."""
+        with self._lock:
+            self._memory.clear()
+            db = self._db()
+            if db:
+                db.execute("DELETE FROM wiki_cache")
+                db.commit()
+
+
+wiki_cache = WikiCache()
+
+def wiki_cache_stats() -> Dict:
+    """Expose cache counters for sizing/monitoring."""
+    return wiki_cache.stats()
+
+_full_page_stats = {
+    mode: {"calls": 0, "requests": 0, "bytes_read": 0, "early_stops": 0}
+    for mode in ("sections", "extract", "legacy")
+}
+_full_page_stats_lock = threading.Lock()  # Updated from worker threads and the event loop
+
+def full_page_stats() -> Dict:
+    """Per fetch mode: calls, HTTP requests, response bytes read and reads stopped at the character budget."""
+    with _full_page_stats_lock:
+        return {mode: dict(stats) for mode, stats in _full_page_stats.items()}
+
+def _offline(lookup, *args) -> Optional[Dict]:
+    """Answer from the offline index when one is built; ``None`` means ask the live API."""
+    if not wiki_index.available():
+        return None
+    try:
+        result = lookup(*args)
+    except Exception:
+        result = None
+    if result is None and not WIKI_LIVE_FALLBACK:
+        return {"error": "Not found in the offline Wikipedia index", "status": 404}
+    return result
+
+def _offline_full_page(title: str, query: str, max_chars: int) -> Optional[Dict]:
+    """Full-page result from the offline index: the lead plus the sections the query asks about (or all)."""
+    document = wiki_index.document(title)
+    if document is None:
+        return None
+    sections = document["sections"]
+    wanted = _aspect_words(document["title"], query)
+    picked = _pick_sections([{"line": heading, "index": str(i)} for i, (heading, _) in enumerate(sections)], wanted)
+    chosen = [sections[i] for i in sorted(map(int, picked))] if picked else sections
+    parts = [document["lead"]] + [f"{heading}\n\n{text}" for heading, text in chosen]
+    return {
+        "content": "\n\n".join(part for part in parts if part)[:max_chars],
+        "sections": [heading for heading, _ in sections],
+        "url": document["url"],
+        "revid": document["revid"]
+    }
+
+def _normalize_query(query: str) -> str:
+    return re.sub(r'\s+', ' ', query).strip().lower()
+
+def _query_key(query: str, sentences: int) -> str:
+    return f"search:{sentences}:{_normalize_query(query)}"
+
+def _page_key(pageid: int, sentences: int) -> str:
+    return f"page:{sentences}:{pageid}"
+
+def _title_key(title: str, sentences: int) -> str:
+    return f"title:{sentences}:{_normalize_query(title)}"
+
+def _full_page_key(title: str, query: Optional[str] = None, max_chars: Optional[int] = None) -> str:
+    if query is None:
+        return f"full:{_normalize_query(title)}"
+    return f"full:{max_chars}:{_normalize_query(title)}|{_normalize_query(query)}"
+
+def _summary_entry(result: Dict) -> Dict:
+    return {"value": result, "validator": result["last_updated"], "ref": {"pageids": result["pageid"]}}
+
+def _full_page_entry(result: Dict, title: str) -> Dict:
+    return {"value": result, "validator": result.get("revid"), "ref": {"titles": title}}
+
+def _revision_params(ref: Dict) -> Dict:
+    """Cheap revisions-only query used to revalidate a stale entry."""
+    return {"action": "query", "prop": "revisions", "rvprop": "ids|timestamp", "format": "json", **ref}
+
+def _is_current(entry: Dict, data: Dict) -> bool:
+    """True if the page's latest revision still matches the cached validator."""
+    try:
+        page = next(iter(data["query"]["pages"].values()))
+        revision = page["revisions"][0]
+    except (KeyError, IndexError, StopIteration):
+        return False
+    return entry.get("validator") in (revision.get("timestamp"), revision.get("revid"))
+
+def _cache_lookup(key: str) -> Optional[Dict]:
+    """Return a cached result, revalidating it against the live revision when stale."""
+    cached = wiki_cache.get(key)
+    if cached is None:
+        return None
+    entry, fresh = cached
+    if fresh:
+        return entry["value"]
+    if entry.get("validator") is None:
+        return None
+    try:
+        response = requests.get(WIKIPEDIA_API, params=_revision_params(entry["ref"]), headers=HEADERS, timeout=10)
+        if _is_current(entry, response.json()):
+            wiki_cache.refresh(key)
+            return entry["value"]
+    except Exception:
+        pass
+    return None
+
+async def _acache_lookup(key: str) -> Optional[Dict]:
+    """Async variant of `_cache_lookup`"""
+    cached = wiki_cache.get(key)
+    if cached is None:
+        return None
+    entry, fresh = cached
+    if fresh:
+        return entry["value"]
+    if entry.get("validator") is None:
+        return None
+    try:
+        response = await _get_async_http().get(WIKIPEDIA_API, params=_revision_params(entry["ref"]))
+        if _is_current(entry, response.json()):
+            wiki_cache.refresh(key)
+            return entry["value"]
+    except Exception:
+        pass
+    return None
+
+# Pooled async HTTP client, created lazily inside the running event loop
+_async_http: Optional[httpx.AsyncClient] = None
+_async_http_loop = None
+
+def _get_async_http() -> httpx.AsyncClient:
+    """Return the shared async HTTP client, recreating it if the event loop changed."""
+    global _async_http, _async_http_loop
+    loop = asyncio.get_running_loop()
+    if _async_http is None or _async_http.is_closed or _async_http_loop is not loop:
+        _async_http = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=10,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+        _async_http_loop = loop
+    return _async_http
+
+async def aclose_http_client():
+    """Close the pooled async HTTP client (called on FastAPI shutdown)."""
+    global _async_http
+    if _async_http is not None and not _async_http.is_closed:
+        await _async_http.aclose()
+    _async_http = None
+
+def _search_params(query: str) -> Dict:
+    return {
         "action": "query",
         "list": "search",
         "srsearch": query,
@@ -19,80 +319,674 @@ def search_wikipedia(query: str, sentences: int = 3) -> Dict:
         "srprop": "size|wordcount|timestamp",
         "srinfo": "totalhits|suggestion"
     }
-    
+
+def _search_extract_params(query: str, sentences: int) -> Dict:
+    """Search generator + extracts in a single request (replaces search → get_page_details)."""
+    return {
+        "action": "query",
+        "generator": "search",
+        "gsrsearch": query,
+        "gsrlimit": 1,
+        "prop": "extracts|info|revisions",
+        "exsentences": sentences,
+        "explaintext": True,
+        "inprop": "url",
+        "rvprop": "timestamp",
+        "format": "json"
+    }
+
+def _batch_params(sentences: int, titles: Optional[List[str]] = None, pageids: Optional[List[int]] = None) -> Dict:
+    params = {
+        "action": "query",
+        "prop": "extracts|info|revisions",
+        "exintro": True,
+        "exsentences": sentences,
+        "exlimit": "max",
+        "explaintext": True,
+        "inprop": "url",
+        "rvprop": "timestamp",
+        "redirects": True,
+        "format": "json"
+    }
+    if titles:
+        params["titles"] = "|".join(titles)
+    else:
+        params["pageids"] = "|".join(str(p) for p in pageids)
+    return params
+
+def _page_params(pageid: int, sentences: int) -> Dict:
+    return {
+        "action": "query",
+        "pageids": pageid,
+        "prop": "extracts|info|revisions",
+        "exsentences": sentences,
+        "explaintext": True,
+        "inprop": "url",
+        "rvprop": "timestamp",
+        "format": "json"
+    }
+
+def _full_page_params(title: str) -> Dict:
+    return {
+        "action": "parse",
+        "page": title,
+        "prop": "text|sections|revid",
+        "format": "json",
+        "disabletoc": 1
+    }
+
+def _section_index_params(title: str) -> Dict:
+    """Headings only: a few hundred bytes instead of the whole article."""
+    return {"action": "parse", "page": title, "prop": "sections|revid", "redirects": 1,
+            "format": "json", "formatversion": 2}
+
+def _section_params(title: str, index: str) -> Dict:
+    return {"action": "parse", "page": title, "section": index, "prop": "text", "redirects": 1,
+            "disabletoc": 1, "disableeditsection": 1, "format": "json", "formatversion": 2}
+
+def _plaintext_params(title: str) -> Dict:
+    return {"action": "query", "titles": title, "prop": "extracts", "explaintext": 1,
+            "exsectionformat": "plain", "redirects": 1, "format": "json", "formatversion": 2}
+
+# Words that say nothing about which section is wanted
+_SECTION_STOPWORDS = {
+    "the", "and", "for", "about", "from", "with", "what", "which", "show", "give", "tell", "full", "article",
+    "page", "complete", "entire", "entry", "text", "detailed", "study", "wikipedia", "please", "its", "their",
+    "whole", "all", "everything", "has", "section", "sections", "want", "need", "like", "can", "could", "you",
+    "see", "get", "fetch", "retrieve", "open", "read", "display", "print", "pull",
+}
+
+def _words(text: str) -> set:
+    return {w[:5] for w in re.findall(r"[a-z]{3,}", text.lower()) if w not in _SECTION_STOPWORDS}
+
+def _aspect_words(title: str, query: str) -> set:
+    """What the query asks about beyond the page itself ("red fox diet" → {"diet"}), crudely stemmed."""
+    return _words(query) - _words(title)
+
+def _pick_sections(sections: List[Dict], wanted: set, limit: int = WIKI_MAX_SECTIONS) -> List[str]:
+    """Indexes of the sections whose headings share the most words with ``wanted``, best first."""
+    scored = []
+    for section in sections:
+        overlap = len(wanted & _words(section.get("line", "")))
+        if overlap and str(section.get("index", "")).isdigit():  # Transcluded sections have "T-" indexes
+            scored.append((-overlap, int(section["index"]), str(section["index"])))
+    return [index for _, _, index in sorted(scored)[:limit]]
+
+def _parse_section_index(data: Dict, title: str) -> Dict:
+    if "error" in data:
+        return {"error": data["error"].get("info", "Page not found"), "status": 404}
+    parse = data["parse"]
+    return {
+        "title": parse.get("title", title),
+        "sections": parse.get("sections", []),
+        "revid": parse.get("revid"),
+    }
+
+def _sectioned_result(index: Dict, parts: List[str]) -> Dict:
+    title = index["title"]
+    return {
+        "content": "\n\n".join(part for part in parts if part),
+        "sections": [s["line"] for s in index["sections"]],
+        "url": f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}",
+        "revid": index["revid"]
+    }
+
+def _parse_page(data: Dict, pageid: int) -> Dict:
+    return _page_result(data['query']['pages'][str(pageid)], pageid)
+
+def _parse_search_extract(data: Dict) -> Optional[Dict]:
+    pages = data.get('query', {}).get('pages')
+    if not pages:
+        return None
+    pageid = next(iter(pages))
+    return _page_result(pages[pageid], int(pageid))
+
+def _parse_batch(data: Dict, titles: Optional[List[str]] = None, pageids: Optional[List[int]] = None) -> Dict:
+    """Map each requested title/pageid to its page result, following normalization and redirects."""
+    query = data.get("query", {})
+    pages = query.get("pages", {})
+    not_found = {"error": "No results found", "status": 404}
+    results = {}
+
+    if titles:
+        resolved = {item["from"]: item["to"] for item in query.get("normalized", []) + query.get("redirects", [])}
+        by_title = {page.get("title"): page for page in pages.values()}
+        for title in titles:
+            final = title
+            for _ in range(3):  # normalized → redirect → (rare) double redirect
+                final = resolved.get(final, final)
+            page = by_title.get(final)
+            ok = page is not None and "missing" not in page and "invalid" not in page
+            results[title] = _page_result(page, page["pageid"]) if ok else not_found
+    else:
+        for pageid in pageids:
+            page = pages.get(str(pageid))
+            ok = page is not None and "missing" not in page
+            results[pageid] = _page_result(page, int(pageid)) if ok else not_found
+
+    return results
+
+def _page_result(page: Dict, pageid: int) -> Dict:
+    return {
+        "title": page["title"],
+        "summary": clean_text(page.get("extract", "")),
+        "url": page["fullurl"],
+        "pageid": pageid,
+        "last_updated": page["revisions"][0]["timestamp"],
+        "wordcount": len(page.get("extract", "").split())
+    }
+
+def _extract_request(title: str, max_chars: int) -> tuple:
+    """``(params, field, budget, html, mode)`` for the plaintext extract, which starts with the lead."""
+    return _plaintext_params(title), "extract", max_chars, False, "extract"
+
+def _section_plan(index: Dict, wanted: set, max_chars: int) -> List:
+    """Requests for the lead (up to a third of the budget) and the sections matching ``wanted``,
+    or just the plaintext extract if no heading matches."""
+    title = index["title"]
+    sections = _pick_sections(index["sections"], wanted)
+    if not sections:
+        return [_extract_request(title, max_chars)]
+    lead = max_chars // 3
+    return [(_section_params(title, "0"), "text", lead, True, "sections")] + [
+        (_section_params(title, i), "text", (max_chars - lead) // len(sections), True, "sections")
+        for i in sections
+    ]
+
+def _parse_full_page(data: Dict, title: str) -> Dict:
+    return {
+        "content": clean_html(data["parse"]["text"]["*"]),
+        "sections": [s["line"] for s in data["parse"]["sections"]],
+        "url": f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}",
+        "revid": data["parse"].get("revid")
+    }
+
+@traced("wiki.search")
+def search_wikipedia(query: str, sentences: int = 3, single_request: bool = True) -> Dict:
+    """Search Wikipedia with exponential backoff and proper error handling
+
+    With ``single_request`` the search and the extract are fetched in one
+    generator query; otherwise the legacy search → `get_page_details` path is used.
+    """
+    offline = _offline(wiki_index.search, query, sentences)
+    if offline is not None:
+        return offline
+
+    key = _query_key(query, sentences)
+    cached = _cache_lookup(key)
+    if cached is not None:
+        return cached
+
+    params = _search_extract_params(query, sentences) if single_request else _search_params(query)
+
     for attempt in range(3):
         try:
             response = requests.get(WIKIPEDIA_API, params=params, headers=HEADERS, timeout=10)
             response.raise_for_status()
             data = response.json()
-            
-            if not data.get('query', {}).get('search'):
-                return {"error": "No results found", "status": 404}
-                
-            best_match = data['query']['search'][0]
-            return get_page_details(best_match['pageid'], sentences)
-            
+
+            if single_request:
+                result = _parse_search_extract(data)
+                if result is None:
+                    return {"error": "No results found", "status": 404}
+                wiki_cache.set(_page_key(result["pageid"], sentences), _summary_entry(result))
+            else:
+                if not data.get('query', {}).get('search'):
+                    return {"error": "No results found", "status": 404}
+
+                best_match = data['query']['search'][0]
+                result = get_page_details(best_match['pageid'], sentences)
+
+            if "error" not in result:
+                wiki_cache.set(key, _summary_entry(result))
+            return result
+
         except (requests.exceptions.RequestException, KeyError) as e:
             if attempt == 2:
                 return {"error": f"Wikipedia API Error: {str(e)}", "status": 500}
             time.sleep(2 ** attempt)
-    
+
     return {"error": "Unknown error", "status": 500}
 
+@traced("wiki.page")
 def get_page_details(pageid: int, sentences: int) -> Dict:
     """Get detailed page information with section awareness"""
-    params = {
-        "action": "query",
-        "pageids": pageid,
-        "prop": "extracts|info|revisions",
-        "exsentences": sentences,
-        "explaintext": True,
-        "inprop": "url",
-        "rvprop": "timestamp",
-        "format": "json"
-    }
-    
+    offline = _offline(wiki_index.page, pageid, sentences)
+    if offline is not None:
+        return offline
+
+    key = _page_key(pageid, sentences)
+    cached = _cache_lookup(key)
+    if cached is not None:
+        return cached
+
+    params = _page_params(pageid, sentences)
+
     try:
         response = requests.get(WIKIPEDIA_API, params=params, headers=HEADERS)
-        data = response.json()
-        page = data['query']['pages'][str(pageid)]
-        
-        return {
-            "title": page["title"],
-            "summary": clean_text(page.get("extract", "")),
-            "url": page["fullurl"],
-            "pageid": pageid,
-            "last_updated": page["revisions"][0]["timestamp"],
-            "wordcount": len(page.get("extract", "").split())
-        }
+        result = _parse_page(response.json(), pageid)
+        wiki_cache.set(key, _summary_entry(result))
+        return result
     except Exception as e:
         return {"error": str(e), "status": 500}
 
-def fetch_full_page(title: str) -> Dict:
-    """Get full page content with table of contents"""
-    params = {
-        "action": "parse",
-        "page": title,
-        "prop": "text|sections",
-        "format": "json",
-        "disabletoc": 1
-    }
-    
+@traced("wiki.full_page")
+def fetch_full_page(title: str, query: Optional[str] = None, max_chars: int = WIKI_FULL_PAGE_CHARS,
+                    sections: bool = WIKI_SECTION_FETCH) -> Dict:
+    """Get page content with table of contents
+
+    With ``sections`` the section index is fetched first, then only the
+    sections whose headings match ``query`` (default: the title), or else the
+    plaintext extract; those are streamed concurrently and reading stops after
+    ``max_chars`` characters.
+    """
+    offline = _offline(_offline_full_page, title, query or title, max_chars)
+    if offline is not None:
+        return offline
+    if not sections:
+        return _fetch_whole_page(title)
+    query = query or title
+    key = _full_page_key(title, query, max_chars)
+    cached = _cache_lookup(key)
+    if cached is not None:
+        return cached
+
+    wanted = _aspect_words(title, query)
+    try:
+        with ThreadPoolExecutor(max_workers=1 + WIKI_MAX_SECTIONS) as pool:
+            # Nothing specific asked for: the extract is needed whatever the index says, so fetch both at once
+            extract = None if wanted else pool.submit(_stream_text, *_extract_request(title, max_chars))
+            response = requests.get(WIKIPEDIA_API, params=_section_index_params(title), headers=HEADERS, timeout=10)
+            response.raise_for_status()
+            index = _parse_section_index(response.json(), title)
+            if "error" in index:
+                return index
+            plan = [_extract_request(title, max_chars)] if extract else _section_plan(index, wanted, max_chars)
+            parts = [extract.result()] if extract else list(pool.map(lambda request: _stream_text(*request), plan))
+        _record_full_page(plan[0][4], len(response.content), len(plan) + 1)
+        result = _sectioned_result(index, parts)
+        wiki_cache.set(key, _full_page_entry(result, title))
+        return result
+    except Exception as e:
+        return {"error": str(e), "status": 500}
+
+def _fetch_whole_page(title: str) -> Dict:
+    """The whole parsed article in one request (WIKI_SECTION_FETCH=0)"""
+    key = _full_page_key(title)
+    cached = _cache_lookup(key)
+    if cached is not None:
+        return cached
+
+    params = _full_page_params(title)
+
     try:
         response = requests.get(WIKIPEDIA_API, params=params, headers=HEADERS)
-        data = response.json()
-        return {
-            "content": clean_html(data["parse"]["text"]["*"]),
-            "sections": [s["line"] for s in data["parse"]["sections"]],
-            "url": f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}"
-        }
+        _record_full_page("legacy", len(response.content), 1)
+        result = _parse_full_page(response.json(), title)
+        wiki_cache.set(key, _full_page_entry(result, title))
+        return result
+    except Exception as e:
+        return {"error": str(e), "status": 500}
+
+def _stream_text(params: Dict, field: str, budget: int, html: bool, mode: str) -> str:
+    """Read one response until ``field`` has yielded ``budget`` characters of text, then hang up."""
+    reader = _StreamedField(field, budget, html)
+    with requests.get(WIKIPEDIA_API, params=params, headers=HEADERS, timeout=10, stream=True) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+            if reader.feed(chunk):
+                break
+    _record_read(mode, reader)
+    return reader.text()
+
+def _batch_cache_key(item, sentences: int) -> str:
+    return _page_key(item, sentences) if isinstance(item, int) else _title_key(item, sentences)
+
+def _split_batch(items: List, sentences: int):
+    """Serve offline index and fresh cache hits and chunk the misses into MediaWiki-sized requests."""
+    results, misses = {}, []
+    for item in dict.fromkeys(items):
+        cached = wiki_cache.get(_batch_cache_key(item, sentences))
+        if cached is not None and cached[1]:
+            results[item] = cached[0]["value"]
+        elif (offline := _offline(wiki_index.page if isinstance(item, int) else wiki_index.title,
+                                  item, sentences)) is not None:
+            results[item] = offline
+        else:
+            misses.append(item)
+    return results, [misses[i:i + BATCH_LIMIT] for i in range(0, len(misses), BATCH_LIMIT)]
+
+def _store_batch(results: Dict, chunk_results: Dict, sentences: int):
+    for item, result in chunk_results.items():
+        results[item] = result
+        if "error" not in result:
+            wiki_cache.set(_batch_cache_key(item, sentences), _summary_entry(result))
+
+def _chunk_request(chunk: List, sentences: int):
+    titles = [c for c in chunk if not isinstance(c, int)]
+    pageids = [c for c in chunk if isinstance(c, int)]
+    return _batch_params(sentences, titles=titles, pageids=pageids), titles, pageids
+
+@traced("wiki.batch")
+def batch_page_details(items: List, sentences: int = 3) -> Dict:
+    """Resolve many species names (titles) and/or pageids with as few requests as possible
+
+    Returns a dict mapping each requested item to a `get_page_details`-style
+    result (or an ``{"error": ...}`` dict). Titles and pageids are sent in
+    separate requests because MediaWiki does not allow mixing them.
+    """
+    by_kind = [[i for i in items if not isinstance(i, int)], [i for i in items if isinstance(i, int)]]
+    results = {}
+    for group in by_kind:
+        cached, chunks = _split_batch(group, sentences)
+        results.update(cached)
+        for chunk in chunks:
+            params, titles, pageids = _chunk_request(chunk, sentences)
+            try:
+                response = requests.get(WIKIPEDIA_API, params=params, headers=HEADERS, timeout=10)
+                response.raise_for_status()
+                _store_batch(results, _parse_batch(response.json(), titles, pageids), sentences)
+            except Exception as e:
+                results.update({item: {"error": f"Wikipedia API Error: {str(e)}", "status": 500} for item in chunk})
+    return {item: results[item] for item in items}
+
+@traced("wiki.search")
+async def asearch_wikipedia(query: str, sentences: int = 3, single_request: bool = True) -> Dict:
+    """Async variant of `search_wikipedia` using the pooled client and non-blocking backoff"""
+    offline = _offline(wiki_index.search, query, sentences)
+    if offline is not None:
+        return offline
+
+    key = _query_key(query, sentences)
+    cached = await _acache_lookup(key)
+    if cached is not None:
+        return cached
+
+    params = _search_extract_params(query, sentences) if single_request else _search_params(query)
+
+    for attempt in range(3):
+        try:
+            response = await _get_async_http().get(WIKIPEDIA_API, params=params)
+            response.raise_for_status()
+            data = response.json()
+
+            if single_request:
+                result = _parse_search_extract(data)
+                if result is None:
+                    return {"error": "No results found", "status": 404}
+                wiki_cache.set(_page_key(result["pageid"], sentences), _summary_entry(result))
+            else:
+                if not data.get('query', {}).get('search'):
+                    return {"error": "No results found", "status": 404}
+
+                best_match = data['query']['search'][0]
+                result = await aget_page_details(best_match['pageid'], sentences)
+
+            if "error" not in result:
+                wiki_cache.set(key, _summary_entry(result))
+            return result
+
+        except (httpx.HTTPError, KeyError) as e:
+            if attempt == 2:
+                return {"error": f"Wikipedia API Error: {str(e)}", "status": 500}
+            await asyncio.sleep(2 ** attempt)
+
+    return {"error": "Unknown error", "status": 500}
+
+@traced("wiki.page")
+async def aget_page_details(pageid: int, sentences: int) -> Dict:
+    """Async variant of `get_page_details`"""
+    offline = _offline(wiki_index.page, pageid, sentences)
+    if offline is not None:
+        return offline
+
+    key = _page_key(pageid, sentences)
+    cached = await _acache_lookup(key)
+    if cached is not None:
+        return cached
+
+    params = _page_params(pageid, sentences)
+
+    try:
+        response = await _get_async_http().get(WIKIPEDIA_API, params=params)
+        result = _parse_page(response.json(), pageid)
+        wiki_cache.set(key, _summary_entry(result))
+        return result
     except Exception as e:
         return {"error": str(e), "status": 500}
 
+@traced("wiki.full_page")
+async def afetch_full_page(title: str, query: Optional[str] = None, max_chars: int = WIKI_FULL_PAGE_CHARS,
+                           sections: bool = WIKI_SECTION_FETCH) -> Dict:
+    """Async variant of `fetch_full_page`"""
+    offline = _offline(_offline_full_page, title, query or title, max_chars)
+    if offline is not None:
+        return offline
+    if not sections:
+        return await _afetch_whole_page(title)
+    query = query or title
+    key = _full_page_key(title, query, max_chars)
+    cached = await _acache_lookup(key)
+    if cached is not None:
+        return cached
+
+    async def section_index():
+        response = await _get_async_http().get(WIKIPEDIA_API, params=_section_index_params(title))
+        response.raise_for_status()
+        return _parse_section_index(response.json(), title), len(response.content)
+
+    wanted = _aspect_words(title, query)
+    try:
+        if wanted:
+            (index, index_bytes), extract = await section_index(), None
+        else:  # The extract is needed whatever the index says, so fetch both at once
+            (index, index_bytes), extract = await asyncio.gather(
+                section_index(), _astream_text(*_extract_request(title, max_chars))
+            )
+        if "error" in index:
+            return index
+        plan = [_extract_request(title, max_chars)] if extract is not None else _section_plan(index, wanted, max_chars)
+        parts = [extract] if extract is not None else await asyncio.gather(*(_astream_text(*r) for r in plan))
+        _record_full_page(plan[0][4], index_bytes, len(plan) + 1)
+        result = _sectioned_result(index, parts)
+        wiki_cache.set(key, _full_page_entry(result, title))
+        return result
+    except Exception as e:
+        return {"error": str(e), "status": 500}
+
+async def _afetch_whole_page(title: str) -> Dict:
+    """Async variant of `_fetch_whole_page`"""
+    key = _full_page_key(title)
+    cached = await _acache_lookup(key)
+    if cached is not None:
+        return cached
+
+    params = _full_page_params(title)
+
+    try:
+        response = await _get_async_http().get(WIKIPEDIA_API, params=params)
+        _record_full_page("legacy", len(response.content), 1)
+        result = _parse_full_page(response.json(), title)
+        wiki_cache.set(key, _full_page_entry(result, title))
+        return result
+    except Exception as e:
+        return {"error": str(e), "status": 500}
+
+async def _astream_text(params: Dict, field: str, budget: int, html: bool, mode: str) -> str:
+    """Async variant of `_stream_text`"""
+    reader = _StreamedField(field, budget, html)
+    async with _get_async_http().stream("GET", WIKIPEDIA_API, params=params) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+            if reader.feed(chunk):
+                break
+    _record_read(mode, reader)
+    return reader.text()
+
+@traced("wiki.batch")
+async def abatch_page_details(items: List, sentences: int = 3) -> Dict:
+    """Async variant of `batch_page_details`; chunks are fetched concurrently"""
+    by_kind = [[i for i in items if not isinstance(i, int)], [i for i in items if isinstance(i, int)]]
+    results, chunks = {}, []
+    for group in by_kind:
+        cached, group_chunks = _split_batch(group, sentences)
+        results.update(cached)
+        chunks.extend(group_chunks)
+
+    async def fetch(chunk):
+        params, titles, pageids = _chunk_request(chunk, sentences)
+        try:
+            response = await _get_async_http().get(WIKIPEDIA_API, params=params)
+            response.raise_for_status()
+            _store_batch(results, _parse_batch(response.json(), titles, pageids), sentences)
+        except Exception as e:
+            results.update({item: {"error": f"Wikipedia API Error: {str(e)}", "status": 500} for item in chunk})
+
+    await asyncio.gather(*(fetch(chunk) for chunk in chunks))
+    return {item: results[item] for item in items}
+
+def _record_full_page(mode: str, index_bytes: int, requests_made: int):
+    with _full_page_stats_lock:
+        stats = _full_page_stats[mode]
+        stats["calls"] += 1
+        stats["requests"] += requests_made
+        stats["bytes_read"] += index_bytes
+
+def _record_read(mode: str, reader: "_StreamedField"):
+    with _full_page_stats_lock:
+        stats = _full_page_stats[mode]
+        stats["bytes_read"] += reader.bytes_read
+        stats["early_stops"] += reader.stopped_early
+
+
+class _TextExtractor(HTMLParser):
+    """Incremental HTML → text that drops scripts, styles, tables, references and edit links.
+
+    `feed` it chunks of parser output; ``full`` turns True once ``budget``
+    characters of text have been collected (``None``: no limit).
+    """
+
+    SKIP_TAGS = {"script", "style", "table", "sup", "math", "figure", "noscript"}
+    SKIP_CLASSES = {"reference", "references", "reflist", "mw-references-wrap", "mw-editsection", "navbox",
+                    "infobox", "thumb", "hatnote", "noprint", "metadata", "mw-empty-elt", "toc"}
+    VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source",
+                 "track", "wbr"}
+    BLOCK_TAGS = {"p", "div", "li", "ul", "ol", "dl", "dd", "dt", "h1", "h2", "h3", "h4", "h5", "h6",
+                  "blockquote", "pre", "br"}
+
+    def __init__(self, budget: Optional[int] = None):
+        super().__init__(convert_charrefs=True)
+        self.budget = budget
+        self.full = False
+        self._parts = []
+        self._length = 0
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self._skip_depth:
+            if tag not in self.VOID_TAGS:
+                self._skip_depth += 1
+            return
+        classes = set((dict(attrs).get("class") or "").split())
+        if (tag in self.SKIP_TAGS or classes & self.SKIP_CLASSES) and tag not in self.VOID_TAGS:
+            self._skip_depth = 1
+        elif tag in self.BLOCK_TAGS:
+            self._parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if self._skip_depth:
+            self._skip_depth -= 1
+        elif tag in self.BLOCK_TAGS:
+            self._parts.append("\n")
+
+    def handle_data(self, data):
+        if self._skip_depth or self.full:
+            return
+        self._parts.append(data)
+        self._length += len(data)
+        if self.budget is not None and self._length >= self.budget:
+            self.full = True
+
+    def text(self) -> str:
+        text = re.sub(r'[ \t\r\f\v]+', ' ', "".join(self._parts))
+        text = re.sub(r' ?\n[\n ]*', lambda m: "\n\n" if m.group(0).count("\n") > 1 else "\n", text).strip()
+        return text[:self.budget] if self.budget is not None else text
+
+
+# One complete JSON string unit at a time; an escape cut off by a chunk boundary is left for the next chunk
+_JSON_STRING_PART = re.compile(r'(?:[^"\\]+|\\u[0-9a-fA-F]{4}|\\[^u])*')
+_HIGH_SURROGATE_END = re.compile(r'\\u[dD][89abAB][0-9a-fA-F]{2}$')
+
+
+class _StreamedField:
+    """Pulls the string value of ``field`` out of a JSON response as it streams in.
+
+    The value is decoded (and, with ``html``, stripped of markup) chunk by
+    chunk; `feed` returns True as soon as ``budget`` characters of text are
+    in hand or the value has ended, so the caller can stop reading.
+    """
+
+    def __init__(self, field: str, budget: int, html: bool):
+        self.budget = budget
+        self.bytes_read = 0
+        self.stopped_early = False
+        self._start = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._html = _TextExtractor(budget) if html else None
+        self._plain = []
+        self._plain_length = 0
+        self._pending = ""
+        self._inside = False
+        self._done = False
+
+    def feed(self, chunk: bytes) -> bool:
+        if self._done:
+            return True
+        self.bytes_read += len(chunk)
+        self._pending += self._decoder.decode(chunk)
+        if not self._inside:
+            match = self._start.search(self._pending)
+            if not match:
+                self._pending = self._pending[-64:]  # Enough to find a key split across chunks
+                return False
+            self._inside = True
+            self._pending = self._pending[match.end():]
+
+        match = _JSON_STRING_PART.match(self._pending)
+        body, rest = match.group(0), self._pending[match.end():]
+        ended = rest.startswith('"')
+        if not ended and (tail := _HIGH_SURROGATE_END.search(body)):
+            body, rest = body[:tail.start()], body[tail.start():] + rest  # Wait for the low surrogate
+        self._pending = "" if ended else rest
+        self._add(json.loads(f'"{body}"'))
+
+        full = self._html.full if self._html else self._plain_length >= self.budget
+        self.stopped_early = full and not ended
+        self._done = ended or full
+        return self._done
+
+    def _add(self, text: str):
+        if self._html:
+            self._html.feed(text)
+        elif self._plain_length < self.budget:
+            self._plain.append(text)
+            self._plain_length += len(text)
+
+    def text(self) -> str:
+        if self._html:
+            self._html.close()
+            return self._html.text()
+        text = re.sub(r'[ \t]+', ' ', "".join(self._plain))
+        return re.sub(r'\n\s*\n\s*', '\n\n', text).strip()[:self.budget]
+
+
 def clean_html(html: str) -> str:
-    """Basic HTML cleaning while preserving structure"""
-    return re.sub(r'<[^>]+>', '', html)
+    """HTML to readable text: drops scripts, styles, tables and references, keeps paragraph breaks"""
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return extractor.text()
 
 def clean_text(text: str) -> str:
     """Clean text for GPT consumption"""
-    return re.sub(r'\s+', ' ', text).strip()
\ No newline at end of file
+    return re.sub(r'\s+', ' ', text).strip()
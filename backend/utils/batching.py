@@ -0,0 +1,85 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+
+class MicroBatcher:
+    """Coalesces concurrent async requests into batched calls of a sync function.
+
+    Callers ``await submit(item)``. Items are optionally preprocessed in a thread
+    pool (so decoding overlaps with inference), queued, and a collector task
+    groups up to ``max_batch_size`` of them, waiting at most ``max_wait_ms``
+    after the first item. ``process_batch(items)`` runs on a dedicated
+    inference thread and must return one result per item, in order; results
+    (or the exception) are scattered back to the waiting callers.
+    """
+
+    def __init__(self, process_batch: Callable[[List[Any]], List[Any]], max_batch_size: int = 16,
+                 max_wait_ms: float = 10, preprocess: Optional[Callable[[Any], Any]] = None,
+                 preprocess_workers: int = 4):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.preprocess = preprocess
+        self._preprocess_pool = ThreadPoolExecutor(preprocess_workers, thread_name_prefix="batch-preprocess")
+        self._inference_pool = ThreadPoolExecutor(1, thread_name_prefix="batch-inference")
+        self._queue = None
+        self._worker = None
+        self._loop = None
+        self._lock = threading.Lock()
+        self.stats = {"batches": 0, "items": 0, "max_batch": 0}
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._collect())
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        if self.preprocess is not None:
+            item = await loop.run_in_executor(self._preprocess_pool, self.preprocess, item)
+        self._ensure_worker()
+        future = loop.create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait_ms / 1000
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            items = [item for item, _ in batch]
+            try:
+                results = await loop.run_in_executor(self._inference_pool, self.process_batch, items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"process_batch returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            with self._lock:
+                self.stats["batches"] += 1
+                self.stats["items"] += len(items)
+                self.stats["max_batch"] = max(self.stats["max_batch"], len(items))
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
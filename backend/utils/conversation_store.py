@@ -0,0 +1,321 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+from backend.utils.shared_state import SQLiteDatabase, state_path
+
+# Conversation store configuration
+CONVERSATION_BACKEND = os.getenv("CONVERSATION_BACKEND", "memory")  # "memory" or "sqlite"
+CONVERSATION_DB_PATH = os.getenv("CONVERSATION_DB_PATH", state_path("conversations.db"))
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", 20))  # messages kept verbatim per session
+SESSION_IDLE_TTL = int(os.getenv("SESSION_IDLE_TTL", 3600))  # seconds
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", 10000))
+SESSION_MESSAGE_CHARS = int(os.getenv("SESSION_MESSAGE_CHARS", 4000))
+SESSION_SUMMARY_CHARS = int(os.getenv("SESSION_SUMMARY_CHARS", 1500))  # 0 disables compaction
+SESSION_MEMO_ENTRIES = int(os.getenv("SESSION_MEMO_ENTRIES", 32))  # answers remembered per session
+
+CONVERSATION_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS sessions ("
+    "session_id TEXT PRIMARY KEY, summary TEXT NOT NULL DEFAULT '', last_active REAL NOT NULL, "
+    "next_seq INTEGER NOT NULL DEFAULT 0);"
+    "CREATE INDEX IF NOT EXISTS sessions_last_active ON sessions (last_active);"
+    "CREATE TABLE IF NOT EXISTS messages ("
+    "session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, "
+    "PRIMARY KEY (session_id, seq));"
+    "CREATE TABLE IF NOT EXISTS answers ("
+    "session_id TEXT NOT NULL, key TEXT NOT NULL, result TEXT NOT NULL, created_at REAL NOT NULL, "
+    "PRIMARY KEY (session_id, key));"
+)
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+def compact(summary: str, message: Dict, limit: int = SESSION_SUMMARY_CHARS) -> str:
+    """Fold a message leaving the ring buffer into the rolling summary (first sentence, newest last)."""
+    if limit <= 0:
+        return ""
+    first = re.split(r'(?<=[.!?])\s', message["content"].strip(), maxsplit=1)[0][:200]
+    summary = f"{summary}\n{message['role']}: {first}".strip()
+    if len(summary) > limit:
+        summary = summary[len(summary) - limit:].split("\n", 1)[-1]
+    return summary
+
+
+def recent_messages(history, n: int) -> List[Dict]:
+    """Last n messages from a session view or a plain list of messages."""
+    if history is None:
+        return []
+    if hasattr(history, "recent"):
+        return history.recent(n)
+    return list(history[-n:]) if n else []
+
+
+class Session:
+    """A view of one conversation, handed to the agents in place of a history list."""
+
+    def __init__(self, store, session_id: str):
+        self.store = store
+        self.session_id = session_id
+
+    def recent(self, n: int) -> List[Dict]:
+        return self.store.recent(self.session_id, n)
+
+    @property
+    def summary(self) -> str:
+        return self.store.summary(self.session_id)
+
+    def append(self, role: str, content: str):
+        self.store.append(self.session_id, role, content)
+
+    def recall(self, key: str) -> Optional[Dict]:
+        return self.store.recall(self.session_id, key)
+
+    def remember(self, key: str, result: Dict):
+        self.store.remember(self.session_id, key, result)
+
+
+class MemoryConversationStore:
+    """Per-session ring buffers in process memory.
+
+    Each session keeps its last ``max_turns`` messages in a bounded deque;
+    older messages are compacted into a short rolling summary. Sessions are
+    kept in least-recently-active order, so idle ones (and the oldest, past
+    ``max_sessions``) are evicted from the front without scanning.
+    """
+
+    def __init__(self, max_turns: int = SESSION_MAX_TURNS, idle_ttl: int = SESSION_IDLE_TTL,
+                 max_sessions: int = SESSION_MAX_SESSIONS, summary_chars: int = SESSION_SUMMARY_CHARS,
+                 memo_entries: int = SESSION_MEMO_ENTRIES):
+        self.max_turns = max_turns
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.summary_chars = summary_chars
+        self.memo_entries = memo_entries
+        # session_id -> {"turns": deque, "summary": str, "answers": OrderedDict, "last_active": float}
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"evicted_sessions": 0, "compacted_messages": 0}
+
+    def session(self, session_id: str) -> Session:
+        return Session(self, session_id)
+
+    def _evict(self, now: float):
+        while self._sessions:
+            session_id, state = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - state["last_active"] <= self.idle_ttl:
+                break
+            del self._sessions[session_id]
+            self._stats["evicted_sessions"] += 1
+
+    def _state(self, session_id: str, now: float) -> Dict:
+        state = self._sessions.get(session_id)
+        if state is None:
+            state = {"turns": deque(maxlen=self.max_turns), "summary": "", "answers": OrderedDict(),
+                     "last_active": now}
+            self._sessions[session_id] = state
+        state["last_active"] = now
+        self._sessions.move_to_end(session_id)
+        return state
+
+    def append(self, session_id: str, role: str, content: str):
+        now = time.time()
+        with self._lock:
+            state = self._state(session_id, now)
+            turns = state["turns"]
+            if len(turns) == turns.maxlen:
+                state["summary"] = compact(state["summary"], turns[0], self.summary_chars)
+                self._stats["compacted_messages"] += 1
+            turns.append({"role": role, "content": (content or "")[:SESSION_MESSAGE_CHARS]})
+            self._evict(now)
+
+    def recall(self, session_id: str, key: str) -> Optional[Dict]:
+        """The result remembered for ``key`` in this session, if any."""
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None or key not in state["answers"]:
+                return None
+            state["answers"].move_to_end(key)
+            return dict(state["answers"][key])
+
+    def remember(self, session_id: str, key: str, result: Dict):
+        now = time.time()
+        with self._lock:
+            answers = self._state(session_id, now)["answers"]
+            answers[key] = dict(result)
+            answers.move_to_end(key)
+            while len(answers) > self.memo_entries:
+                answers.popitem(last=False)
+            self._evict(now)
+
+    def recent(self, session_id: str, n: int) -> List[Dict]:
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None or n <= 0:
+                return []
+            turns = state["turns"]
+            return [turns[i] for i in range(max(0, len(turns) - n), len(turns))]
+
+    def summary(self, session_id: str) -> str:
+        with self._lock:
+            state = self._sessions.get(session_id)
+            return state["summary"] if state else ""
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._evict(time.time())
+            return {"backend": "memory", "sessions": len(self._sessions), **self._stats}
+
+
+class SQLiteConversationStore:
+    """Per-session ring buffers persisted in SQLite (shared across restarts and worker processes).
+
+    Same behaviour as `MemoryConversationStore`: messages beyond ``max_turns``
+    are deleted and folded into the session summary, and idle sessions are
+    purged periodically. Reads are an index range scan on (session_id, seq).
+    """
+
+    def __init__(self, path: str = CONVERSATION_DB_PATH, max_turns: int = SESSION_MAX_TURNS,
+                 idle_ttl: int = SESSION_IDLE_TTL, max_sessions: int = SESSION_MAX_SESSIONS,
+                 summary_chars: int = SESSION_SUMMARY_CHARS, memo_entries: int = SESSION_MEMO_ENTRIES):
+        self.max_turns = max_turns
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.summary_chars = summary_chars
+        self.memo_entries = memo_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {"evicted_sessions": 0, "compacted_messages": 0}
+        self._database = SQLiteDatabase(path, CONVERSATION_SCHEMA)
+
+    @property
+    def _conn(self):
+        return self._database.connection()
+
+    def session(self, session_id: str) -> Session:
+        return Session(self, session_id)
+
+    def _evict(self, now: float):
+        stale = [row[0] for row in self._conn.execute(
+            "SELECT session_id FROM sessions WHERE last_active < ?", (now - self.idle_ttl,)
+        )]
+        excess = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - len(stale) - self.max_sessions
+        if excess > 0:
+            stale += [row[0] for row in self._conn.execute(
+                "SELECT session_id FROM sessions WHERE last_active >= ? ORDER BY last_active LIMIT ?",
+                (now - self.idle_ttl, excess)
+            )]
+        for session_id in stale:
+            self._delete(session_id)
+        self._stats["evicted_sessions"] += len(stale)
+
+    def _delete(self, session_id: str):
+        for table in ("messages", "answers", "sessions"):
+            self._conn.execute(f"DELETE FROM {table} WHERE session_id = ?", (session_id,))
+
+    def append(self, session_id: str, role: str, content: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")  # Other workers may append to the same session
+            row = self._conn.execute(
+                "SELECT summary, next_seq FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            summary, seq = row if row else ("", 0)
+            self._conn.execute(
+                "INSERT INTO messages (session_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                (session_id, seq, role, (content or "")[:SESSION_MESSAGE_CHARS])
+            )
+            dropped = self._conn.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? AND seq <= ? ORDER BY seq",
+                (session_id, seq - self.max_turns)
+            ).fetchall()
+            for old_role, old_content in dropped:
+                summary = compact(summary, {"role": old_role, "content": old_content}, self.summary_chars)
+            if dropped:
+                self._conn.execute(
+                    "DELETE FROM messages WHERE session_id = ? AND seq <= ?", (session_id, seq - self.max_turns)
+                )
+                self._stats["compacted_messages"] += len(dropped)
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, summary, last_active, next_seq) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET summary = excluded.summary, "
+                "last_active = excluded.last_active, next_seq = excluded.next_seq",
+                (session_id, summary, now, seq + 1)
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._evict(now)
+            self._conn.commit()
+
+    def recent(self, session_id: str, n: int) -> List[Dict]:
+        if n <= 0:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+                (session_id, n)
+            ).fetchall()
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+    def summary(self, session_id: str) -> str:
+        with self._lock:
+            row = self._conn.execute("SELECT summary FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else ""
+
+    def recall(self, session_id: str, key: str) -> Optional[Dict]:
+        """The result remembered for ``key`` in this session, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM answers WHERE session_id = ? AND key = ?", (session_id, key)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def remember(self, session_id: str, key: str, result: Dict):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (session_id, key, result, created_at) VALUES (?, ?, ?, ?)",
+                (session_id, key, json.dumps(result), now)
+            )
+            self._conn.execute(
+                "DELETE FROM answers WHERE session_id = ? AND key NOT IN "
+                "(SELECT key FROM answers WHERE session_id = ? ORDER BY created_at DESC LIMIT ?)",
+                (session_id, session_id, self.memo_entries)
+            )
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, last_active) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET last_active = excluded.last_active", (session_id, now)
+            )
+            self._conn.commit()
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._delete(session_id)
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._evict(time.time())
+            self._conn.commit()
+            sessions = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {"backend": "sqlite", "sessions": sessions, **self._stats}
+
+
+def create_conversation_store(backend: Optional[str] = None):
+    """Store selected by ``CONVERSATION_BACKEND``."""
+    backend = backend or CONVERSATION_BACKEND
+    if backend == "sqlite":
+        return SQLiteConversationStore()
+    if backend == "memory":
+        return MemoryConversationStore()
+    raise ValueError(f"❌ Unknown conversation backend: {backend}")
@@ -0,0 +1,55 @@
+import os
+import sqlite3
+import threading
+
+# Shared state for multi-worker serving. Every SQLite-backed store (wiki cache,
+# image/text answer caches, conversations) opens its file through
+# `SQLiteDatabase`, so one file on local disk is safely shared by all workers.
+STATE_DIR = os.getenv(
+    "ECOBOT_STATE_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".cache"))
+)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+
+
+def state_path(name: str) -> str:
+    return os.path.join(STATE_DIR, name)
+
+
+class SQLiteDatabase:
+    """A SQLite file shared by threads and forked worker processes.
+
+    The connection is opened lazily and per process: a connection inherited
+    across ``fork()`` is never reused. File databases run in WAL mode with a
+    busy timeout, so readers in one worker never block on a writer in another
+    and concurrent writers wait instead of failing. ``path=""`` gives a
+    private in-memory database.
+    """
+
+    def __init__(self, path: str, schema: str = ""):
+        self.path = path
+        self.schema = schema
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            with self._lock:
+                if self._conn is None or self._pid != os.getpid():
+                    self._conn = self._open()
+                    self._pid = os.getpid()
+        return self._conn
+
+    def _open(self) -> sqlite3.Connection:
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path or ":memory:", check_same_thread=False,
+                               timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+        if self.path:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        if self.schema:
+            conn.executescript(self.schema)
+            conn.commit()
+        return conn
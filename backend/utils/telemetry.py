@@ -0,0 +1,414 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter as _Tally
+from typing import Dict, Optional
+
+# Request tracing, Prometheus metrics and an opt-in sampling profiler.
+#
+# Every request gets a trace (request ID + spans). Spans come from
+# `span(...)` blocks and `@traced(...)` functions; each one feeds the
+# per-stage latency histogram and, when the request ends, the structured
+# log line. Metrics are per process: with several workers, scrape each one
+# or aggregate in Prometheus.
+TRACE_LOG_LEVEL = os.getenv("TRACE_LOG_LEVEL", "INFO")
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", 200))
+# Profile this fraction of requests; keep profiles slower than PROFILE_MIN_MS
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+# Let clients ask for a profile with "X-Profile: 1" (off by default: profiling costs every concurrent request)
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "0") == "1"
+PROFILE_MIN_MS = float(os.getenv("PROFILE_MIN_MS", 500))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+PROFILE_DIR = os.getenv(
+    "PROFILE_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".cache", "profiles"))
+)
+
+# Client-supplied X-Request-Id values are echoed only if they look like this; otherwise one is generated
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9-]{1,64}$')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+logger = logging.getLogger("ecobot.trace")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(TRACE_LOG_LEVEL)
+    logger.propagate = False
+
+
+def _label_text(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                     for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labels)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            return [f"{self.name}{_label_text(self.labels, k)} {v}" for k, v in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[0][i] += 1
+            counts[1] += value
+            counts[2] += 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for key, (buckets, total, count) in self._values.items():
+                for bound, n in zip(self.buckets, buckets):
+                    lines.append(f"{self.name}_bucket{_label_text(self.labels + ('le',), key + (bound,))} {n}")
+                lines.append(f"{self.name}_bucket{_label_text(self.labels + ('le',), key + ('+Inf',))} {count}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {round(total, 6)}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {count}")
+        return lines
+
+
+_registry = []
+_collectors = []
+
+stage_seconds = Histogram("ecobot_stage_duration_seconds", "Duration of agent and tool stages", ("stage",))
+stage_errors = Counter("ecobot_stage_errors_total", "Stages that raised or returned an error", ("stage",))
+openai_seconds = Histogram("ecobot_openai_request_duration_seconds", "OpenAI chat completion latency",
+                           ("model", "outcome"))
+http_seconds = Histogram("ecobot_http_request_duration_seconds", "HTTP request latency", ("path",))
+http_requests = Counter("ecobot_http_requests_total", "HTTP requests by status", ("path", "status"))
+http_in_flight = Gauge("ecobot_http_requests_in_flight", "HTTP requests being handled")
+
+
+def register_collector(name: str, label: str, collect):
+    """Expose `collect()` → {label value: stats dict} as gauges ``ecobot_<name>_<field>{<label>=...}``."""
+    _collectors.append((name, label, collect))
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} {metric.kind}"]
+        lines += metric.render()
+    for name, label, collect in _collectors:
+        try:
+            groups = collect()
+        except Exception:
+            continue
+        fields = {}
+        for value, stats in groups.items():
+            for field, number in stats.items():
+                if isinstance(number, (int, float)) and not isinstance(number, bool):
+                    fields.setdefault(field, []).append(f"{{{label}=\"{value}\"}} {number}")
+        for field, samples in fields.items():
+            metric = f"ecobot_{name}_{field}"
+            lines += [f"# TYPE {metric} gauge"] + [metric + sample for sample in samples]
+    return "\n".join(lines) + "\n"
+
+
+class Trace:
+    """Spans recorded while handling one request."""
+
+    def __init__(self, request_id: Optional[str] = None):
+        self.request_id = request_id or uuid.uuid4().hex[:16]
+        self.started = time.perf_counter()
+        self.spans = []
+        self.dropped = 0
+
+    def add(self, record: dict):
+        if len(self.spans) < TRACE_MAX_SPANS:
+            self.spans.append(record)
+        else:
+            self.dropped += 1
+
+    def summary(self, **fields) -> dict:
+        return dict(
+            request_id=self.request_id,
+            duration_ms=round((time.perf_counter() - self.started) * 1000, 1),
+            spans=self.spans,
+            **({"dropped_spans": self.dropped} if self.dropped else {}),
+            **fields,
+        )
+
+
+_current_trace = contextvars.ContextVar("ecobot_trace", default=None)
+_current_span = contextvars.ContextVar("ecobot_span", default=None)
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+def start_trace(request_id: Optional[str] = None) -> Trace:
+    trace = Trace(request_id)
+    _current_trace.set(trace)
+    return trace
+
+
+def finish_trace(trace: Trace, **fields):
+    """Write the request's structured log line."""
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(trace.summary(**fields), default=str))
+
+
+def _size(value) -> Optional[int]:
+    if isinstance(value, (bytes, bytearray, memoryview, str)):
+        return len(value)
+    return None
+
+
+def _is_error(result) -> bool:
+    if isinstance(result, str):
+        return result.startswith("❌")
+    return isinstance(result, dict) and "error" in result
+
+
+class _Span:
+    def __init__(self, stage: str, attrs: dict):
+        self.stage = stage
+        self.attrs = attrs
+        self.error = None
+        self._started = time.perf_counter()
+        self._token = None
+        parent = _current_span.get()
+        self.parent = parent.stage if parent else None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            pass  # An async generator closed from another context
+        if exc is not None and not isinstance(exc, (GeneratorExit, asyncio.CancelledError)):
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.close()
+        return False
+
+    def close(self):
+        duration = time.perf_counter() - self._started
+        stage_seconds.observe(duration, stage=self.stage)
+        if self.error:
+            stage_errors.inc(stage=self.stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            record = {"stage": self.stage, "ms": round(duration * 1000, 2),
+                      "start_ms": round((self._started - trace.started) * 1000, 2)}
+            if self.parent:
+                record["parent"] = self.parent
+            if self.error:
+                record["error"] = self.error[:200]
+            record.update(self.attrs)
+            trace.add(record)
+
+
+def span(stage: str, **attrs) -> _Span:
+    """Times a block: ``with span("wiki.fetch", title=t) as s: ...; s.set(bytes=n)``."""
+    return _Span(stage, dict(attrs))
+
+
+def traced(stage: str):
+    """Decorator recording a span around a function, coroutine or async generator.
+
+    The size of the first str/bytes argument and of a str/bytes result are
+    recorded, and results following the repo's error conventions ("❌ ..."
+    strings, ``{"error": ...}`` dicts) count as errors.
+    """
+    def decorate(fn):
+        def start(args, kwargs):
+            attrs = {}
+            for value in list(args) + list(kwargs.values()):
+                size = _size(value)
+                if size is not None:
+                    attrs["in_size"] = size
+                    break
+            return span(stage, **attrs)
+
+        def finish(s, result):
+            size = _size(result)
+            if size is not None:
+                s.set(out_size=size)
+            if _is_error(result):
+                s.error = str(result.get("error") if isinstance(result, dict) else result)
+            return result
+
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def agen_wrapper(*args, **kwargs):
+                with start(args, kwargs) as s:
+                    produced, first = 0, None
+                    async for item in fn(*args, **kwargs):
+                        if first is None:
+                            first = time.perf_counter()
+                            s.set(first_item_ms=round((first - s._started) * 1000, 2))
+                        produced += _size(item) or 0
+                        yield item
+                    s.set(out_size=produced)
+            return agen_wrapper
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with start(args, kwargs) as s:
+                    return finish(s, await fn(*args, **kwargs))
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with start(args, kwargs) as s:
+                return finish(s, fn(*args, **kwargs))
+        return wrapper
+
+    return decorate
+
+
+class SamplingProfiler:
+    """Samples one thread's stack every `interval` seconds into collapsed ("folded") stacks.
+
+    The output loads into flamegraph.pl, speedscope or inferno. Sampling the
+    event-loop thread also catches other requests running concurrently, so
+    profiles are best taken under light load.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = PROFILE_INTERVAL_MS / 1000):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = _Tally()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="ecobot-profiler")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+    def save(self, name: str) -> str:
+        root = os.path.realpath(PROFILE_DIR)
+        path = os.path.realpath(os.path.join(root, f"{name}.folded"))
+        if os.path.dirname(path) != root:
+            raise ValueError(f"Profile name escapes PROFILE_DIR: {name!r}")
+        os.makedirs(root, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.folded())
+        return path
+
+
+def should_profile(requested: bool = False) -> bool:
+    return requested or (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)
+
+
+class TracingMiddleware:
+    """ASGI middleware: request IDs, in-flight/latency/status metrics, the per-request log line
+    and optional profiling. Streamed responses are timed until their last chunk is sent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")
+        trace = start_trace(request_id if _REQUEST_ID.match(request_id) else None)
+        requested = PROFILE_ENABLED and headers.get(b"x-profile") == b"1"
+        profiler = SamplingProfiler().start() if should_profile(requested) else None
+        status = {"code": 500}
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-request-id", trace.request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            http_in_flight.dec()
+            path = scope["path"] if scope.get("endpoint") else "unmatched"
+            duration = time.perf_counter() - trace.started
+            http_seconds.observe(duration, path=path)
+            http_requests.inc(path=path, status=status["code"])
+            fields = {"method": scope.get("method"), "path": scope["path"], "status": status["code"]}
+            if profiler is not None:
+                profiler.stop()
+                if duration * 1000 >= PROFILE_MIN_MS or requested:
+                    # Named by the server, never by the (possibly client-chosen) request ID
+                    fields["profile"] = profiler.save(uuid.uuid4().hex)
+            finish_trace(trace, **fields)
@@ -0,0 +1,138 @@
+import os
+import threading
+from typing import Dict, List
+
+# Input-token budgets per model, e.g. "gpt-4o=12000,gpt-4o-mini=6000". They are
+# well below the context windows: they bound latency and cost, not just errors.
+PROMPT_TOKEN_BUDGETS = os.getenv("PROMPT_TOKEN_BUDGETS", "gpt-4o=12000,gpt-4o-mini=6000")
+PROMPT_TOKEN_BUDGET_DEFAULT = int(os.getenv("PROMPT_TOKEN_BUDGET_DEFAULT", 6000))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 1500))  # Cap on conversation context
+# Set TOKEN_COUNTER=estimate to skip tiktoken (its encodings are downloaded on first use)
+TOKEN_COUNTER = os.getenv("TOKEN_COUNTER", "tiktoken")
+
+# Prompt parts in the order they are trimmed when a prompt is over budget.
+# History keeps its most recent end; everything else keeps its beginning.
+TRIM_ORDER = ("history", "document", "query", "system")
+
+_encodings = {}
+_lock = threading.Lock()
+_stats = {"prompts": 0, "trimmed_prompts": 0, "trimmed_tokens": 0}
+
+
+def _parse_budgets(spec: str) -> Dict[str, int]:
+    budgets = {}
+    for item in spec.split(","):
+        model, _, tokens = item.partition("=")
+        if model.strip() and tokens.strip():
+            budgets[model.strip()] = int(tokens)
+    return budgets
+
+
+_budgets = _parse_budgets(PROMPT_TOKEN_BUDGETS)
+
+
+def prompt_budget(model: str) -> int:
+    return _budgets.get(model, PROMPT_TOKEN_BUDGET_DEFAULT)
+
+
+def _encoding(model: str):
+    """The tiktoken encoding for the model, or None if tiktoken or its data is unavailable."""
+    if TOKEN_COUNTER != "tiktoken":
+        return None
+    if model not in _encodings:
+        with _lock:
+            if model not in _encodings:
+                try:
+                    import tiktoken
+                    try:
+                        _encodings[model] = tiktoken.encoding_for_model(model)
+                    except KeyError:
+                        _encodings[model] = tiktoken.get_encoding("o200k_base")
+                except Exception:
+                    _encodings[model] = None  # Offline or not installed: estimate instead
+    return _encodings[model]
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """Tokens in `text` for the model (≈4 characters per token if tiktoken is unavailable)."""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, limit: int, model: str = "gpt-4o", keep_end: bool = False) -> str:
+    """`text` cut to at most `limit` tokens, keeping its beginning (or its end)."""
+    if limit <= 0:
+        return ""
+    if count_tokens(text, model) <= limit:
+        return text
+    encoding = _encoding(model)
+    if encoding is None:
+        chars = max(0, (limit - 1) * 4)
+        return "…" + text[len(text) - chars:] if keep_end else text[:chars] + "…"
+    tokens = encoding.encode(text, disallowed_special=())
+    kept = limit - 1  # One token for the ellipsis
+    return "…" + encoding.decode(tokens[len(tokens) - kept:]) if keep_end else encoding.decode(tokens[:kept]) + "…"
+
+
+def fit_prompt(parts: Dict[str, str], model: str) -> Dict[str, str]:
+    """Trims prompt parts (system, history, document, query) to the model's input budget.
+
+    History is first capped at HISTORY_TOKEN_BUDGET. If the prompt is still
+    over budget, parts are cut in TRIM_ORDER until it fits. Returns a new dict.
+    """
+    budget = prompt_budget(model)
+    fitted = {name: text or "" for name, text in parts.items()}
+    counts = {name: count_tokens(text, model) for name, text in fitted.items()}
+    before = sum(counts.values())
+    if counts.get("history", 0) > HISTORY_TOKEN_BUDGET:
+        fitted["history"] = truncate_tokens(fitted["history"], HISTORY_TOKEN_BUDGET, model, keep_end=True)
+        counts["history"] = count_tokens(fitted["history"], model)
+
+    for name in TRIM_ORDER:
+        excess = sum(counts.values()) - budget
+        if excess <= 0:
+            break
+        if counts.get(name):
+            fitted[name] = truncate_tokens(fitted[name], max(0, counts[name] - excess), model,
+                                           keep_end=name == "history")
+            counts[name] = count_tokens(fitted[name], model)
+
+    after = sum(counts.values())
+    with _lock:
+        _stats["prompts"] += 1
+        if after < before:
+            _stats["trimmed_prompts"] += 1
+            _stats["trimmed_tokens"] += before - after
+    return fitted
+
+
+def fit_messages(messages: List[Dict], model: str) -> List[Dict]:
+    """Last-resort guard before a call: trims the longest text messages until the prompt fits.
+
+    Prompt builders budget their parts with `fit_prompt`; this only catches
+    prompts that were assembled without it. Image parts are left alone.
+    """
+    budget = prompt_budget(model)
+    counts = [count_tokens(m["content"], model) if isinstance(m.get("content"), str) else 0 for m in messages]
+    excess = sum(counts) - budget
+    if excess <= 0:
+        return messages
+    messages, trimmed = [dict(m) for m in messages], excess
+    for i in sorted(range(len(messages)), key=lambda i: counts[i], reverse=True):
+        if excess <= 0 or not counts[i]:
+            break
+        messages[i]["content"] = truncate_tokens(messages[i]["content"], max(0, counts[i] - excess), model)
+        excess -= counts[i] - count_tokens(messages[i]["content"], model)
+    with _lock:
+        _stats["trimmed_prompts"] += 1
+        _stats["trimmed_tokens"] += trimmed - max(excess, 0)
+    return messages
+
+
+def budget_stats() -> dict:
+    with _lock:
+        return dict(_stats, counter="tiktoken" if any(_encodings.values()) else "estimate")
@@ -0,0 +1,285 @@
+import contextlib
+import hashlib
+import json
+import mmap
+import os
+import re
+import threading
+import time
+from typing import BinaryIO, Dict, Optional, Tuple, Union
+
+from starlette.formparsers import MultiPartException
+
+from backend.utils.shared_state import state_path
+
+# Per-file limits, checked while the upload is hashed
+UPLOAD_MAX_IMAGE_BYTES = int(os.getenv("UPLOAD_MAX_IMAGE_BYTES", 20 * 1024 * 1024))
+UPLOAD_MAX_PDF_BYTES = int(os.getenv("UPLOAD_MAX_PDF_BYTES", 50 * 1024 * 1024))
+# Whole request bodies past this are refused as they arrive (the largest file plus room for form fields)
+UPLOAD_MAX_REQUEST_BYTES = int(os.getenv(
+    "UPLOAD_MAX_REQUEST_BYTES", max(UPLOAD_MAX_IMAGE_BYTES, UPLOAD_MAX_PDF_BYTES) + 2 * 1024 * 1024
+))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Content-addressed copies of recent uploads, so a re-sent file is recognised by its hash
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", state_path("uploads"))
+UPLOAD_STORE_MAX_BYTES = int(os.getenv("UPLOAD_STORE_MAX_BYTES", 1024 * 1024 * 1024))
+# Files used this recently are never evicted, so another worker's in-flight request keeps its file
+UPLOAD_MIN_AGE = float(os.getenv("UPLOAD_MIN_AGE", 600))  # seconds
+
+# Raw bytes, or the path of a file on disk
+FileSource = Union[bytes, str]
+
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{64}$')
+_MAGIC = (
+    (b"%PDF-", "application/pdf"), (b"\x89PNG\r\n\x1a\n", "image/png"), (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"), (b"GIF89a", "image/gif"),
+)
+
+
+class UploadRejected(Exception):
+    """An upload that cannot be used; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+
+
+def upload_limit(content_type: Optional[str]) -> int:
+    return UPLOAD_MAX_PDF_BYTES if "pdf" in (content_type or "") else UPLOAD_MAX_IMAGE_BYTES
+
+
+def sha256_stream(stream: BinaryIO, limit: Optional[int] = None) -> Tuple[str, int]:
+    """``(hex digest, size)`` of a binary stream, read in chunks; raises `UploadRejected` past ``limit`` bytes."""
+    digest, size = hashlib.sha256(), 0
+    while chunk := stream.read(UPLOAD_CHUNK_SIZE):
+        size += len(chunk)
+        if limit is not None and size > limit:
+            raise UploadRejected(f"❌ File too large: the limit is {limit / 2 ** 20:g} MB", 413)
+        digest.update(chunk)
+    return digest.hexdigest(), size
+
+
+def source_size(source: FileSource) -> int:
+    return os.path.getsize(source) if isinstance(source, str) else len(source)
+
+
+@contextlib.contextmanager
+def source_buffer(source: FileSource):
+    """The contents of ``source`` as a buffer: the bytes themselves, or a read-only memory map of the file."""
+    if not isinstance(source, str):
+        yield source
+        return
+    with open(source, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""  # Empty files cannot be mapped
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield buffer
+
+
+def sniff_content_type(path: str) -> str:
+    """MIME type of a stored upload from its leading bytes."""
+    with open(path, "rb") as f:
+        head = f.read(16)
+    for magic, content_type in _MAGIC:
+        if head.startswith(magic):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+class UploadStore:
+    """Uploaded files on disk, addressed by the SHA-256 of their content.
+
+    `save` hashes an upload's spooled stream in chunks and copies it in only
+    if the hash is new, so a re-sent file is neither written again nor held
+    in memory. Tools get the stored file's path; clients can send the
+    returned ``upload_id`` instead of the file on later turns.
+
+    Once the store exceeds ``max_bytes`` the least recently used files are
+    removed, down to 90% of it, except files pinned by a request in this
+    process (``save``/``get`` with ``pin=True``, until `release`) and files
+    used in the last ``min_age`` seconds. The directory is only listed when
+    the running size estimate says the store is over its limit.
+    """
+
+    def __init__(self, root: str = UPLOAD_DIR, max_bytes: int = UPLOAD_STORE_MAX_BYTES,
+                 min_age: float = UPLOAD_MIN_AGE):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.min_age = min_age
+        self._lock = threading.Lock()
+        self._pins = {}  # upload_id -> requests using it
+        self._size = None  # Bytes stored, estimated from the last directory listing plus files saved since
+        self._stats = {"uploads": 0, "known": 0, "stored": 0, "rejected": 0, "evictions": 0,
+                       "bytes_received": 0, "bytes_stored": 0}
+
+    @staticmethod
+    def is_valid_id(upload_id: str) -> bool:
+        return bool(upload_id) and bool(_UPLOAD_ID.match(upload_id))
+
+    def path(self, upload_id: str) -> str:
+        return os.path.join(self.root, upload_id[:2], upload_id)
+
+    def _count(self, **values):
+        with self._lock:
+            for key, value in values.items():
+                self._stats[key] += value
+
+    def _pin(self, upload_id: str):
+        with self._lock:
+            self._pins[upload_id] = self._pins.get(upload_id, 0) + 1
+
+    def release(self, upload_id: Optional[str]):
+        """Let a file pinned by `save`/`get` be evicted again once no request uses it."""
+        with self._lock:
+            if self._pins.get(upload_id, 0) > 1:
+                self._pins[upload_id] -= 1
+            else:
+                self._pins.pop(upload_id, None)
+
+    def get(self, upload_id: str, pin: bool = False) -> Optional[Dict]:
+        """The stored upload with this ID (marked as recently used), or None."""
+        if not self.is_valid_id(upload_id):
+            return None
+        path = self.path(upload_id)
+        if pin:
+            self._pin(upload_id)  # Before the file is checked, so eviction cannot remove it in between
+        try:
+            os.utime(path)
+            return {"upload_id": upload_id, "path": path, "size": os.path.getsize(path),
+                    "content_type": sniff_content_type(path), "known": True}
+        except OSError:
+            if pin:
+                self.release(upload_id)
+            return None
+
+    def save(self, stream: BinaryIO, content_type: Optional[str], pin: bool = False) -> Dict:
+        """Hash ``stream`` (checking its size) and store it unless its content is already here."""
+        stream.seek(0)
+        try:
+            upload_id, size = sha256_stream(stream, upload_limit(content_type))
+        except UploadRejected:
+            self._count(rejected=1)
+            raise
+        if pin:
+            self._pin(upload_id)
+        path = self.path(upload_id)
+        try:
+            os.utime(path)
+            known = True
+        except OSError:
+            known = False
+        if not known:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            stream.seek(0)
+            with open(tmp_path, "wb") as f:
+                while chunk := stream.read(UPLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+            self._added(size, keep=upload_id)
+        self._count(uploads=1, known=int(known), stored=int(not known), bytes_received=size,
+                    bytes_stored=0 if known else size)
+        return {"upload_id": upload_id, "path": path, "size": size, "content_type": content_type, "known": known}
+
+    def _added(self, size: int, keep: str):
+        with self._lock:
+            if self._size is not None:
+                self._size += size
+                if self._size <= self.max_bytes:
+                    return
+        self._evict(keep)
+
+    def _evict(self, keep: str):
+        files = []
+        for entry in os.scandir(self.root):
+            if entry.is_dir():
+                for f in os.scandir(entry.path):
+                    if not f.name.endswith(".tmp"):
+                        stat = f.stat()
+                        files.append((stat.st_mtime, stat.st_size, f.name))
+        total = sum(size for _, size, _ in files)
+        if total > self.max_bytes:
+            recent = time.time() - self.min_age
+            for mtime, size, upload_id in sorted(files):
+                if total <= self.max_bytes * 0.9 or mtime >= recent:
+                    break
+                with self._lock:
+                    if upload_id == keep or upload_id in self._pins:
+                        continue
+                    with contextlib.suppress(OSError):
+                        os.remove(self.path(upload_id))
+                        total -= size
+                        self._stats["evictions"] += 1
+        with self._lock:
+            self._size = total
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["dedup_rate"] = round(stats["known"] / stats["uploads"], 4) if stats["uploads"] else 0.0
+        return stats
+
+
+class _BodyTooLarge(MultiPartException):
+    """Raised from `receive`; the multipart parser closes its spooled files when it sees one."""
+
+
+class UploadLimitMiddleware:
+    """ASGI middleware: request bodies over ``max_bytes`` get 413 as soon as they are seen to be too large.
+
+    A declared Content-Length is checked before anything is read; otherwise
+    the body is counted as it streams in, so an oversized upload is never
+    spooled in full.
+    """
+
+    def __init__(self, app, max_bytes: int = UPLOAD_MAX_REQUEST_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def _reject(self, send):
+        body = json.dumps({
+            "error": f"❌ Request too large: uploads are limited to {self.max_bytes / 2 ** 20:g} MB", "status": 413
+        }).encode("utf-8")
+        await send({"type": "http.response.start", "status": 413,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        length = dict(scope.get("headers") or []).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            return await self._reject(send)
+        state = {"received": 0, "exceeded": False, "responded": False}
+
+        async def limited_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                state["received"] += len(message.get("body", b""))
+                if state["received"] > self.max_bytes:
+                    state["exceeded"] = True
+                    raise _BodyTooLarge("Request body too large")
+            return message
+
+        async def guarded_send(message):
+            if state["exceeded"]:  # Replace the app's error response for the aborted body
+                if not state["responded"]:
+                    state["responded"] = True
+                    await self._reject(send)
+                return
+            state["responded"] = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            if state["responded"]:
+                raise
+            state["responded"] = True
+            await self._reject(send)
+
+
+upload_store = UploadStore()
@@ -0,0 +1,92 @@
+"""Throughput and tail latency of micro-batched image classification.
+
+Fires ``--requests`` concurrent classification calls at ``--concurrency`` and
+reports throughput, p50 and p99 latency for each (max batch size, max wait)
+setting. By default it uses BioTrove-CLIP on ``assets/biotrove-test.jpeg``;
+``--simulate`` replaces the model with a CPU cost model (fixed per-call
+overhead plus per-image cost) so the scheduler can be measured without torch.
+
+    python benchmarks/bench_batching.py --batch-sizes 1 4 8 16 --waits 0 5 20
+    python benchmarks/bench_batching.py --simulate
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from backend.utils.batching import MicroBatcher
+
+SAMPLE_IMAGE = os.path.join(ROOT, "assets", "biotrove-test.jpeg")
+
+
+def simulated_model(call_overhead_ms, per_image_ms):
+    def process(items):
+        time.sleep((call_overhead_ms + per_image_ms * len(items)) / 1000)
+        return [[{"label": "simulated", "probability": 1.0}] for _ in items]
+    return process, None
+
+
+def real_model():
+    from backend import image_classifier
+    image_classifier.warm_up()
+    return image_classifier._classify_requests, image_classifier._preprocess_request
+
+
+async def run(batcher, payload, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await batcher.submit(payload)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return time.perf_counter() - start, latencies
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=128)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--waits", type=float, nargs="+", default=[0, 5, 20], help="Max wait in ms")
+    parser.add_argument("--simulate", action="store_true", help="Use a cost model instead of BioTrove-CLIP")
+    parser.add_argument("--call-overhead-ms", type=float, default=40)
+    parser.add_argument("--per-image-ms", type=float, default=8)
+    args = parser.parse_args()
+
+    if args.simulate:
+        process, preprocess = simulated_model(args.call_overhead_ms, args.per_image_ms)
+        payload = None
+    else:
+        process, preprocess = real_model()
+        with open(SAMPLE_IMAGE, "rb") as f:
+            payload = (f.read(), 5)
+
+    print(f"{'batch':>5} {'wait ms':>7} {'img/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'avg batch':>9}")
+    for size in args.batch_sizes:
+        for wait in args.waits:
+            batcher = MicroBatcher(process, max_batch_size=size, max_wait_ms=wait, preprocess=preprocess)
+            elapsed, latencies = asyncio.run(run(batcher, payload, args.requests, args.concurrency))
+            avg_batch = batcher.stats["items"] / max(batcher.stats["batches"], 1)
+            print(f"{size:>5} {wait:>7.0f} {args.requests / elapsed:>8.1f} "
+                  f"{statistics.median(latencies) * 1000:>8.1f} {percentile(latencies, 99) * 1000:>8.1f} {avg_batch:>9.1f}")
+            if size == 1:
+                break  # wait time is irrelevant without batching
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Cold-start benchmark: how long a fresh interpreter takes to import the backend.
+
+Each sample runs in a new process so nothing is cached in-process. Use
+``--warm-up`` to also time loading BioTrove-CLIP (what the startup hook does).
+
+    python benchmarks/bench_import.py --repeat 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+SNIPPET = """
+import sys, time
+sys.path.insert(0, {root!r}); sys.path.insert(0, {backend!r})
+start = time.perf_counter()
+import main
+imported = time.perf_counter() - start
+if {warm_up}:
+    from backend.tools.image_tools import warm_up_local_model, local_model_status
+    warm_up_local_model()
+    print(imported, time.perf_counter() - start, local_model_status())
+else:
+    print(imported, imported, "skipped")
+"""
+
+
+def sample(warm_up):
+    code = SNIPPET.format(root=ROOT, backend=os.path.join(ROOT, "backend"), warm_up=warm_up)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=ROOT)
+    imported, total, status = out.stdout.split()
+    return float(imported), float(total), status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warm-up", action="store_true", help="Include BioTrove-CLIP loading")
+    args = parser.parse_args()
+
+    samples = [sample(args.warm_up) for _ in range(args.repeat)]
+    imports = [s[0] for s in samples]
+    totals = [s[1] for s in samples]
+    print(f"import main      median {statistics.median(imports):.3f}s  min {min(imports):.3f}s")
+    if args.warm_up:
+        print(f"import + warm-up median {statistics.median(totals):.3f}s  min {min(totals):.3f}s  (model: {samples[-1][2]})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Micro-benchmarks for hot functions: PDF extraction, image encoding, HTML cleaning and planning.
+
+    python benchmarks/bench_micro.py --repeat 50 --json after.json
+    python benchmarks/report.py before.json after.json
+
+Each case runs once untimed to warm up (process pools, regex caches), then
+``--repeat`` times; p50/p95/p99 and calls/sec are reported. Nothing here
+touches the network.
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(__file__))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("TRACE_LOG_LEVEL", "WARNING")
+
+from report import summarize, print_table, write_report
+from stubs import article_html
+
+ASSETS = os.path.join(ROOT, "assets")
+
+PLANNER_QUERIES = [
+    "How do beavers change river ecosystems?",
+    "What is the conservation status of the red fox, arctic fox and fennec fox?",
+    "Show the full article on the European badger",
+    "What is the habitat of the snow leopard according to Wikipedia?",
+]
+
+
+def cases(only=None):
+    from backend.tools.pdf_tools import extract_text_from_pdf
+    from backend.tools.image_tools import encode_image, PreparedImage
+    from backend.tools.wiki_tool import clean_html
+    from backend.agents.planner import PlanningAgent
+
+    with open(os.path.join(ASSETS, "cureus-0015-00000037574.pdf"), "rb") as f:
+        pdf = f.read()
+    with open(os.path.join(ASSETS, "pest-and-disease_turkey-tail_banner_1440x500.jpeg"), "rb") as f:
+        jpeg = f.read()
+    html = article_html("Red fox", sections=60)  # About the size of a long species article
+    planner = PlanningAgent()
+
+    all_cases = {
+        "extract_text_from_pdf": lambda: extract_text_from_pdf(pdf, workers=1),
+        "extract_text_from_pdf/pool": lambda: extract_text_from_pdf(pdf),
+        "encode_image": lambda: encode_image(jpeg, "image/jpeg"),
+        "prepare_image/high": lambda: PreparedImage(jpeg, "image/jpeg").data_url("high"),
+        "clean_html": lambda: clean_html(html),
+        "planner.plan": lambda: [planner.plan(q) for q in PLANNER_QUERIES],
+    }
+    return {name: fn for name, fn in all_cases.items() if not only or name in only}
+
+
+def run(fn, repeat: int):
+    fn()  # Warm-up
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t)
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--only", nargs="+", help="Run only these cases")
+    parser.add_argument("--json", help="Write the results to this file for report.py")
+    args = parser.parse_args()
+
+    results = {}
+    for name, fn in cases(args.only).items():
+        latencies, elapsed = run(fn, args.repeat)
+        results[name] = summarize(latencies, elapsed)
+    print_table(results, f"Micro-benchmarks ({args.repeat} calls per case)")
+    if args.json:
+        write_report(args.json, "bench_micro", results, {"repeat": args.repeat, "only": args.only})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Routing accuracy and per-query latency: the intent router vs. the old trigger-phrase heuristic.
+
+    python benchmarks/bench_router.py --folds 5 --json after.json
+    python benchmarks/report.py before.json after.json
+
+Accuracy is k-fold cross-validated over `backend/data/intents.tsv`: each
+fold's router is trained without the queries it is scored on. "confident"
+counts only the queries the router would not escalate to GPT-4o (confidence
+at or above ``ROUTER_THRESHOLD``). Latency is per query, single-threaded.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(__file__))
+
+from report import summarize, print_table, write_report
+from backend.agents.intent_router import (
+    IntentRouter, load_examples, ROUTER_THRESHOLD, WIKI_TRIGGERS, FULL_PAGE_KEYWORDS
+)
+
+
+def legacy_route(query: str) -> str:
+    """The planner's routing before the intent router: first matching substring wins."""
+    query_lower = query.lower()
+    if not any(trigger in query_lower for trigger in WIKI_TRIGGERS):
+        return "gpt"
+    return "wiki_full" if any(kw in query_lower for kw in FULL_PAGE_KEYWORDS) else "wiki"
+
+
+def cross_validate(examples: list, folds: int, seed: int) -> dict:
+    shuffled = examples[:]
+    random.Random(seed).shuffle(shuffled)
+    correct = confident = confident_correct = legacy_correct = 0
+    for fold in range(folds):
+        held_out = shuffled[fold::folds]
+        router = IntentRouter([e for i, e in enumerate(shuffled) if i % folds != fold])
+        for query, intent in held_out:
+            predicted, confidence = router.route(query)
+            correct += predicted == intent
+            if confidence >= ROUTER_THRESHOLD:
+                confident += 1
+                confident_correct += predicted == intent
+            legacy_correct += legacy_route(query) == intent
+    return {
+        "router": correct / len(examples),
+        "router/confident": confident_correct / confident if confident else None,
+        "escalation_rate": 1 - confident / len(examples),
+        "legacy": legacy_correct / len(examples),
+    }
+
+
+def time_routes(route, queries: list, repeat: int) -> list:
+    for query in queries:
+        route(query)  # Warm-up
+    latencies = []
+    for _ in range(repeat):
+        for query in queries:
+            t = time.perf_counter()
+            route(query)
+            latencies.append(time.perf_counter() - t)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20, help="Timed passes over every labelled query")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the results to this file for report.py")
+    args = parser.parse_args()
+
+    examples = load_examples()
+    accuracy = cross_validate(examples, args.folds, args.seed)
+    print(f"{len(examples)} labelled queries, {args.folds}-fold cross-validation")
+    print(f"  legacy heuristic accuracy   {accuracy['legacy']:.1%}")
+    print(f"  router accuracy             {accuracy['router']:.1%}")
+    print(f"  router accuracy, confident  {accuracy['router/confident']:.1%} "
+          f"({accuracy['escalation_rate']:.1%} escalated at threshold {ROUTER_THRESHOLD})")
+
+    queries = [query for query, _ in examples]
+    router = IntentRouter(examples)
+    results = {}
+    for name, route in (("legacy_route", legacy_route), ("router.route", router.route)):
+        latencies = time_routes(route, queries, args.repeat)
+        results[name] = summarize(latencies)
+    results["router.route"]["accuracy"] = round(accuracy["router"], 4)
+    results["legacy_route"]["accuracy"] = round(accuracy["legacy"], 4)
+    print_table(results, f"Per-query routing latency ({len(queries) * args.repeat} calls per case)")
+    if args.json:
+        write_report(args.json, "bench_router", results, {"folds": args.folds, "seed": args.seed,
+                                                          "threshold": ROUTER_THRESHOLD})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Upload handling on /query/: peak Python heap and latency per upload size, first sight and re-sent.
+
+    python benchmarks/bench_uploads.py --sizes 1 8 32 --json after.json
+    python benchmarks/report.py before.json after.json
+
+Posts multipart bodies that are generated chunk by chunk (so the client holds
+no copy) to the app in-process. Planning and execution are stubbed, so only
+the upload path is measured: form parsing, reading/hashing/storing the file
+and handing it to the planner. Peak memory is the tracemalloc high-water mark
+above the idle heap, per request and for ``--concurrency`` simultaneous
+uploads of the largest size.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+sys.path.insert(0, os.path.dirname(__file__))
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("TRACE_LOG_LEVEL", "WARNING")
+os.environ.setdefault("BIOTROVE_WARMUP", "0")
+os.environ.setdefault("UPLOAD_DIR", os.path.join(tempfile.mkdtemp(prefix="ecobot-uploads-"), "uploads"))
+os.environ.setdefault("DOCUMENT_STORE_PATH", os.path.join(tempfile.mkdtemp(prefix="ecobot-documents-"), "documents"))
+
+import httpx
+from report import summarize, print_table, write_report
+
+CHUNK = 64 * 1024
+BOUNDARY = "ecobotbench"
+
+
+def multipart(size: int, seed: int):
+    """``(content length, async chunk generator)`` for a form with a query and a ``size``-byte PDF-typed file."""
+    block = bytes((seed + i) % 251 for i in range(CHUNK))
+    head = (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"query\"\r\n\r\nSummarise this paper.\r\n"
+            f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"paper.pdf\"\r\n"
+            f"Content-Type: application/pdf\r\n\r\n").encode()
+    tail = f"\r\n--{BOUNDARY}--\r\n".encode()
+
+    async def chunks():
+        yield head + b"%PDF-"
+        sent = 5
+        while sent < size:
+            part = block[:min(CHUNK, size - sent)]
+            sent += len(part)
+            yield part
+        yield tail
+
+    return len(head) + size + len(tail), chunks()
+
+
+async def post(http, size: int, seed: int) -> float:
+    length, body = multipart(size, seed)
+    started = time.perf_counter()
+    response = await http.post("/query/", content=body, headers={
+        "content-type": f"multipart/form-data; boundary={BOUNDARY}", "content-length": str(length)
+    })
+    assert response.status_code == 200 and "error" not in response.json(), response.text
+    return time.perf_counter() - started
+
+
+def stub_pipeline(main):
+    """Skip planning and execution; the file still reaches the planner as the endpoint hands it over."""
+    from backend.utils.conversation_store import MemoryConversationStore
+
+    async def aplan(query, file_content=None, file_type=None, history=None, doc_id=None, filename=None):
+        return {"tool": "gpt", "data": query}
+
+    async def aexecute(plan, history=None):
+        return {"response": "ok", "sources": []}
+
+    main.planner.aplan = aplan
+    main.executor.aexecute = aexecute
+    main.conversations = MemoryConversationStore()
+
+
+async def run(args) -> dict:
+    import main
+    stub_pipeline(main)
+    transport = httpx.ASGITransport(app=main.app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://ecobot", timeout=None) as http:
+        await post(http, CHUNK, seed=0)  # Warm-up
+        tracemalloc.start()
+        for seed, megabytes in enumerate(args.sizes, start=1):
+            size = int(megabytes * 1024 * 1024)
+            for phase in ("first", "repeat"):
+                base = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                latency = await post(http, size, seed)
+                peak = tracemalloc.get_traced_memory()[1] - base
+                results[f"upload/{megabytes:g}MB/{phase}"] = dict(summarize([latency]), peak_mb=round(peak / 2 ** 20, 2))
+
+        size = int(max(args.sizes) * 1024 * 1024)
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(post(http, size, 100 + i) for i in range(args.concurrency)))
+        peak = tracemalloc.get_traced_memory()[1] - base
+        results[f"upload/{max(args.sizes):g}MB/x{args.concurrency}"] = dict(
+            summarize(latencies, time.perf_counter() - started), peak_mb=round(peak / 2 ** 20, 2)
+        )
+        tracemalloc.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 8, 32], help="Upload sizes in MB")
+    parser.add_argument("--concurrency", type=int, default=4, help="Simultaneous uploads of the largest size")
+    parser.add_argument("--json", help="Write the results to this file for report.py")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_table(results, "Uploads on /query/ (planning and execution stubbed)")
+    print("peak MB above idle heap: " + ", ".join(f"{name.split('/', 1)[1]} {r['peak_mb']}" for name, r in results.items()))
+    if args.json:
+        write_report(args.json, "bench_uploads", results, {
+            k: v for k, v in vars(args).items() if k != "json"
+        })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Full-page Wikipedia fetch: whole parsed article vs. section index + targeted, streamed sections.
+
+    python benchmarks/bench_wiki_fetch.py --sections 60 --bandwidth 2000000 --json after.json
+    python benchmarks/report.py before.json after.json
+
+Runs `fetch_full_page` against the local MediaWiki stand-in with an empty
+cache for every call, once per mode, and reports latency and response bytes
+read per call. Queries that name an aspect ("... diet") fetch matching
+sections; the rest read the plaintext extract up to the character budget.
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(__file__))
+os.environ.setdefault("TRACE_LOG_LEVEL", "WARNING")
+
+from report import summarize, print_table, write_report
+from stubs import MediaWikiStub
+from backend.tools import wiki_tool
+
+REQUESTS = [
+    ("Red fox", None),
+    ("European badger", "European badger diet"),
+    ("Barn owl", "barn owl reproduction and conservation"),
+    ("Snow leopard", None),
+    ("Honey bee", "honey bee behaviour and ecology"),
+    ("Grey heron", None),
+]
+
+
+def run(mode: str, repeat: int) -> tuple:
+    """Returns (latencies, bytes read per call)."""
+    sections = mode == "sections"
+    latencies, before = [], wiki_tool.full_page_stats()
+    for _ in range(repeat):
+        for title, query in REQUESTS:
+            wiki_tool.wiki_cache.clear()
+            t = time.perf_counter()
+            result = wiki_tool.fetch_full_page(title, query, sections=sections)
+            latencies.append(time.perf_counter() - t)
+            assert "error" not in result, result
+    after = wiki_tool.full_page_stats()
+    read = sum(after[m]["bytes_read"] - before[m]["bytes_read"] for m in after)
+    return latencies, read / len(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the request list per mode")
+    parser.add_argument("--sections", type=int, default=60, help="Sections per stub article")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub seconds per request")
+    parser.add_argument("--bandwidth", type=float, default=2_000_000, help="Stub bytes/s (0: unlimited)")
+    parser.add_argument("--json", help="Write the results to this file for report.py")
+    args = parser.parse_args()
+
+    stub = MediaWikiStub(latency=args.latency, sections=args.sections, bandwidth=args.bandwidth)
+    wiki_tool.WIKIPEDIA_API = f"{stub.url}/w/api.php"
+    wiki_tool.wiki_cache = wiki_tool.WikiCache(path="")
+
+    results = {}
+    for mode in ("legacy", "sections"):
+        latencies, bytes_per_call = run(mode, args.repeat)
+        results[f"fetch_full_page/{mode}"] = dict(summarize(latencies), bytes_per_call=round(bytes_per_call))
+    print_table(results, f"Full-page fetch, {args.sections}-section stub articles, "
+                         f"{args.latency * 1000:.0f} ms/request, {args.bandwidth / 1e6:g} MB/s")
+
+    legacy, sectioned = results["fetch_full_page/legacy"], results["fetch_full_page/sections"]
+    print(f"bytes/call: {legacy['bytes_per_call']} → {sectioned['bytes_per_call']} "
+          f"({legacy['bytes_per_call'] - sectioned['bytes_per_call']} saved)")
+    print(f"p50 ms/call: {legacy['p50_ms']:.1f} → {sectioned['p50_ms']:.1f} "
+          f"({legacy['p50_ms'] - sectioned['p50_ms']:.1f} saved)")
+    stub.close()
+    if args.json:
+        write_report(args.json, "bench_wiki_fetch", results, {
+            k: v for k, v in vars(args).items() if k != "json"
+        })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Offline Wikipedia index: build throughput from a streamed dump and lookup latency.
+
+    python benchmarks/bench_wiki_index.py --species 20000 --json after.json
+    python benchmarks/report.py before.json after.json
+
+Writes a synthetic MediaWiki XML export (.bz2) with `stubs.write_wikipedia_dump`,
+builds the index in two runs (the first stopped halfway, the second resuming
+from its checkpoint), then times `search` (exact title, free text, FTS-only
+and no-match queries), redirect lookups and full-document reads.
+"""
+import argparse
+import bz2
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(__file__))
+os.environ.setdefault("TRACE_LOG_LEVEL", "WARNING")
+
+from report import summarize, print_table, write_report
+from stubs import write_wikipedia_dump
+from backend.tools.wiki_index import WikiIndex, build_index
+
+
+def timed(fn, args: list) -> list:
+    for arg in args[:10]:
+        fn(arg)  # Warm-up
+    latencies = []
+    for arg in args:
+        t = time.perf_counter()
+        fn(arg)
+        latencies.append(time.perf_counter() - t)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--species", type=int, default=20000, help="Taxon pages in the dump")
+    parser.add_argument("--other", type=int, default=20000, help="Non-taxon pages in the dump")
+    parser.add_argument("--lookups", type=int, default=2000, help="Calls per lookup case")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the results to this file for report.py")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="ecobot-wiki-index-")
+    dump, path = os.path.join(workdir, "dump.xml.bz2"), os.path.join(workdir, "wiki_index.db")
+    with bz2.open(dump, "wb") as f:
+        write_wikipedia_dump(f, args.species, args.other)
+    dump_pages = 2 * args.species + args.other
+
+    first = build_index(dump, path, limit=dump_pages // 2)
+    second = build_index(dump, path)
+    seconds = first["seconds"] + second["seconds"]
+    print(f"Dump: {os.path.getsize(dump) / 1e6:.1f} MB bz2, {dump_pages} pages")
+    print(f"Build: {seconds:.1f}s ({dump_pages / seconds:.0f} dump pages/s), interrupted at "
+          f"{first['pages']} taxa and resumed at byte {second['resumed_at']}; "
+          f"{second['pages']} taxa, {second['redirects']} redirects, index {os.path.getsize(path) / 1e6:.1f} MB")
+
+    index = WikiIndex(path)
+    rng = random.Random(args.seed)
+    names = [f"animal{rng.randrange(1, args.species)}" for _ in range(args.lookups)]
+    cases = {
+        "search/title": (index.search, [f"Stub {name}" for name in names]),
+        "search/question": (index.search, [f"What is the habitat of the stub {name}?" for name in names]),
+        "search/fts": (index.search, [f"{name} temperate" for name in names]),
+        "search/no_match": (index.search, [f"quokka{i} marsupial" for i in range(args.lookups)]),
+        "title/redirect": (index.title, [f"Stubia {name}" for name in names]),
+        "document": (index.document, [f"Stub {name}" for name in names]),
+    }
+    results = {}
+    for name, (fn, inputs) in cases.items():
+        results[name] = summarize(timed(fn, inputs))
+    results["build"] = dict(summarize([seconds]), pages_per_second=round(dump_pages / seconds))
+    print_table(results, f"Offline index lookups ({args.lookups} calls per case)")
+    if args.json:
+        write_report(args.json, "bench_wiki_index", results, {
+            k: v for k, v in vars(args).items() if k != "json"
+        })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Throughput of the pre-fork launcher (backend/serve.py) versus worker count.
+
+Each run forks a server whose OpenAI client is replaced by a stub that burns
+``--cpu-ms`` of CPU (standing in for local inference, PDF retrieval and JSON
+work) and then waits ``--latency`` seconds. CPU-bound requests only scale
+with workers, so req/s should grow roughly linearly up to the core count.
+
+    python benchmarks/bench_workers.py --workers 1 2 4 --requests 200 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+os.environ.setdefault("OPENAI_API_KEY", "sk-load-test")
+os.environ.setdefault("BIOTROVE_WARMUP", "0")
+os.environ.setdefault("LOG_LEVEL", "warning")
+
+import httpx
+
+
+class BusyCompletions:
+    def __init__(self, cpu_ms, latency):
+        self.cpu_ms = cpu_ms
+        self.latency = latency
+
+    async def create(self, **kwargs):
+        deadline = time.process_time() + self.cpu_ms / 1000
+        while time.process_time() < deadline:
+            pass
+        await asyncio.sleep(self.latency)
+        message = SimpleNamespace(content="Red foxes are omnivores.")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def start_server(workers, port, cpu_ms, latency, state_dir):
+    pid = os.fork()
+    if pid:
+        return pid
+    os.environ["ECOBOT_STATE_DIR"] = state_dir
+    import backend.tools.openai_client as openai_client
+    openai_client._async_client = SimpleNamespace(chat=SimpleNamespace(completions=BusyCompletions(cpu_ms, latency)))
+    from serve import serve
+    serve("127.0.0.1", port, workers, preload=False)
+    os._exit(0)
+
+
+async def drive(port, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120) as http:
+        for _ in range(100):  # Wait for the workers to come up
+            try:
+                await http.get("/ready")
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+
+        async def one(i):
+            async with semaphore:
+                response = await http.post("/query/", data={"query": f"What do red foxes eat? #{port}-{i}"})
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--cpu-ms", type=float, default=20, help="CPU time burned per request")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated OpenAI latency in seconds")
+    parser.add_argument("--port", type=int, default=8790)
+    args = parser.parse_args()
+
+    import tempfile
+    print(f"cores available: {len(os.sched_getaffinity(0))}")
+    print(f"{'workers':>7} {'seconds':>8} {'req/s':>8}")
+    for i, workers in enumerate(args.workers):
+        port = args.port + i
+        with tempfile.TemporaryDirectory() as state_dir:
+            pid = start_server(workers, port, args.cpu_ms, args.latency, state_dir)
+            try:
+                elapsed = asyncio.run(drive(port, args.requests, args.concurrency))
+            finally:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+        print(f"{workers:>7} {elapsed:>8.2f} {args.requests / elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Mixed-workload load generator for /query/ against local API stand-ins.
+
+Starts the OpenAI and MediaWiki stubs from `stubs.py`, serves the app with
+uvicorn on a local port and, at each concurrency level, sends a fixed,
+seeded sequence of text, Wikipedia, PDF-upload and image-upload queries.
+Reports p50/p95/p99 latency per query kind and overall throughput.
+
+    python benchmarks/load_mixed.py --mix text=5,wiki=3,pdf=1,image=1 --concurrency 1 4 16 --json after.json
+    python benchmarks/report.py before.json after.json
+
+All caches and stores live in a temporary directory, so every run starts
+cold; repeated Wikipedia titles, PDFs and images within a run are answered
+from cache the way they would be in production.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+import httpx
+
+from stubs import OpenAIStub, MediaWikiStub
+from report import summarize, print_table, write_report
+from load_test import serve
+
+ASSETS = os.path.join(ROOT, "assets")
+SPECIES = [
+    "red fox", "european badger", "barn owl", "common frog", "grey heron", "red deer", "hedgehog",
+    "otter", "peregrine falcon", "honey bee", "monarch butterfly", "snow leopard", "african elephant",
+    "bald eagle", "green sea turtle", "koala", "axolotl", "giant panda", "beaver", "puffin",
+]
+TOPICS = ["wildfire", "drought", "invasive species", "urban light", "microplastics", "river damming"]
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for item in spec.split(","):
+        kind, _, weight = item.partition("=")
+        mix[kind.strip()] = float(weight or 1)
+    unknown = set(mix) - {"text", "wiki", "pdf", "image"}
+    if unknown:
+        raise SystemExit(f"Unknown query kinds: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def schedule(mix: dict, total: int, seed: int, level: int) -> list:
+    """A reproducible list of (kind, form data, file) requests."""
+    rng = random.Random(seed)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=total)
+    with open(os.path.join(ASSETS, "cureus-0015-00000037574.pdf"), "rb") as f:
+        pdf = f.read()
+    with open(os.path.join(ASSETS, "biotrove-test.jpeg"), "rb") as f:
+        image = f.read()
+    requests = []
+    for i, kind in enumerate(kinds):
+        if kind == "text":
+            # Numbered so the semantic cache never answers: every text query reaches the model
+            data = {"query": f"How does {rng.choice(TOPICS)} affect wetland birds? (#{level}-{i})"}
+            requests.append((kind, data, None))
+        elif kind == "wiki":
+            requests.append((kind, {"query": f"What is the habitat of the {rng.choice(SPECIES)}?"}, None))
+        elif kind == "pdf":
+            data = {"query": rng.choice(["Summarise the methods.", "What were the main findings?"])}
+            requests.append((kind, data, ("paper.pdf", pdf, "application/pdf")))
+        else:
+            requests.append((kind, {"query": "Identify this species."}, ("photo.jpg", image, "image/jpeg")))
+    return requests
+
+
+async def run_level(base_url: str, requests: list, concurrency: int):
+    """Returns (elapsed seconds, {kind: [latencies]}, {kind: errors})."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = {}, {}
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120,
+                                 limits=httpx.Limits(max_connections=concurrency)) as http:
+        async def one(kind, data, file):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await http.post("/query/", data=data, files={"file": file} if file else None)
+                    failed = response.status_code != 200 or str(response.json().get("response", "")).startswith("❌")
+                except httpx.HTTPError:
+                    failed = True
+                latencies.setdefault(kind, []).append(time.perf_counter() - started)
+                errors[kind] = errors.get(kind, 0) + failed
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(*request) for request in requests))
+        return time.perf_counter() - start, latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mix", default="text=5,wiki=3,pdf=1,image=1", help="Relative weights per query kind")
+    parser.add_argument("--requests", type=int, default=60, help="Requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--latency", type=float, default=0.3, help="Stub OpenAI latency in seconds")
+    parser.add_argument("--wiki-latency", type=float, default=0.1, help="Stub MediaWiki latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of stub requests that fail")
+    parser.add_argument("--tokens", type=int, default=40, help="Tokens per stub answer")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--json", help="Write the results to this file for report.py")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    openai_stub = OpenAIStub(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                             tokens=args.tokens, seed=args.seed)
+    wiki_stub = MediaWikiStub(latency=args.wiki_latency, jitter=args.jitter, error_rate=args.error_rate,
+                              seed=args.seed)
+    state = tempfile.mkdtemp(prefix="ecobot-bench-")
+    os.environ.update({
+        "OPENAI_API_KEY": "sk-benchmark",
+        "OPENAI_BASE_URL": f"{openai_stub.url}/v1",
+        "WIKIPEDIA_API": f"{wiki_stub.url}/w/api.php",
+        "ECOBOT_STATE_DIR": state,
+        "WIKI_CACHE_PATH": os.path.join(state, "wiki_cache.db"),
+        "IMAGE_CACHE_PATH": os.path.join(state, "image_cache.db"),
+        "DOCUMENT_STORE_PATH": os.path.join(state, "documents"),
+        "BIOTROVE_WARMUP": "0",
+        "TRACE_LOG_LEVEL": "WARNING",
+    })
+    from main import app
+    base_url = serve(app, args.port)
+
+    results = {}
+    for level in args.concurrency:
+        requests = schedule(mix, args.requests, args.seed, level)
+        elapsed, latencies, errors = asyncio.run(run_level(base_url, requests, level))
+        for kind in mix:
+            if kind in latencies:
+                results[f"c{level}/{kind}"] = summarize(latencies[kind], elapsed, errors[kind])
+        everything = [value for values in latencies.values() for value in values]
+        results[f"c{level}/all"] = summarize(everything, elapsed, sum(errors.values()))
+
+    print_table(results, f"Mixed workload ({args.mix}), OpenAI stub {args.latency}s, wiki stub {args.wiki_latency}s; "
+                         f"{openai_stub.requests} OpenAI / {wiki_stub.requests} wiki stub requests")
+    if args.json:
+        write_report(args.json, "load_mixed", results, {
+            k: v for k, v in vars(args).items() if k not in ("json", "port")
+        })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Load test for the async /query/ pipeline.
+
+Drives the FastAPI app in-process with the OpenAI client replaced
+by a stub that sleeps for a fixed latency, and reports requests/sec at each
+concurrency level. With a non-blocking pipeline throughput should scale
+roughly linearly with concurrency until the stub latency stops dominating.
+
+With ``--stream`` the requests go to /query/stream and the stub emits its
+answer token by token; time-to-first-token is reported next to total latency.
+Streaming runs serve the app with uvicorn on a local port, because the
+in-memory ASGI transport buffers whole response bodies.
+
+    python benchmarks/load_test.py --latency 0.5 --requests 32 --concurrency 1 2 4 8 16
+    python benchmarks/load_test.py --stream --latency 0.3 --tokens 40 --token-latency 0.02
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+os.environ.setdefault("OPENAI_API_KEY", "sk-load-test")
+
+import httpx
+
+
+class StubCompletions:
+    """Mimics `AsyncOpenAI().chat.completions` with a fixed network latency.
+
+    Streamed calls wait ``latency`` before the first token and
+    ``token_latency`` between tokens; plain calls wait for all of it.
+    """
+
+    def __init__(self, latency, tokens=1, token_latency=0.0):
+        self.latency = latency
+        self.tokens = tokens
+        self.token_latency = token_latency
+
+    async def create(self, stream=False, **kwargs):
+        await asyncio.sleep(self.latency)
+        if stream:
+            return self._stream()
+        await asyncio.sleep(self.token_latency * (self.tokens - 1))
+        message = SimpleNamespace(content="Red foxes are omnivores." + " More." * (self.tokens - 1))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    async def _stream(self):
+        for i in range(self.tokens):
+            if i:
+                await asyncio.sleep(self.token_latency)
+            text = "Red foxes are omnivores." if i == 0 else " More."
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+def install_stub(latency, tokens=1, token_latency=0.0):
+    import backend.tools.openai_client as openai_client
+    completions = StubCompletions(latency, tokens, token_latency)
+    openai_client._async_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def serve(app, port):
+    """Runs the app with uvicorn in a background thread; returns its base URL once it is up."""
+    import threading
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+async def run_level(app, total, concurrency, stream=False, base_url=None):
+    """Returns (elapsed seconds, per-request TTFT list, per-request latency list)."""
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = None if base_url else httpx.ASGITransport(app=app)
+    ttfts, latencies = [], []
+
+    async with httpx.AsyncClient(transport=transport, base_url=base_url or "http://ecobot", timeout=60) as http:
+        async def one(i):
+            # Distinct numbers per level and request so the semantic cache never answers
+            data = {"query": f"What do red foxes eat? #{concurrency}-{i}"}
+            async with semaphore:
+                started = time.perf_counter()
+                if not stream:
+                    response = await http.post("/query/", data=data)
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - started)
+                    ttfts.append(latencies[-1])
+                    return
+                first = None
+                async with http.stream("POST", "/query/stream", data=data) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if line and first is None:
+                            first = time.perf_counter() - started
+                latencies.append(time.perf_counter() - started)
+                ttfts.append(first if first is not None else latencies[-1])
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        return time.perf_counter() - start, ttfts, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated OpenAI latency in seconds")
+    parser.add_argument("--requests", type=int, default=32, help="Requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--stream", action="store_true", help="Use /query/stream and report time-to-first-token")
+    parser.add_argument("--tokens", type=int, default=1, help="Tokens per simulated answer")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds between simulated tokens")
+
+    parser.add_argument("--port", type=int, default=8765, help="Local port for --stream runs")
+    args = parser.parse_args()
+
+    install_stub(args.latency, args.tokens, args.token_latency)
+    from main import app
+    base_url = serve(app, args.port) if args.stream else None
+
+    print(f"{'concurrency':>11} {'seconds':>8} {'req/s':>8} {'ttft p50':>9} {'ttft p95':>9} {'total p50':>10}")
+    for level in args.concurrency:
+        elapsed, ttfts, latencies = asyncio.run(run_level(app, args.requests, level, args.stream, base_url))
+        print(
+            f"{level:>11} {elapsed:>8.2f} {args.requests / elapsed:>8.2f} "
+            f"{percentile(ttfts, 0.5):>9.3f} {percentile(ttfts, 0.95):>9.3f} {percentile(latencies, 0.5):>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Benchmark results: latency summaries, JSON reports and commit-to-commit comparison.
+
+`load_mixed.py` and `bench_micro.py` write reports with ``--json``. Compare
+two of them (e.g. from before and after a change) with:
+
+    python benchmarks/report.py before.json after.json
+
+Each row shows p50/p95/p99 latency and throughput with the relative change;
+latency increases and throughput drops above ``--threshold`` are flagged.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def percentile(values, q):
+    """Nearest-rank percentile (``q`` in 0..1) of a non-empty list."""
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))]
+
+
+def summarize(latencies, elapsed=None, errors=0) -> dict:
+    """p50/p95/p99/max latency in ms plus throughput (ops/s over ``elapsed``, else over total time)."""
+    if not latencies:
+        return {"count": 0, "errors": errors}
+    total = elapsed if elapsed is not None else sum(latencies)
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3),
+        "throughput": round(len(latencies) / total, 3) if total else None,
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+def write_report(path: str, benchmark: str, results: dict, settings: dict):
+    """Save ``results`` ({case: summary}) with enough context to compare runs later."""
+    report = {
+        "benchmark": benchmark,
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "settings": settings,
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {path}")
+
+
+def print_table(results: dict, title: str = ""):
+    if title:
+        print(title)
+    print(f"{'case':<28} {'n':>5} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>9}")
+    for case, s in results.items():
+        if not s.get("count"):
+            print(f"{case:<28} {0:>5} {s.get('errors', 0):>4}")
+            continue
+        print(f"{case:<28} {s['count']:>5} {s['errors']:>4} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} "
+              f"{s['p99_ms']:>9.2f} {s['throughput'] or 0:>9.2f}")
+
+
+def _change(old, new):
+    if not old or new is None:
+        return None
+    return (new - old) / old
+
+
+def compare(before: dict, after: dict, threshold: float = 0.1) -> int:
+    """Print the per-case differences; returns the number of regressions beyond ``threshold``."""
+    print(f"{before['benchmark']}: {before['commit']} → {after['commit']}")
+    if before.get("settings") != after.get("settings"):
+        print("⚠️ settings differ:", before.get("settings"), "vs", after.get("settings"))
+    print(f"{'case':<28} {'p50 ms':>18} {'p95 ms':>18} {'p99 ms':>18} {'ops/s':>18}")
+    regressions = 0
+    for case in after["results"]:
+        old, new = before["results"].get(case), after["results"][case]
+        if not old or not old.get("count") or not new.get("count"):
+            print(f"{case:<28} (no baseline)")
+            continue
+        cells = []
+        for key, higher_is_worse in (("p50_ms", True), ("p95_ms", True), ("p99_ms", True), ("throughput", False)):
+            change = _change(old[key], new[key])
+            worse = change is not None and (change > threshold if higher_is_worse else change < -threshold)
+            regressions += worse
+            mark = "!" if worse else " "
+            cells.append(f"{new[key]:>9.2f} {change or 0:>+6.0%}{mark}")
+        print(f"{case:<28} " + " ".join(cells))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change counted as a regression")
+    args = parser.parse_args()
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+    regressions = compare(before, after, args.threshold)
+    print(f"{regressions} regression(s) beyond {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""Local stand-ins for the OpenAI chat-completions and MediaWiki APIs.
+
+Both run a threaded HTTP server on a local port with configurable latency,
+jitter and error rate, so benchmarks and tests exercise the real HTTP clients
+(connection pools, retries, timeouts) without network access or API keys.
+
+    python benchmarks/stubs.py --openai-port 8801 --wiki-port 8802 --latency 0.3 --error-rate 0.02
+
+then point the app at them:
+
+    OPENAI_BASE_URL=http://127.0.0.1:8801/v1 WIKIPEDIA_API=http://127.0.0.1:8802/w/api.php
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape, quoteattr
+
+
+SECTION_HEADINGS = [
+    "Etymology", "Taxonomy", "Description", "Distribution and habitat", "Behaviour and ecology", "Diet",
+    "Reproduction", "Predators and parasites", "Conservation", "Relationship with humans",
+]
+
+
+def section_heading(i: int) -> str:
+    heading = SECTION_HEADINGS[i % len(SECTION_HEADINGS)]
+    return heading if i < len(SECTION_HEADINGS) else f"{heading} ({i // len(SECTION_HEADINGS) + 1})"
+
+
+def article_sections(title: str, sections: int = 12) -> list:
+    """Parser-output HTML for the lead (index 0) and each section, references and all."""
+    lead = (
+        "<style>.mw-parser-output .infobox{float:right}</style>"
+        f"<div role=\"note\" class=\"hatnote\">For other uses, see {title} (disambiguation).</div>"
+        "<table class=\"infobox biota\"><tr><th>Scientific classification</th></tr>"
+        "<tr><td>Kingdom</td><td>Animalia</td></tr><tr><td>Phylum</td><td>Chordata</td></tr></table>"
+        f"<p><b>{title}</b> lead paragraph.<sup class=\"reference\"><a href=\"#cite_note-1\">[1]</a></sup> "
+        f"The {title.lower()} is widespread and well studied.</p>"
+    )
+    parts = [lead]
+    for i in range(sections):
+        heading = section_heading(i)
+        paragraphs = "".join(
+            f"<p>{title} {heading.lower()} paragraph {i}.{j}. <b>Bold</b> text with a "
+            f"<a href=\"/wiki/Link\">link</a> and a citation.<sup class=\"reference\">"
+            f"<a href=\"#cite_note-{i}-{j}\">[{i * 3 + j + 2}]</a></sup> &amp; an entity.</p>"
+            for j in range(3)
+        )
+        parts.append(
+            f"<h2><span class=\"mw-headline\" id=\"S{i}\">{heading}</span>"
+            "<span class=\"mw-editsection\">[<a href=\"#\">edit</a>]</span></h2>"
+            f"{paragraphs}<table class=\"wikitable\"><tr><td>Measurement</td><td>{i}</td></tr></table>"
+            "<script>mw.loader.load('ext.stub');</script>"
+        )
+    references = "".join(
+        f"<li id=\"cite_note-{n}\"><span class=\"reference-text\">Author {n} (2020). "
+        f"\"Study of the {title.lower()}\". <i>Journal of Stub Ecology</i>. 12 (3): 45–67.</span></li>"
+        for n in range(sections * 3 + 2)
+    )
+    parts[-1] += ("<h2><span class=\"mw-headline\">References</span></h2>"
+                  f"<div class=\"reflist\"><ol class=\"references\">{references}</ol></div>")
+    return parts
+
+
+def article_html(title: str, sections: int = 12) -> str:
+    """Article HTML in the shape of MediaWiki's parser output."""
+    return f"<div class=\"mw-parser-output\">{''.join(article_sections(title, sections))}</div>"
+
+
+def article_text(title: str, sections: int = 12) -> str:
+    """The article as TextExtracts plaintext (``exsectionformat=plain``)."""
+    text = [f"{title} lead paragraph. The {title.lower()} is widespread and well studied."]
+    for i in range(sections):
+        heading = section_heading(i)
+        text.append(heading)
+        text.extend(f"{title} {heading.lower()} paragraph {i}.{j}. Bold text with a link and a citation. "
+                    "& an entity." for j in range(3))
+    return "\n\n".join(text)
+
+
+def species_wikitext(title: str, sections: int = 8) -> str:
+    """Article wikitext in the shape of an English Wikipedia species page."""
+    epithet = title.split()[-1].lower()
+    body = "".join(
+        f"\n== {section_heading(i)} ==\n"
+        f"The {title.lower()} {section_heading(i).lower()} text {i}, see [[Mammal|mammals]]."
+        f"<ref>{{{{cite journal |title=Study {i} |journal=J. Stub Ecol.}}}}</ref>\n"
+        "{| class=\"wikitable\"\n|-\n| Measurement || 12\n|}\n"
+        for i in range(sections)
+    )
+    return (
+        f"{{{{Short description|Species of mammal}}}}\n{{{{Speciesbox\n| name = {title}\n| status = LC\n"
+        f"| status_system = IUCN3.1\n| genus = Stubia\n| species = {epithet}\n}}}}\n"
+        f"The '''{title.lower()}''' (''Stubia {epithet}'') is a [[species]] found in "
+        f"[[temperate forest|temperate forests]].<ref name=\"iucn\">IUCN</ref> It is listed as "
+        f"[[Least Concern]].{body}\n== References ==\n{{{{Reflist}}}}\n[[Category:Mammals described in 1758]]\n"
+    )
+
+
+def _dump_page(pageid: int, title: str, text: str = "", redirect: str = "") -> str:
+    redirect_tag = f"    <redirect title={quoteattr(redirect)} />\n" if redirect else ""
+    return (
+        f"  <page>\n    <title>{escape(title)}</title>\n    <ns>0</ns>\n    <id>{pageid}</id>\n{redirect_tag}"
+        f"    <revision>\n      <id>{pageid * 10}</id>\n      <timestamp>2025-01-01T00:00:00Z</timestamp>\n"
+        f"      <text bytes=\"{len(text)}\" xml:space=\"preserve\">{escape(text)}</text>\n"
+        f"    </revision>\n  </page>\n"
+    )
+
+
+def write_wikipedia_dump(f, species: int = 100, other: int = 50, sections: int = 8):
+    """A MediaWiki XML export of ``species`` taxon pages (each with a scientific-name redirect)
+    interleaved with ``other`` unrelated pages. ``f`` is a binary file (plain, bz2 or gzip)."""
+    f.write(b'<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.11/" xml:lang="en">\n  <siteinfo>\n'
+            b"    <sitename>Wikipedia</sitename>\n    <base>https://en.wikipedia.org/wiki/Main_Page</base>\n"
+            b"  </siteinfo>\n")
+    pageid = 1
+    for i in range(max(species, other)):
+        if i < species:
+            title = "Stub fox" if i == 0 else f"Stub animal{i}"
+            f.write(_dump_page(pageid, title, species_wikitext(title, sections)).encode())
+            f.write(_dump_page(pageid + 1, f"Stubia {title.split()[-1].lower()}", redirect=title).encode())
+            pageid += 2
+        if i < other:
+            text = f"'''Town {i}''' is a town with a [[railway station]].\n== History ==\nFounded in {1800 + i}."
+            f.write(_dump_page(pageid, f"Town {i}", text).encode())
+            pageid += 1
+    f.write(b"</mediawiki>\n")
+
+
+class StubServer:
+    """Threaded HTTP server answering after ``latency`` (± ``jitter``) seconds.
+
+    A fraction ``error_rate`` of requests fails with 503 (or 429 with a
+    Retry-After header, one time in four). With ``bandwidth`` (bytes/s)
+    response bodies are trickled out in chunks, so a client that hangs up
+    early saves transfer time. Subclasses implement `respond`.
+    """
+
+    def __init__(self, port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 0, bandwidth: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.bandwidth = bandwidth
+        self.requests = 0
+        self.bytes_sent = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like the real APIs
+
+            def do_GET(self):
+                stub._handle(self, None)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                stub._handle(self, json.loads(body or b"{}"))
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            def handle_error(self, request, client_address):
+                if not isinstance(sys.exc_info()[1], ConnectionError):  # Clients hanging up early is expected
+                    super().handle_error(request, client_address)
+
+        self.server = Server(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_port
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _delay(self) -> float:
+        with self._lock:
+            return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def _handle(self, handler, body):
+        with self._lock:
+            self.requests += 1
+            fail = self._random.random() < self.error_rate
+            rate_limited = fail and self._random.random() < 0.25
+            if fail:
+                self.errors += 1
+        time.sleep(self._delay())
+        if fail:
+            headers = {"Retry-After": "0.1"} if rate_limited else {}
+            return self._send(handler, 429 if rate_limited else 503,
+                              {"error": {"message": "Stub failure", "type": "stub_error"}}, headers)
+        url = urlparse(handler.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.respond(handler, url.path, query, body)
+
+    def _send(self, handler, status: int, payload, headers=None):
+        data = json.dumps(payload).encode()
+        handler.send_response(status)
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        chunk = 16 * 1024 if self.bandwidth else len(data) or 1
+        try:
+            for start in range(0, len(data), chunk):
+                if self.bandwidth:
+                    time.sleep(chunk / self.bandwidth)
+                handler.wfile.write(data[start:start + chunk])
+                with self._lock:
+                    self.bytes_sent += len(data[start:start + chunk])
+        except (BrokenPipeError, ConnectionResetError):
+            handler.close_connection = True  # The client hung up early
+
+    def respond(self, handler, path, query, body):
+        raise NotImplementedError
+
+
+class OpenAIStub(StubServer):
+    """``POST /v1/chat/completions``, plain or streamed (SSE), with usage counts.
+
+    ``latency`` is the time to the first token; streamed answers then send
+    ``tokens`` chunks ``token_latency`` seconds apart.
+    """
+
+    def __init__(self, port: int = 0, latency: float = 0.3, jitter: float = 0.0, error_rate: float = 0.0,
+                 tokens: int = 40, token_latency: float = 0.0, seed: int = 0):
+        self.tokens = tokens
+        self.token_latency = token_latency
+        super().__init__(port, latency, jitter, error_rate, seed)
+
+    def _answer(self, body) -> list:
+        question = str(body.get("messages", [{}])[-1].get("content", ""))[:60]
+        words = f"Stub answer about {question!r}:".split()
+        return [" ".join(words)] + [f" token{i}" for i in range(1, self.tokens)]
+
+    def respond(self, handler, path, query, body):
+        if not path.endswith("/chat/completions"):
+            return self._send(handler, 404, {"error": {"message": f"Unknown path {path}"}})
+        model = body.get("model", "gpt-4o-mini")
+        parts = self._answer(body)
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4 + 1
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(parts),
+                 "total_tokens": prompt_tokens + len(parts)}
+        base = {"id": "chatcmpl-stub", "created": int(time.time()), "model": model}
+
+        if not body.get("stream"):
+            time.sleep(self.token_latency * (len(parts) - 1))
+            return self._send(handler, 200, dict(base, object="chat.completion", usage=usage, choices=[{
+                "index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "".join(parts)}
+            }]))
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+
+        def event(payload):
+            data = f"data: {payload}\n\n".encode()
+            handler.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            handler.wfile.flush()
+
+        for i, part in enumerate(parts):
+            if i:
+                time.sleep(self.token_latency)
+            event(json.dumps(dict(base, object="chat.completion.chunk", choices=[
+                {"index": 0, "delta": {"content": part}, "finish_reason": None}
+            ])))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            event(json.dumps(dict(base, object="chat.completion.chunk", choices=[], usage=usage)))
+        event("[DONE]")
+        handler.wfile.write(b"0\r\n\r\n")
+
+
+class MediaWikiStub(StubServer):
+    """``GET /w/api.php`` for the queries `backend.tools.wiki_tool` makes.
+
+    Every title exists; page ids, extracts and revisions are derived from the
+    title so repeated runs see identical data.
+    """
+
+    REVISION = "2025-01-01T00:00:00Z"
+
+    def __init__(self, port: int = 0, latency: float = 0.1, jitter: float = 0.0, error_rate: float = 0.0,
+                 sections: int = 12, seed: int = 0, bandwidth: float = 0.0):
+        self.sections = sections
+        self._titles = {}
+        super().__init__(port, latency, jitter, error_rate, seed, bandwidth)
+
+    def _pageid(self, title: str) -> int:
+        pageid = zlib.crc32(title.lower().encode()) % 10_000_000 + 1
+        self._titles[pageid] = title
+        return pageid
+
+    def _page(self, title: str, sentences: int = 3) -> dict:
+        sentence = f"{title} is a species described by the stub encyclopedia."
+        return {
+            "pageid": self._pageid(title), "ns": 0, "title": title,
+            "extract": " ".join([sentence] * max(1, sentences)),
+            "fullurl": f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}",
+            "revisions": [{"revid": 1, "timestamp": self.REVISION}],
+        }
+
+    def _parse(self, query: dict) -> dict:
+        """``action=parse``: any of text, sections and revid, for the page or one ``section``."""
+        title = query.get("page", "")
+        props = query.get("prop", "text|sections|revid").split("|")
+        parse = {"title": title, "pageid": self._pageid(title)}
+        if "revid" in props:
+            parse["revid"] = 1
+        if "sections" in props:
+            parse["sections"] = [
+                {"toclevel": 1, "level": "2", "line": section_heading(i), "number": str(i + 1), "index": str(i + 1)}
+                for i in range(self.sections)
+            ]
+        if "text" in props:
+            if "section" in query:
+                parts = article_sections(title, self.sections)
+                index = int(query["section"])
+                if index >= len(parts):
+                    return {"error": {"code": "nosuchsection", "info": f"There is no section {index}."}}
+                html = f"<div class=\"mw-parser-output\">{parts[index]}</div>"
+            else:
+                html = article_html(title, self.sections)
+            parse["text"] = html if query.get("formatversion") == "2" else {"*": html}
+        return {"parse": parse}
+
+    def respond(self, handler, path, query, body):
+        sentences = int(query.get("exsentences", 3))
+        if query.get("action") == "parse":
+            return self._send(handler, 200, self._parse(query))
+        if query.get("list") == "search":
+            title = query.get("srsearch", "").title()
+            return self._send(handler, 200, {"query": {"search": [{"pageid": self._pageid(title), "title": title}]}})
+        if query.get("generator") == "search":
+            titles = [query.get("gsrsearch", "").title()]
+        elif "titles" in query:
+            titles = query["titles"].split("|")
+        else:
+            titles = [self._titles.get(int(p), f"Page {p}") for p in str(query.get("pageids", "")).split("|") if p]
+        pages = {}
+        for title in titles:
+            page = self._page(title, sentences)
+            if query.get("prop") == "revisions":
+                page = {k: page[k] for k in ("pageid", "ns", "title", "revisions")}
+            elif query.get("prop") == "extracts" and "exsentences" not in query:  # Whole-article plaintext
+                page = {"pageid": page["pageid"], "ns": 0, "title": title,
+                        "extract": article_text(title, self.sections)}
+            pages[str(page["pageid"])] = page
+        if query.get("formatversion") == "2":
+            return self._send(handler, 200, {"batchcomplete": True, "query": {"pages": list(pages.values())}})
+        return self._send(handler, 200, {"query": {"pages": pages}})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--openai-port", type=int, default=8801)
+    parser.add_argument("--wiki-port", type=int, default=8802)
+    parser.add_argument("--latency", type=float, default=0.3, help="OpenAI seconds to first token")
+    parser.add_argument("--wiki-latency", type=float, default=0.1)
+    parser.add_argument("--wiki-bandwidth", type=float, default=0.0, help="Wiki stub bytes/s (0: unlimited)")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    openai_stub = OpenAIStub(args.openai_port, args.latency, args.jitter, args.error_rate,
+                             args.tokens, args.token_latency)
+    wiki_stub = MediaWikiStub(args.wiki_port, args.wiki_latency, args.jitter, args.error_rate,
+                              bandwidth=args.wiki_bandwidth)
+    print(f"OPENAI_BASE_URL={openai_stub.url}/v1 WIKIPEDIA_API={wiki_stub.url}/w/api.php", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import sys
+import os
+
+# Add the project root and backend directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import backend.tools.openai_client as openai_client
+
+LATENCY = 0.2
+
+
+class SlowCompletions:
+    async def create(self, **kwargs):
+        await asyncio.sleep(LATENCY)
+        message = SimpleNamespace(content="Red foxes are omnivores.")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+@pytest.fixture
+def app(monkeypatch):
+    stub = SimpleNamespace(chat=SimpleNamespace(completions=SlowCompletions()))
+    monkeypatch.setattr(openai_client, "_async_client", stub)
+    from main import app
+    return app
+
+
+def test_concurrent_queries_overlap(app):
+    """Concurrent /query/ requests should overlap their OpenAI waits instead of serialising."""
+    requests_count = 8
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://ecobot") as http:
+            return await asyncio.gather(*(
+                http.post("/query/", data={"query": f"What do red foxes eat? #{i}"})
+                for i in range(requests_count)
+            ))
+
+    start = time.perf_counter()
+    responses = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+
+    assert all(r.status_code == 200 for r in responses)
+    assert all(r.json()["response"] == "Red foxes are omnivores." for r in responses)
+    assert elapsed < requests_count * LATENCY / 2, f"Requests did not overlap ({elapsed:.2f}s)"
+
+
+def test_ready_reports_model_loading(app, monkeypatch):
+    """/ready is 503 until the local model has loaded (or is known to be unavailable)."""
+    import main
+    monkeypatch.setattr(main, "BIOTROVE_WARMUP", True)
+
+    async def probe():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://ecobot") as http:
+            return await http.get("/ready")
+
+    monkeypatch.setattr(main, "local_model_status", lambda: "loading")
+    assert asyncio.run(probe()).status_code == 503
+
+    monkeypatch.setattr(main, "local_model_status", lambda: "loaded")
+    response = asyncio.run(probe())
+    assert response.status_code == 200
+    assert response.json() == {"ready": True, "model": "loaded"}
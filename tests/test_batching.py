@@ -0,0 +1,62 @@
+import sys
+import os
+
+# Add the project root to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import threading
+from backend.utils.batching import MicroBatcher
+
+
+def test_concurrent_requests_share_one_batch():
+    batches = []
+
+    def process(items):
+        batches.append(list(items))
+        return [item * 10 for item in items]
+
+    batcher = MicroBatcher(process, max_batch_size=8, max_wait_ms=50, preprocess=lambda x: x + 1)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+
+    assert asyncio.run(run()) == [10, 20, 30, 40, 50]
+    assert len(batches) == 1 and sorted(batches[0]) == [1, 2, 3, 4, 5]
+    assert batcher.stats == {"batches": 1, "items": 5, "max_batch": 5}
+
+
+def test_batches_are_capped_at_max_size():
+    sizes = []
+    batcher = MicroBatcher(lambda items: sizes.append(len(items)) or items, max_batch_size=3, max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(7)))
+
+    assert asyncio.run(run()) == list(range(7))
+    assert max(sizes) <= 3 and sum(sizes) == 7
+
+
+def test_errors_propagate_to_every_caller():
+    def process(items):
+        raise ValueError("model exploded")
+
+    batcher = MicroBatcher(process, max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_inference_runs_off_the_event_loop():
+    loop_threads = []
+
+    def process(items):
+        loop_threads.append(threading.current_thread().name)
+        return items
+
+    batcher = MicroBatcher(process, max_wait_ms=1)
+    asyncio.run(batcher.submit("x"))
+    assert loop_threads[0].startswith("batch-inference")
@@ -0,0 +1,124 @@
+import sys
+import os
+
+# Add the project root and backend directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import backend.tools.openai_client as openai_client
+from backend.utils import conversation_store
+from backend.tools.semantic_cache import SemanticCache
+from backend.utils.conversation_store import MemoryConversationStore, SQLiteConversationStore
+
+
+def stores(tmp_path):
+    return [
+        MemoryConversationStore(max_turns=4, idle_ttl=60, max_sessions=2),
+        SQLiteConversationStore(str(tmp_path / "conversations.db"), max_turns=4, idle_ttl=60, max_sessions=2),
+    ]
+
+
+@pytest.mark.parametrize("backend", [0, 1])
+def test_ring_buffer_compacts_old_turns(tmp_path, backend):
+    store = stores(tmp_path)[backend]
+    session = store.session("a")
+    for i in range(6):
+        session.append("user", f"Question {i}. With detail.")
+
+    assert [m["content"] for m in session.recent(10)] == [f"Question {i}. With detail." for i in range(2, 6)]
+    assert session.recent(1) == [{"role": "user", "content": "Question 5. With detail."}]
+    assert session.summary == "user: Question 0.\nuser: Question 1."
+    assert store.recent("b", 3) == []
+
+
+@pytest.mark.parametrize("backend", [0, 1])
+def test_idle_and_excess_sessions_are_evicted(tmp_path, monkeypatch, backend):
+    store = stores(tmp_path)[backend]
+    now = [1000.0]
+    monkeypatch.setattr(conversation_store.time, "time", lambda: now[0])
+    store.append("old", "user", "hi")
+    now[0] += 30
+    store.append("a", "user", "hi")
+    now[0] += 20
+    store.append("b", "user", "hi")
+    assert store.stats()["sessions"] == 2  # "old" was the least recently active
+
+    now[0] += 45
+    assert store.stats()["sessions"] == 1  # "a" has been idle for over a minute
+    assert store.recent("old", 1) == [] and store.recent("b", 1)
+
+
+def test_sqlite_store_survives_reopen(tmp_path):
+    path = str(tmp_path / "conversations.db")
+    SQLiteConversationStore(path).append("a", "assistant", "Red foxes are omnivores.")
+    assert SQLiteConversationStore(path).recent("a", 5) == [{"role": "assistant", "content": "Red foxes are omnivores."}]
+
+
+class EchoCompletions:
+    def __init__(self):
+        self.prompts = []
+
+    async def create(self, **kwargs):
+        self.prompts.append(kwargs["messages"][-1]["content"])
+        message = SimpleNamespace(content=f"Answer {len(self.prompts)}.")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def test_sessions_are_isolated_and_answers_stored_once(monkeypatch):
+    completions = EchoCompletions()
+    monkeypatch.setattr(openai_client, "_async_client", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    import main
+    monkeypatch.setattr(main, "conversations", MemoryConversationStore())
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://ecobot") as http:
+            first = (await http.post("/query/", data={"query": "Where do badgers sleep?"})).json()
+            await http.post("/query/", data={"query": "How big do they get?", "session_id": first["session_id"]})
+            await http.post("/query/", data={"query": "What do otters eat?"})
+            return first["session_id"]
+
+    session_id = asyncio.run(run())
+    assert main.conversations.recent(session_id, 10) == [
+        {"role": "user", "content": "Where do badgers sleep?"},
+        {"role": "assistant", "content": "Answer 1."},
+        {"role": "user", "content": "How big do they get?"},
+        {"role": "assistant", "content": "Answer 2."},
+    ]
+    assert "badgers" in completions.prompts[1]
+    assert "badgers" not in completions.prompts[2]
+
+
+def test_repeated_query_is_answered_from_memo(monkeypatch):
+    completions = EchoCompletions()
+    monkeypatch.setattr(openai_client, "_async_client", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    import main
+    from backend import gpt_handler
+    monkeypatch.setattr(main, "conversations", MemoryConversationStore())
+    monkeypatch.setattr(gpt_handler, "text_cache", SemanticCache(gpt_handler._query_embedding, {}))
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://ecobot") as http:
+            first = (await http.post("/query/", data={"query": "Where do badgers sleep?"})).json()
+            data = {"query": "  where do BADGERS sleep ", "session_id": first["session_id"]}
+            repeat = (await http.post("/query/", data=data)).json()
+            follow_up = {"query": "Tell me more", "session_id": first["session_id"]}
+            await http.post("/query/", data=follow_up)
+            await http.post("/query/", data=follow_up)
+            other = (await http.post("/query/", data={"query": "Where do badgers sleep?"})).json()
+            return first, repeat, other
+
+    first, repeat, other = asyncio.run(run())
+    assert repeat["response"] == first["response"] == "Answer 1."
+    assert repeat["memoised"] is True
+    assert len(completions.prompts) == 3  # both follow-ups still reach the model
+    assert "memoised" not in other  # memos are per session (the semantic cache answered this one)
+    assert main.conversations.recent(first["session_id"], 10)[3] == {"role": "assistant", "content": "Answer 1."}
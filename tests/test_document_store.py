@@ -0,0 +1,56 @@
+import sys
+import os
+
+# Add the project root to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import pytest
+import backend.agents.planner as planner_module
+from backend.agents.planner import PlanningAgent
+from backend.tools.document_store import DocumentStore
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), "..", "assets", "cureus-0015-00000037574.pdf")
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = DocumentStore(str(tmp_path / "documents"))
+    monkeypatch.setattr(planner_module, "document_store", store)
+    return store
+
+
+def test_reupload_skips_extraction(store):
+    calls = []
+
+    def extract(content):
+        calls.append(content)
+        return ["Page one", "", "Page three"]
+
+    first = store.get_or_extract(b"%PDF-fake", extract)
+    second = store.get_or_extract(b"%PDF-fake", extract)
+
+    assert len(calls) == 1
+    assert first["doc_id"] == second["doc_id"] == DocumentStore.document_id(b"%PDF-fake")
+    assert second["text"] == "Page one\nPage three"
+    assert [p["page"] for p in second["pages"]] == [1, 3]
+    assert second["text"][second["pages"][1]["offset"]:] == "Page three"
+
+
+def test_invalid_ids_are_rejected(store):
+    assert store.get("../../etc/passwd") is None
+    assert store.get("0" * 64) is None
+
+
+def test_follow_up_uses_document_id(store):
+    with open(SAMPLE_PDF, "rb") as f:
+        content = f.read()
+    planner = PlanningAgent()
+
+    upload_plan = planner.plan("Summarize this paper", content, "application/pdf")
+    doc_id = upload_plan["data"]["doc_id"]
+    follow_up = planner.plan("What methods were used?", doc_id=doc_id)
+
+    assert follow_up["tool"] == "pdf"
+    assert follow_up["data"]["extracted_text"] == upload_plan["data"]["extracted_text"]
+    assert follow_up["data"]["user_query"] == "What methods were used?"
@@ -0,0 +1,63 @@
+import sys
+import os
+
+# Add the project root to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+from PIL import Image, ImageDraw
+from backend.tools.image_cache import ImageAnswerCache, perceptual_hash
+
+
+def scene(shift=0):
+    image = Image.new("RGB", (320, 240), "white")
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((60 + shift, 40, 220 + shift, 200), fill="darkorange")
+    draw.rectangle((0, 200, 320, 240), fill="darkgreen")
+    return image
+
+
+def other_scene():
+    image = Image.new("RGB", (320, 240), "navy")
+    ImageDraw.Draw(image).polygon([(160, 10), (300, 230), (20, 230)], fill="yellow")
+    return image
+
+
+def test_hash_tolerates_resize_but_not_different_images():
+    base = perceptual_hash(scene())
+    assert (base ^ perceptual_hash(scene().resize((160, 120)))).bit_count() <= 4
+    assert (base ^ perceptual_hash(other_scene())).bit_count() > 12
+
+
+def test_lookup_matches_near_duplicates_for_same_question():
+    cache = ImageAnswerCache(path="")
+    cache.store(scene(), "Identify this species.", "A fox.")
+    assert cache.lookup(scene().resize((640, 480)), "identify  this species.") == "A fox."
+    assert cache.lookup(scene(), "Is it endangered?") is None
+    assert cache.lookup(other_scene(), "Identify this species.") is None
+
+
+def test_embedding_fallback_catches_crops():
+    embeddings = {}
+
+    def embedder(image):
+        # Stand-in for CLIP: crops of the fox scene embed close to the original
+        return np.array([1.0, 0.0]) if image.getpixel((image.width // 2, image.height // 2))[0] > 200 else np.array([0.0, 1.0])
+
+    cache = ImageAnswerCache(path="", embedder=embedder)
+    cache.store(scene(), "q", "A fox.")
+    crop = scene().crop((40, 20, 240, 210))
+    assert cache.lookup(crop, "q") == "A fox."
+    assert cache.stats()["embedding_hits"] == 1
+
+
+def test_size_bound_and_persistence(tmp_path):
+    path = str(tmp_path / "images.db")
+    cache = ImageAnswerCache(path=path, max_entries=1)
+    cache.store(scene(), "q", "A fox.")
+    cache.store(other_scene(), "q", "A triangle.")
+    assert cache.stats()["evictions"] == 1
+
+    reopened = ImageAnswerCache(path=path, max_entries=1)
+    assert reopened.lookup(other_scene(), "q") == "A triangle."
+    assert reopened.lookup(scene(), "q") is None
@@ -5,18 +5,18 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import pytest
-import torch
-import open_clip
-from PIL import Image
-import io
-from backend.image_classifier import classify_with_biotrove
+
+torch = pytest.importorskip("torch")
+open_clip = pytest.importorskip("open_clip")
+
+from backend.image_classifier import classify_with_biotrove, get_biotrove
+
+SAMPLE_IMAGE = os.path.join(os.path.dirname(__file__), "..", "assets", "biotrove-test.jpeg")
 
 @pytest.fixture(scope="module")
 def sample_image():
     """Load a sample image for testing."""
-    #image_path = "assests\\biotrove-test.jpg"  # Ensure this file exists in `tests/`
-    image_path = "C:/Users/share/Documents/Ecohack/tests/biotrove-test.jpg"
-    with open(image_path, "rb") as img_file:
+    with open(SAMPLE_IMAGE, "rb") as img_file:
         return img_file.read()
 
 def test_model_loading():
@@ -27,12 +27,19 @@ def test_model_loading():
     except Exception as e:
         pytest.fail(f"Model failed to load: {str(e)}")
 
+def test_label_embeddings_are_normalised():
+    """The precomputed text-embedding matrix has one unit-length row per label."""
+    biotrove = get_biotrove()
+    assert biotrove.label_embeddings.shape[0] == len(biotrove.labels)
+    norms = (biotrove.label_embeddings ** 2).sum(axis=1) ** 0.5
+    assert abs(norms - 1).max() < 1e-3
+
 def test_image_classification(sample_image):
-    """Check if BioTrove-CLIP correctly classifies an image."""
-    try:
-        prediction = classify_with_biotrove(sample_image)
-        assert isinstance(prediction, str), "Prediction is not a string"
-        assert len(prediction) > 0, "Prediction is empty"
-        print(f"Predicted species: {prediction}")
-    except Exception as e:
-        pytest.fail(f"Classification failed: {str(e)}")
+    """Check if BioTrove-CLIP returns ranked taxa with probabilities."""
+    predictions = classify_with_biotrove(sample_image, top_k=5)
+    assert len(predictions) == 5
+    assert all(isinstance(p["label"], str) and p["label"] for p in predictions)
+    probabilities = [p["probability"] for p in predictions]
+    assert probabilities == sorted(probabilities, reverse=True)
+    assert 0 < sum(probabilities) <= 1.0 + 1e-6
+    print(f"Predicted species: {predictions[0]['label']}")
@@ -0,0 +1,135 @@
+import sys
+import os
+
+# Add the project root to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import pytest
+from backend.tools import image_tools, openai_client
+from backend.tools.image_cache import ImageAnswerCache
+
+
+@pytest.fixture(autouse=True)
+def answer_cache(monkeypatch):
+    """Keep the near-duplicate answer cache in memory for every test."""
+    cache = ImageAnswerCache(path="")
+    monkeypatch.setattr(image_tools, "_answer_cache", cache)
+    return cache
+
+PREDICTIONS = [
+    {"label": "turkey tail (Trametes versicolor)", "common_name": "turkey tail",
+     "scientific_name": "Trametes versicolor", "probability": 0.82},
+    {"label": "tinder fungus (Fomes fomentarius)", "common_name": "tinder fungus",
+     "scientific_name": "Fomes fomentarius", "probability": 0.1},
+]
+
+
+@pytest.fixture
+def gpt_calls(monkeypatch):
+    calls = []
+
+    def fake_gpt(file_content, file_type, query="Identify this species."):
+        calls.append(query)
+        return "GPT-4o answer"
+
+    monkeypatch.setattr(image_tools, "process_image_with_gpt4o", fake_gpt)
+    return calls
+
+
+def test_confident_local_prediction_skips_gpt(monkeypatch, gpt_calls):
+    monkeypatch.setattr(image_tools, "classify_image_locally", lambda content, top_k=5: PREDICTIONS)
+    answer = image_tools.identify_species(b"jpeg", "image/jpeg")
+    assert "turkey tail" in answer and "82%" in answer
+    assert gpt_calls == []
+
+
+def test_confident_local_prediction_is_a_hint_for_other_questions(monkeypatch, gpt_calls):
+    monkeypatch.setattr(image_tools, "classify_image_locally", lambda content, top_k=5: PREDICTIONS)
+    assert image_tools.identify_species(b"jpeg", "image/jpeg", "What species is this?") != "GPT-4o answer"
+    assert image_tools.identify_species(b"jpeg", "image/jpeg", "Is this mushroom edible?") == "GPT-4o answer"
+    assert gpt_calls == ["Is this mushroom edible?\n\n"
+                         "A local classifier identified it as turkey tail (Trametes versicolor) (82% confidence)."]
+
+
+def test_low_confidence_escalates_with_hints(monkeypatch, gpt_calls):
+    unsure = [dict(p, probability=0.3) for p in PREDICTIONS]
+    monkeypatch.setattr(image_tools, "classify_image_locally", lambda content, top_k=5: unsure)
+    assert image_tools.identify_species(b"jpeg", "image/jpeg") == "GPT-4o answer"
+    assert "turkey tail (Trametes versicolor) (30%)" in gpt_calls[0]
+
+
+def test_missing_local_model_falls_back_to_gpt(monkeypatch, gpt_calls):
+    monkeypatch.setattr(image_tools, "classify_image_locally", lambda content, top_k=5: None)
+    assert image_tools.identify_species(b"jpeg", "image/jpeg", "What is this?") == "GPT-4o answer"
+    assert gpt_calls == ["What is this?"]
+
+
+def _jpeg(size):
+    import io
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.effect_noise(size, 64).convert("RGB").save(buffer, "JPEG", quality=95)
+    return buffer.getvalue()
+
+
+class RecordingClient:
+    """Stands in for the OpenAI client and replies with canned answers in order."""
+
+    def __init__(self, answers):
+        from types import SimpleNamespace
+        self.answers = list(answers)
+        self.requests = []
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, **kwargs):
+        from types import SimpleNamespace
+        self.requests.append(kwargs["messages"][0]["content"][1]["image_url"])
+        message = SimpleNamespace(content=self.answers.pop(0))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def test_large_upload_is_downsized_before_sending():
+    from PIL import Image
+    import base64, io
+    prepared = image_tools.PreparedImage(_jpeg((4000, 3000)), "image/jpeg")
+    url = prepared.data_url("high")
+    sent = Image.open(io.BytesIO(base64.b64decode(url.split(",", 1)[1])))
+    assert min(sent.size) == image_tools.VISION_HIGH_SHORT_SIDE
+    assert prepared.sent_bytes < prepared.original_bytes / 4
+    assert max(Image.open(io.BytesIO(base64.b64decode(prepared.data_url("low").split(",", 1)[1]))).size) <= 512
+
+
+def test_low_detail_first_and_escalate_when_uncertain(monkeypatch):
+    client = RecordingClient(["It is hard to tell at this resolution.", "A red fox."])
+    monkeypatch.setattr(openai_client, "_client", client)
+    before = image_tools.image_metrics()["escalations"]
+
+    assert image_tools.process_image_with_gpt4o(_jpeg((1600, 1200)), "image/jpeg", detail="auto") == "A red fox."
+    assert [r["detail"] for r in client.requests] == ["low", "high"]
+    assert image_tools.image_metrics()["escalations"] == before + 1
+
+
+def test_confident_low_detail_answer_is_final(monkeypatch):
+    client = RecordingClient(["A red fox (Vulpes vulpes)."])
+    monkeypatch.setattr(openai_client, "_client", client)
+    image_tools.process_image_with_gpt4o(_jpeg((800, 600)), "image/jpeg", detail="auto")
+    assert [r["detail"] for r in client.requests] == ["low"]
+
+
+def test_repeat_upload_answered_from_cache(monkeypatch, answer_cache):
+    import io
+    from PIL import Image
+    client = RecordingClient(["A turkey tail bracket fungus."])
+    monkeypatch.setattr(openai_client, "_client", client)
+    with open(os.path.join(os.path.dirname(__file__), "..", "assets", "biotrove-test.jpeg"), "rb") as f:
+        original = f.read()
+    recompressed = io.BytesIO()
+    Image.open(io.BytesIO(original)).resize((400, 300)).save(recompressed, "JPEG", quality=60)
+
+    first = image_tools.process_image_with_gpt4o(original, "image/jpeg", detail="high")
+    second = image_tools.process_image_with_gpt4o(recompressed.getvalue(), "image/jpeg", detail="high")
+
+    assert first == second == "A turkey tail bracket fungus."
+    assert len(client.requests) == 1
+    assert answer_cache.stats()["hash_hits"] + answer_cache.stats()["exact_hits"] == 1
@@ -0,0 +1,92 @@
+import sys
+import os
+
+# Add the project root to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import time
+from types import SimpleNamespace
+import pytest
+import backend.tools.openai_client as openai_client
+from backend.agents import planner as planner_module
+from backend.agents.intent_router import get_router, load_examples, INTENTS, ROUTER_THRESHOLD
+from backend.agents.planner import PlanningAgent
+
+@pytest.fixture
+def no_escalation(monkeypatch):
+    """Fail the test if the planner asks GPT-4o for a plan."""
+    def generate_plan_with_gpt4o(query):
+        raise AssertionError(f"Escalated {query!r}")
+    monkeypatch.setattr(planner_module, "generate_plan_with_gpt4o", generate_plan_with_gpt4o)
+
+def test_labelled_queries_load():
+    examples = load_examples()
+    assert len(examples) > 200
+    assert {intent for _, intent in examples} == set(INTENTS)
+
+def test_animal_families_stay_with_gpt(no_escalation):
+    """"family" alone no longer sends a question to Wikipedia."""
+    intent, confidence = get_router().route("How do lion families look after their cubs?")
+    assert intent == "gpt" and confidence >= ROUTER_THRESHOLD
+    assert get_router().route("Which family does the fennec fox belong to?")[0] == "wiki"
+    assert PlanningAgent().plan("Do hyena families hunt together?")["tool"] == "gpt"
+
+def test_confident_routes_skip_gpt(no_escalation):
+    planner = PlanningAgent()
+    assert planner.plan("Show me the full article on the grey wolf")["tool"] == "wiki_full"
+    assert planner.plan("What is the scientific name of the badger?")["tool"] == "wiki"
+    assert planner.plan("How do hedgehogs survive the winter?")["tool"] == "gpt"
+
+def test_low_confidence_escalates(monkeypatch):
+    calls = []
+    def generate_plan_with_gpt4o(query):
+        calls.append(query)
+        return '{"tool": "wiki", "data": "Okapi"}'
+    monkeypatch.setattr(planner_module, "generate_plan_with_gpt4o", generate_plan_with_gpt4o)
+    monkeypatch.setattr(planner_module, "ROUTER_THRESHOLD", 1.01)  # Every route is unsure
+    plan = PlanningAgent().plan("Okapi?")
+    assert calls == ["Okapi?"] and plan["tool"] == "wiki" and plan["data"] == "Okapi"
+
+    # An unusable GPT answer falls back to the router's choice
+    monkeypatch.setattr(planner_module, "generate_plan_with_gpt4o", lambda query: "❌ Error: offline")
+    assert PlanningAgent().plan("Scientific name of the okapi")["tool"] == "wiki"
+
+def test_escalation_does_not_block_the_event_loop(monkeypatch):
+    class SlowCompletions:
+        async def create(self, **kwargs):
+            await asyncio.sleep(0.2)
+            message = SimpleNamespace(content='{"tool": "wiki", "data": "Okapi"}')
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    monkeypatch.setattr(openai_client, "_async_client", SimpleNamespace(chat=SimpleNamespace(completions=SlowCompletions())))
+    monkeypatch.setattr(openai_client, "_client", None)
+    monkeypatch.setattr(openai_client, "get_client", lambda: pytest.fail("sync OpenAI call on the event loop"))
+    monkeypatch.setattr(planner_module, "ROUTER_THRESHOLD", 1.01)  # Every route is unsure
+
+    async def run():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        beating = asyncio.create_task(heartbeat())
+        plan = await PlanningAgent().aplan("Okapi?")
+        beating.cancel()
+        return plan, ticks
+
+    plan, ticks = asyncio.run(run())
+    assert plan["tool"] == "wiki" and plan["data"] == "Okapi"
+    assert ticks >= 10  # The loop kept running while GPT-4o-mini planned
+
+def test_route_latency():
+    router = get_router()
+    queries = [query for query, _ in load_examples()]
+    router.route(queries[0])
+    start = time.perf_counter()
+    for query in queries:
+        router.route(query)
+    assert (time.perf_counter() - start) / len(queries) < 0.001
@@ -0,0 +1,216 @@
+import sys
+import os
+
+# Add the project root to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from openai import OpenAI, AsyncOpenAI
+
+from backend.tools import openai_client
+from backend.tools.openai_client import CircuitBreaker, CircuitOpenError, TokenBucket
+
+
+def _completion(content):
+    return {
+        "id": "chatcmpl-stub", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 12, "completion_tokens": 7, "total_tokens": 19},
+    }
+
+
+class StubOpenAI:
+    """Local stand-in for the chat completions endpoint that replays scripted responses."""
+
+    def __init__(self, script=(), delay=0.0):
+        self.script = list(script)
+        self.delay = delay
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with stub._lock:
+                    stub.requests += 1
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                    status, headers = stub.script.pop(0) if stub.script else (200, {})
+                time.sleep(stub.delay)
+                body = json.dumps(_completion("Badgers sleep in setts.") if status == 200
+                                  else {"error": {"message": f"stub {status}", "type": "stub"}}).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with stub._lock:
+                    stub.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_api(monkeypatch):
+    servers = []
+
+    def start(script=(), delay=0.0):
+        stub = StubOpenAI(script, delay)
+        servers.append(stub)
+        monkeypatch.setattr(openai_client, "_client", OpenAI(api_key="sk-test", base_url=stub.base_url, max_retries=0))
+        monkeypatch.setattr(openai_client, "_async_client",
+                            AsyncOpenAI(api_key="sk-test", base_url=stub.base_url, max_retries=0))
+        return stub
+
+    monkeypatch.setattr(openai_client, "breaker", CircuitBreaker(threshold=3, cooldown=60))
+    monkeypatch.setattr(openai_client, "_buckets", {})
+    monkeypatch.setattr(openai_client, "_usage", {})
+    monkeypatch.setattr(openai_client, "OPENAI_BACKOFF_BASE", 0.01)
+    yield start
+    for stub in servers:
+        stub.close()
+
+
+def _ask():
+    response = openai_client.chat_completion(
+        model="gpt-4o-mini", messages=[{"role": "user", "content": "Where do badgers sleep?"}]
+    )
+    return response.choices[0].message.content
+
+
+def test_rate_limited_request_waits_for_retry_after(stub_api):
+    stub = stub_api([(429, {"Retry-After": "0.3"}), (503, {})])
+    started = time.perf_counter()
+    assert _ask() == "Badgers sleep in setts."
+    assert stub.requests == 3
+    assert time.perf_counter() - started >= 0.3
+    assert openai_client.breaker.state == "closed"
+    assert openai_client.client_stats()["usage"]["gpt-4o-mini"] == {"calls": 1, "input_tokens": 12, "output_tokens": 7}
+
+
+def test_client_errors_are_not_retried(stub_api):
+    stub = stub_api([(400, {})])
+    with pytest.raises(Exception):
+        _ask()
+    assert stub.requests == 1
+    assert openai_client.breaker.failures == 0
+
+
+def test_breaker_fails_fast_while_api_is_down(stub_api, monkeypatch):
+    monkeypatch.setattr(openai_client, "OPENAI_MAX_RETRIES", 0)
+    stub = stub_api([(500, {})] * 5)
+    for _ in range(3):
+        with pytest.raises(Exception):
+            _ask()
+    assert openai_client.breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        _ask()
+    assert stub.requests == 3  # Rejected without reaching the API
+
+    openai_client.breaker.opened_at -= 60  # Cool-down over: one probe goes through and closes it
+    stub.script.clear()
+    assert _ask() == "Badgers sleep in setts."
+    assert openai_client.breaker.state == "closed"
+
+
+def _open_breaker(stub_api, monkeypatch, script):
+    monkeypatch.setattr(openai_client, "OPENAI_MAX_RETRIES", 0)
+    stub = stub_api([(500, {})] * 3 + list(script))
+    for _ in range(3):
+        with pytest.raises(Exception):
+            _ask()
+    openai_client.breaker.opened_at -= 60  # Cool-down over: the next call is the probe
+    return stub
+
+
+def test_sustained_rate_limiting_opens_the_breaker(stub_api, monkeypatch):
+    monkeypatch.setattr(openai_client, "OPENAI_MAX_RETRIES", 1)
+    stub = stub_api([(429, {})] * 6)
+    retries = openai_client.client_stats()["retries"]
+    for _ in range(3):
+        with pytest.raises(Exception):
+            _ask()
+    assert openai_client.breaker.state == "open"
+    assert stub.requests == 6
+    assert openai_client.client_stats()["retries"] == retries + 3
+
+
+def test_stats_are_counted_under_the_lock(monkeypatch):
+    monkeypatch.setattr(openai_client, "_stats", dict(openai_client._stats, requests=0))
+    threads = [threading.Thread(target=lambda: [openai_client._count("requests") for _ in range(5000)])
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert openai_client.client_stats()["requests"] == 40000
+
+
+def test_rate_limited_probe_reopens_the_breaker(stub_api, monkeypatch):
+    stub = _open_breaker(stub_api, monkeypatch, [(429, {})])
+    with pytest.raises(Exception):
+        _ask()
+    assert openai_client.breaker.state == "open"
+    openai_client.breaker.opened_at -= 60  # The probe was released: the next one goes through
+    assert _ask() == "Badgers sleep in setts."
+    assert openai_client.breaker.state == "closed"
+    assert stub.requests == 5
+
+
+def test_cancelled_probe_lets_the_next_call_probe(stub_api, monkeypatch):
+    stub = _open_breaker(stub_api, monkeypatch, [])
+    stub.delay = 0.5
+
+    async def probe():
+        await openai_client.achat_completion(model="gpt-4o-mini", messages=[{"role": "user", "content": "Hi"}])
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(asyncio.wait_for(probe(), 0.05))
+    assert openai_client.breaker.state == "half-open"
+    stub.delay = 0
+    assert _ask() == "Badgers sleep in setts."
+    assert openai_client.breaker.state == "closed"
+
+
+def test_async_calls_respect_the_concurrency_limit(stub_api, monkeypatch):
+    monkeypatch.setattr(openai_client, "OPENAI_MAX_CONCURRENCY", 2)
+    stub = stub_api(delay=0.05)
+
+    async def run():
+        return await asyncio.gather(*(
+            openai_client.achat_completion(model="gpt-4o", messages=[{"role": "user", "content": str(i)}])
+            for i in range(6)
+        ))
+
+    responses = asyncio.run(run())
+    assert len(responses) == 6 and stub.requests == 6
+    assert stub.max_in_flight == 2
+
+
+def test_token_bucket_spaces_out_bursts():
+    bucket = TokenBucket(rate=10, capacity=2)
+    waits = [bucket.reserve() for _ in range(4)]
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] == pytest.approx(0.1, abs=0.02)
+    assert waits[3] == pytest.approx(0.2, abs=0.02)
@@ -0,0 +1,50 @@
+import sys
+import os
+
+# Add the project root to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from backend.tools import pdf_index
+from backend.tools.document_store import DocumentStore
+from backend.tools.pdf_index import BM25Index, chunk_document, retrieve_pdf_context
+
+PAGES = [
+    "ABSTRACT\nWe studied red fox diet across seasons.\n" + "Background filler text. " * 40,
+    "METHODS\nScat samples were collected monthly and analysed for rodent remains.\n" + "Sampling detail. " * 40,
+    "RESULTS\nVoles dominated the winter diet while berries peaked in autumn.\n" + "More numbers. " * 40,
+]
+
+
+@pytest.fixture
+def document(tmp_path, monkeypatch):
+    store = DocumentStore(str(tmp_path / "documents"))
+    monkeypatch.setattr(pdf_index, "document_store", store)
+    monkeypatch.setattr(pdf_index, "_loaded", pdf_index.OrderedDict())
+    return store.put(DocumentStore.document_id(b"fox-paper"), PAGES)
+
+
+def test_chunks_are_page_and_section_aware(document):
+    chunks = chunk_document(document, chunk_chars=400)
+    assert {c["page"] for c in chunks} == {1, 2, 3}
+    assert any(c["section"] == "METHODS" and "Scat samples" in c["text"] for c in chunks)
+    assert all(len(c["text"]) <= 500 for c in chunks)
+
+
+def test_bm25_ranks_relevant_chunk_first(document):
+    index = BM25Index(chunk_document(document, chunk_chars=400))
+    best = index.search("what did foxes eat in winter? voles")[0]
+    assert best["page"] == 3
+
+
+def test_large_documents_send_only_excerpts(document, monkeypatch):
+    monkeypatch.setattr(pdf_index, "PDF_RETRIEVAL_THRESHOLD", 1000)
+    context = retrieve_pdf_context(document["text"], "How were scat samples collected?", document["doc_id"])
+    assert "Scat samples were collected" in context
+    assert context.startswith("[Page 2 · METHODS]")
+    assert len(context) < len(document["text"])
+    assert os.path.exists(pdf_index.document_store.path(document["doc_id"], pdf_index.INDEX_FILE))
+
+
+def test_small_documents_sent_whole(document):
+    assert retrieve_pdf_context("short text", "anything", document["doc_id"]) == "short text"
@@ -0,0 +1,55 @@
+import sys
+import os
+
+# Add the project root to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import time
+
+import pytest
+from backend.tools.pdf_tools import iter_pdf_pages
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), "..", "assets", "cureus-0015-00000037574.pdf")
+
+
+@pytest.fixture(scope="module")
+def sample_pdf():
+    with open(SAMPLE_PDF, "rb") as f:
+        return f.read()
+
+
+def test_page_range_in_order(sample_pdf):
+    pages = list(iter_pdf_pages(sample_pdf, workers=1, page_range=(2, 3)))
+    assert [number for number, _ in pages] == [2, 3]
+    assert all(text for _, text in pages)
+
+
+def test_char_budget_stops_early(sample_pdf):
+    pages = list(iter_pdf_pages(sample_pdf, workers=1, max_chars=100))
+    assert len(pages) == 1
+    assert len(pages[0][1]) == 100
+
+
+def test_process_pool_matches_sequential(sample_pdf):
+    sequential = list(iter_pdf_pages(sample_pdf, workers=1, max_pages=5))
+    parallel = list(iter_pdf_pages(sample_pdf, workers=2, max_pages=5))
+    assert parallel == sequential
+    assert [number for number, _ in parallel] == [1, 2, 3, 4, 5]
+
+
+def test_concurrent_callers_share_one_pool(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from backend.tools import pdf_tools
+    created = []
+
+    def slow_pool(**kwargs):  # Widens the window between the check and the assignment
+        time.sleep(0.05)
+        created.append(object())
+        return created[-1]
+
+    monkeypatch.setattr(pdf_tools, "_pools", {})
+    monkeypatch.setattr(pdf_tools, "ProcessPoolExecutor", slow_pool)
+    with ThreadPoolExecutor(8) as threads:
+        pools = list(threads.map(lambda _: pdf_tools._get_pool(3), range(8)))
+    assert len(created) == 1 and all(pool is created[0] for pool in pools)
@@ -0,0 +1,168 @@
+import sys
+import os
+
+# Add the project root to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import asyncio
+import time
+
+import pytest
+from backend.agents import executor as executor_module
+from backend.agents.executor import ExecutingAgent
+from backend.agents.plan_graph import extract_species_name, parse_plan, validate_steps
+from backend.agents.planner import PlanningAgent
+
+
+def wiki_result(title):
+    return {"title": title, "summary": f"About {title}.", "last_updated": "2025-01-01T00:00:00Z",
+            "url": f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}"}
+
+
+@pytest.fixture
+def tools(monkeypatch):
+    """Stub tool calls: Wikipedia lookups take 0.2 s, GPT echoes its prompt."""
+    calls = {"wiki": [], "gpt": []}
+
+    async def asearch_wikipedia(query):
+        calls["wiki"].append(query)
+        await asyncio.sleep(0.5 if query == "Slow topic" else 0.2)
+        return wiki_result(query)
+
+    async def aprocess_with_gpt4o(prompt, user_query=None):
+        calls["gpt"].append(prompt)
+        return f"Synthesised from: {prompt}"
+
+    async def aidentify_species(data, file_type, query):
+        if data == b"blurry":
+            return "❌ Error processing image: unreadable"
+        return "🔬 **Red fox** (*Vulpes vulpes*), 97% confidence (local BioTrove-CLIP model)."
+
+    monkeypatch.setattr(executor_module, "asearch_wikipedia", asearch_wikipedia)
+    monkeypatch.setattr(executor_module, "aprocess_with_gpt4o", aprocess_with_gpt4o)
+    monkeypatch.setattr(executor_module, "aidentify_species", aidentify_species)
+    return calls
+
+
+def test_validate_steps_orders_and_rejects_cycles():
+    steps = [
+        {"id": "c", "tool": "gpt", "depends_on": ["a", "b"]},
+        {"id": "a", "tool": "wiki"},
+        {"id": "b", "tool": "wiki", "depends_on": ["a"]},
+    ]
+    assert [s["id"] for s in validate_steps(steps)] == ["a", "b", "c"]
+    with pytest.raises(ValueError, match="Cyclic"):
+        validate_steps([{"id": "a", "tool": "wiki", "depends_on": ["b"]},
+                        {"id": "b", "tool": "wiki", "depends_on": ["a"]}])
+    with pytest.raises(ValueError, match="Unknown tool"):
+        validate_steps([{"id": "a", "tool": "shell"}])
+
+
+def test_independent_steps_run_concurrently(tools):
+    plan = parse_plan("""```json
+    {"steps": [
+        {"id": "fox", "tool": "wiki", "data": "Red fox"},
+        {"id": "wolf", "tool": "wiki", "data": "Gray wolf"},
+        {"id": "answer", "tool": "gpt", "depends_on": ["fox", "wolf"], "data": "Compare: {fox} | {wolf}"}
+    ]}
+    ```""")
+
+    start = time.perf_counter()
+    result = asyncio.run(ExecutingAgent().aexecute(plan))
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.35, f"wiki steps did not overlap ({elapsed:.2f}s)"
+    assert "About Red fox." in tools["gpt"][0] and "About Gray wolf." in tools["gpt"][0]
+    assert result["response"].startswith("Synthesised from: Compare:")
+    assert result["sources"] == [wiki_result("Red fox")["url"], wiki_result("Gray wolf")["url"]]
+    assert result["steps"] == {"fox": "ok", "wolf": "ok", "answer": "ok"}
+
+
+def test_slow_step_times_out_without_blocking_the_answer(tools):
+    plan = {"tool": "dag", "steps": [
+        {"id": "fast", "tool": "wiki", "data": "Red fox"},
+        {"id": "slow", "tool": "wiki", "data": "Slow topic", "timeout": 0.3},
+        {"id": "answer", "tool": "gpt", "depends_on": ["fast", "slow"], "data": "{fast} / {slow}"},
+    ]}
+
+    start = time.perf_counter()
+    result = asyncio.run(ExecutingAgent().aexecute(plan))
+
+    assert time.perf_counter() - start < 0.45
+    assert "(unavailable: timed out after 0.3s)" in tools["gpt"][0]
+    assert result["steps"]["slow"] == "timed out after 0.3s"
+
+
+def test_image_question_identifies_then_looks_up_species(tools):
+    plan = PlanningAgent().plan("What is the conservation status of this animal?", b"jpeg", "image/jpeg")
+    assert plan["tool"] == "dag"
+
+    result = asyncio.run(ExecutingAgent().aexecute(plan))
+
+    assert tools["wiki"] == ["Vulpes vulpes"]
+    assert "Question: What is the conservation status of this animal?" in tools["gpt"][0]
+    assert result["sources"] == [wiki_result("Vulpes vulpes")["url"]]
+
+
+def test_failed_identification_skips_lookup_but_still_answers(tools):
+    plan = PlanningAgent().plan("What is the habitat of this bird?", b"blurry", "image/png")
+
+    result = asyncio.run(ExecutingAgent().aexecute(plan))
+
+    assert tools["wiki"] == []
+    assert result["steps"]["wiki"] == "skipped because step 'identify' failed"
+    assert "(unavailable: ❌ Error processing image: unreadable)" in tools["gpt"][0]
+
+
+def test_streaming_dag_streams_the_final_step(tools, monkeypatch):
+    async def astream_with_gpt4o(prompt, user_query=None):
+        for word in ("Both ", "are ", "canids."):
+            yield word
+
+    monkeypatch.setattr(executor_module, "astream_with_gpt4o", astream_with_gpt4o)
+    plan = {"tool": "dag", "steps": [
+        {"id": "fox", "tool": "wiki", "data": "Red fox"},
+        {"id": "answer", "tool": "gpt", "depends_on": ["fox"], "data": "Summarise {fox}"},
+    ]}
+
+    async def collect():
+        return [event async for event in ExecutingAgent().astream_execute(plan)]
+
+    events = asyncio.run(collect())
+    assert [e["text"] for e in events if e["type"] == "delta"] == ["Both ", "are ", "canids."]
+    assert events[-1]["response"] == "Both are canids."
+    assert events[-1]["sources"] == [wiki_result("Red fox")["url"]]
+
+
+def test_extract_species_name():
+    assert extract_species_name("🔬 **Red fox** (*Vulpes vulpes*), 97%") == "Vulpes vulpes"
+    assert extract_species_name("This looks like a barn owl (Tyto alba).") == "Tyto alba"
+    assert extract_species_name("This is a **Common kingfisher**.") == "Common kingfisher"
+
+
+def test_sync_dag_runs_inside_a_running_event_loop(monkeypatch):
+    calls = []
+
+    def search_wikipedia(query):
+        calls.append(query)
+        time.sleep(0.5 if query == "Slow topic" else 0.2)
+        return wiki_result(query)
+
+    monkeypatch.setattr(executor_module, "search_wikipedia", search_wikipedia)
+    monkeypatch.setattr(executor_module, "process_with_gpt4o", lambda prompt, user_query=None: f"Synthesised from: {prompt}")
+    plan = {"tool": "dag", "steps": [
+        {"id": "fox", "tool": "wiki", "data": "Red fox"},
+        {"id": "wolf", "tool": "wiki", "data": "Gray wolf"},
+        {"id": "slow", "tool": "wiki", "data": "Slow topic", "timeout": 0.3},
+        {"id": "answer", "tool": "gpt", "depends_on": ["fox", "wolf", "slow"], "data": "{fox} | {wolf} | {slow}"},
+    ]}
+
+    async def handler():  # Like a FastAPI endpoint calling the sync API
+        start = time.perf_counter()
+        return ExecutingAgent().execute(plan), time.perf_counter() - start
+
+    result, elapsed = asyncio.run(handler())
+    assert elapsed < 0.45, f"steps did not overlap ({elapsed:.2f}s)"
+    assert "About Red fox." in result["response"] and "About Gray wolf." in result["response"]
+    assert result["steps"] == {"fox": "ok", "wolf": "ok", "slow": "timed out after 0.3s", "answer": "ok"}
@@ -0,0 +1,114 @@
+import sys
+import os
+
+# Add the project root to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from types import SimpleNamespace
+
+import numpy as np
+from backend import gpt_handler
+from backend.tools import openai_client
+from backend.agents.executor import ExecutingAgent
+from backend.agents.planner import PlanningAgent
+from backend.tools.semantic_cache import SemanticCache, lexical_embedding, TEXT_CACHE_LEXICAL_SIMILARITY
+
+
+def lexical(text):
+    return "lexical", lexical_embedding(text)
+
+
+def topics(text):
+    # Stand-in for CLIP: paraphrases about fox diet land on the same vector
+    if "fox" in text and ("eat" in text or "diet" in text):
+        return "clip", np.array([1.0, 0.0, 0.0])
+    return "clip", np.array([0.0, 1.0, 0.0]) if "wolf" in text else np.array([0.0, 0.0, 1.0])
+
+
+def test_paraphrases_hit_and_unrelated_or_negated_queries_miss():
+    cache = SemanticCache(topics, {"clip": 0.9})
+    cache.store("What do red foxes eat?", "Red foxes are omnivores.", latency=1.5)
+    assert cache.lookup("red fox diet?") == "Red foxes are omnivores."
+    assert cache.lookup("Where do wolves live?") is None
+    # Same vector as the cached question, but the opposite question
+    assert cache.lookup("What don't red foxes eat?") is None
+    assert cache.lookup("What do red foxes never eat?") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["saved_latency_s"]) == (1, 3, 1.5)
+
+
+def test_lexical_fallback_only_serves_the_same_question():
+    cache = SemanticCache(lexical, {"lexical": TEXT_CACHE_LEXICAL_SIMILARITY})
+    cache.store("What do red foxes eat?", "Omnivores.")
+    cache.store("Do foxes eat voles?", "Yes.")
+    cache.store("How many wolves were in Yellowstone in 1995?", "Fourteen.")
+    assert cache.lookup("what do  red foxes eat") == "Omnivores."  # Case, punctuation and spacing
+    assert cache.lookup("What do arctic foxes eat?") is None
+    assert cache.lookup("Do voles eat foxes?") is None  # Same words, inverted question
+    assert cache.lookup("Don't foxes eat voles?") is None
+    assert cache.lookup("How many wolves were in Yellowstone in 1995") == "Fourteen."
+    assert cache.lookup("How many wolves were in Yellowstone in 2020?") is None
+
+
+def test_ttl_lru_and_errors(monkeypatch):
+    cache = SemanticCache(lexical, {"lexical": 0.85}, ttl=60, max_entries=2)
+    cache.store("a question about badgers", "❌ Error calling GPT-4o: timeout")
+    assert cache.stats()["entries"] == 0
+
+    cache.store("a question about badgers", "Badgers.")
+    cache.store("a question about otters", "Otters.")
+    assert cache.lookup("a question about badgers") == "Badgers."  # otters is now least recent
+    cache.store("a question about herons", "Herons.")
+    assert cache.stats()["evictions"] == 1
+    assert cache.lookup("a question about otters") is None
+    assert cache.stats()["index_bytes"] == 2 * 512 * 4
+
+    now = gpt_handler.time.time()
+    monkeypatch.setattr("backend.tools.semantic_cache.time.time", lambda: now + 61)
+    assert cache.lookup("a question about herons") is None
+    assert cache.stats()["expirations"] == 2
+
+
+def test_process_with_gpt4o_skips_repeat_calls(monkeypatch):
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Mostly rodents."))])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(openai_client, "_client", client)
+    monkeypatch.setattr(gpt_handler, "text_cache", SemanticCache(lexical, {"lexical": 0.85}))
+
+    assert gpt_handler.process_with_gpt4o("What do barn owls eat?") == "Mostly rodents."
+    assert gpt_handler.process_with_gpt4o("what do barn owls eat") == "Mostly rodents."
+    assert len(calls) == 1
+
+
+def test_answers_given_with_conversation_context_are_not_shared(monkeypatch):
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs["messages"][-1]["content"])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"Answer {len(calls)}."))])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(openai_client, "_client", client)
+    monkeypatch.setattr(gpt_handler, "text_cache", SemanticCache(lexical, {"lexical": 1.0}))
+    planner, executor = PlanningAgent(), ExecutingAgent()
+    question = "How do hedgehogs survive the winter?"
+
+    assert executor.execute(planner._create_gpt_plan(question, []))["response"] == "Answer 1."
+    assert executor.execute(planner._create_gpt_plan(question, []))["response"] == "Answer 1."
+    otters = [{"role": "user", "content": "Tell me about otters."}]
+    assert executor.execute(planner._create_gpt_plan(question, otters))["response"] == "Answer 2."
+
+    # The same follow-up means something different in every session
+    follow_up = "What do they eat?"
+    assert executor.execute(planner._create_gpt_plan(follow_up, []))["response"] == "Answer 3."
+    for n, topic in enumerate(("red foxes", "badgers"), start=4):
+        plan = planner._create_gpt_plan(follow_up, [{"role": "user", "content": f"Tell me about {topic}."}])
+        assert executor.execute(plan)["response"] == f"Answer {n}."
+    assert "Tell me about badgers." in calls[-1]
+    assert gpt_handler.text_cache.stats()["entries"] == 1
@@ -0,0 +1,56 @@
+import sys
+import os
+
+# Add the project root to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from backend.tools.semantic_cache import SemanticCache, lexical_embedding
+from backend.utils.conversation_store import SQLiteConversationStore
+from backend.utils.shared_state import SQLiteDatabase
+
+
+def lexical(text):
+    return "lexical", lexical_embedding(text)
+
+
+def in_child(fn):
+    """Run fn in a forked process and return its exit code."""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            fn()
+            os._exit(0)
+        except BaseException:
+            os._exit(1)
+    return os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1])
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_workers_share_conversations(tmp_path):
+    store = SQLiteConversationStore(str(tmp_path / "conversations.db"))
+    store.append("s", "user", "Where do badgers sleep?")  # Parent opens its connection before forking
+
+    assert in_child(lambda: store.append("s", "assistant", "In setts.")) == 0
+    assert [m["content"] for m in store.recent("s", 5)] == ["Where do badgers sleep?", "In setts."]
+
+
+def test_connections_are_reopened_after_fork(tmp_path, monkeypatch):
+    database = SQLiteDatabase(str(tmp_path / "state.db"), "CREATE TABLE IF NOT EXISTS t (x);")
+    parent = database.connection()
+    assert parent.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    monkeypatch.setattr(os, "getpid", lambda: -1)  # As seen from a forked child
+    assert database.connection() is not parent
+
+
+def test_workers_share_text_answers(tmp_path):
+    path = str(tmp_path / "text_cache.db")
+    worker_a = SemanticCache(lexical, {"lexical": 0.85}, path=path)
+    worker_b = SemanticCache(lexical, {"lexical": 0.85}, path=path)
+
+    worker_b.store("How long do hedgehogs hibernate?", "Roughly November to March.")
+    worker_a.store("What do red foxes eat?", "Omnivores.")
+    assert worker_a.lookup("how long do hedgehogs hibernate") == "Roughly November to March."
+    assert worker_b.lookup("what do red foxes eat") == "Omnivores."
+    assert worker_a.stats()["entries"] == 2  # Its own answer was not loaded twice
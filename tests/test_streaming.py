@@ -0,0 +1,68 @@
+import sys
+import os
+
+# Add the project root and backend directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+
+import backend.tools.openai_client as openai_client
+from backend.utils.conversation_store import MemoryConversationStore
+
+TOKENS = ["Red ", "foxes ", "are ", "omnivores."]
+
+
+class StreamingCompletions:
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+
+    async def create(self, stream=False, **kwargs):
+        assert stream, "the streaming endpoint should request a streamed completion"
+        return self._stream()
+
+    async def _stream(self):
+        for i, token in enumerate(TOKENS):
+            if i == self.fail_after:
+                raise RuntimeError("connection reset")
+            await asyncio.sleep(0.05)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+
+def stream_events(monkeypatch, completions, query):
+    monkeypatch.setattr(openai_client, "_async_client", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    import main
+    monkeypatch.setattr(main, "conversations", MemoryConversationStore())
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://ecobot") as http:
+            response = await http.post("/query/stream", data={"query": query})
+            assert response.headers["content-type"].startswith("application/x-ndjson")
+            return [json.loads(line) for line in response.text.splitlines() if line]
+
+    return main, asyncio.run(run())
+
+
+def test_stream_relays_deltas_then_done(monkeypatch):
+    main, events = stream_events(monkeypatch, StreamingCompletions(), "How do red foxes hunt in 2024?")
+
+    assert [e["text"] for e in events[:-1]] == TOKENS
+    done = events[-1]
+    assert done["type"] == "done"
+    assert done["response"] == "".join(TOKENS)
+    assert done["sources"] == []
+    assert 0 < done["ttft_ms"] < done["total_ms"]
+    assert main.conversations.recent(done["session_id"], 2)[1]["content"] == "".join(TOKENS)
+
+
+def test_stream_reports_errors_inline(monkeypatch):
+    _, events = stream_events(monkeypatch, StreamingCompletions(fail_after=2), "How do grey wolves hunt in 2023?")
+
+    assert events[-1]["type"] == "done"
+    assert events[-1]["response"].startswith("Red foxes ❌ Error calling GPT-4o: connection reset")
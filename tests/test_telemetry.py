@@ -0,0 +1,124 @@
+import sys
+import os
+
+# Add the project root and backend directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import asyncio
+import json
+import logging
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import backend.tools.openai_client as openai_client
+from backend.utils import telemetry
+from backend.utils.telemetry import SamplingProfiler, span, start_trace, traced
+
+
+class Completions:
+    async def create(self, **kwargs):
+        await asyncio.sleep(0.01)
+        message = SimpleNamespace(content="Hedgehogs hibernate in nests of leaves.")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def test_query_is_traced_and_exported(monkeypatch, caplog):
+    monkeypatch.setattr(openai_client, "_async_client", SimpleNamespace(chat=SimpleNamespace(completions=Completions())))
+    import main
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://ecobot") as http:
+            response = await http.post("/query/", data={"query": "Where do hedgehogs hibernate? (trace test)"},
+                                       headers={"X-Request-ID": "req-42"})
+            return response, await http.get("/metrics")
+
+    telemetry.logger.addHandler(caplog.handler)
+    try:
+        with caplog.at_level(logging.INFO, logger="ecobot.trace"):
+            response, metrics = asyncio.run(run())
+    finally:
+        telemetry.logger.removeHandler(caplog.handler)
+
+    assert response.headers["x-request-id"] == "req-42"
+    record = next(json.loads(r.message) for r in caplog.records if "req-42" in r.message)
+    stages = [s["stage"] for s in record["spans"]]
+    assert {"planner.plan", "evaluator.evaluate", "executor.execute", "gpt.answer", "openai.chat"} <= set(stages)
+    answer = next(s for s in record["spans"] if s["stage"] == "gpt.answer")
+    assert answer["parent"] == "executor.execute" and answer["out_size"] > 0
+
+    text = metrics.text
+    assert 'ecobot_stage_duration_seconds_count{stage="gpt.answer"}' in text
+    assert 'ecobot_openai_request_duration_seconds_bucket{model="gpt-4o-mini",outcome="ok",le="+Inf"}' in text
+    assert 'ecobot_http_requests_total{path="/query/",status="200"}' in text
+    assert 'ecobot_cache_hit_rate{cache="wiki"}' in text
+    assert "ecobot_http_requests_in_flight 1" in text  # The /metrics request itself
+
+
+def test_traced_generators_and_error_results():
+    @traced("test.stream")
+    async def stream():
+        yield "ab"
+        yield "cde"
+
+    @traced("test.fail")
+    def fail(query):
+        return "❌ Error: nothing found"
+
+    async def run():
+        trace = start_trace()
+        with span("test.outer"):
+            parts = [part async for part in stream()]
+            fail("query")
+        return parts, trace
+
+    parts, trace = asyncio.run(run())
+    assert parts == ["ab", "cde"]
+    by_stage = {s["stage"]: s for s in trace.spans}
+    assert by_stage["test.stream"]["out_size"] == 5 and by_stage["test.stream"]["parent"] == "test.outer"
+    assert by_stage["test.fail"]["error"].startswith("❌") and by_stage["test.fail"]["in_size"] == 5
+    assert 'ecobot_stage_errors_total{stage="test.fail"} 1' in telemetry.render_metrics()
+
+
+def test_sampling_profiler_sees_the_hot_function(tmp_path, monkeypatch):
+    def busy_loop():
+        deadline = time.perf_counter() + 0.2
+        while time.perf_counter() < deadline:
+            pass
+
+    profiler = SamplingProfiler(interval=0.002).start()
+    busy_loop()
+    profiler.stop()
+    assert "busy_loop" in profiler.folded()
+    monkeypatch.setattr(telemetry, "PROFILE_DIR", str(tmp_path))
+    assert open(profiler.save("req")).read() == profiler.folded()
+
+
+def test_client_request_id_cannot_choose_the_profile_path(tmp_path, monkeypatch):
+    import main
+    profiles = tmp_path / "profiles"
+    monkeypatch.setattr(telemetry, "PROFILE_DIR", str(profiles))
+    monkeypatch.setattr(telemetry, "PROFILE_MIN_MS", 0)
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://ecobot") as http:
+            headers = {"X-Request-ID": "../../escaped", "X-Profile": "1"}
+            ignored = await http.get("/metrics", headers=headers)  # X-Profile is off by default
+            monkeypatch.setattr(telemetry, "PROFILE_ENABLED", True)
+            profiled = await http.get("/metrics", headers=headers)
+            return ignored, profiled
+
+    ignored, profiled = asyncio.run(run())
+    assert ignored.headers["x-request-id"] != "../../escaped"
+    assert telemetry._REQUEST_ID.match(profiled.headers["x-request-id"])
+    assert len(os.listdir(profiles)) == 1  # Only the enabled request was profiled, inside PROFILE_DIR
+    assert not (tmp_path / "escaped.folded").exists()
+    for name in ("../escaped", "/tmp/escaped"):
+        with pytest.raises(ValueError):
+            SamplingProfiler().save(name)
@@ -0,0 +1,50 @@
+import sys
+import os
+
+# Add the project root to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+from backend.utils import token_budget
+from backend.utils.token_budget import count_tokens, fit_prompt, fit_messages
+
+
+@pytest.fixture(autouse=True)
+def small_budget(monkeypatch):
+    monkeypatch.setattr(token_budget, "_budgets", {"gpt-4o": 300})
+    monkeypatch.setattr(token_budget, "HISTORY_TOKEN_BUDGET", 100)
+
+
+def _words(prefix, n):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def test_prompt_within_budget_is_unchanged():
+    parts = {"system": "You are EcoBot.", "history": "user: hi", "query": "Where do otters live?"}
+    assert fit_prompt(parts, "gpt-4o") == parts
+
+
+def test_history_keeps_its_most_recent_end():
+    history = _words("old", 200) + " newest message"
+    fitted = fit_prompt({"history": history, "query": "And their diet?"}, "gpt-4o")
+    assert count_tokens(fitted["history"], "gpt-4o") <= 100
+    assert fitted["history"].endswith("newest message")
+    assert fitted["query"] == "And their diet?"
+
+
+def test_document_is_trimmed_before_the_query_and_system_prompt():
+    parts = {"system": "You are EcoBot.", "document": _words("page", 1000), "query": "Summarise the methods."}
+    fitted = fit_prompt(parts, "gpt-4o")
+    assert fitted["system"] == parts["system"] and fitted["query"] == parts["query"]
+    assert fitted["document"].startswith("page0 page1")
+    assert sum(count_tokens(text, "gpt-4o") for text in fitted.values()) <= 300
+
+
+def test_unbudgeted_messages_are_trimmed_before_the_call():
+    messages = [{"role": "system", "content": "You are EcoBot."},
+                {"role": "user", "content": _words("word", 2000)}]
+    fitted = fit_messages(messages, "gpt-4o")
+    assert fitted[0] == messages[0]
+    assert sum(count_tokens(m["content"], "gpt-4o") for m in fitted) <= 300
+    assert count_tokens(messages[1]["content"], "gpt-4o") > 300  # The caller's list is not modified
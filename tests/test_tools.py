@@ -1,39 +1,93 @@
 import sys
 import os
 
-# Add the project root to sys.path
+# Add the project root and benchmarks directory to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "benchmarks")))
+import asyncio
+import base64
 import pytest
-from backend.tools.image_tools import process_image
+from backend.agents.executor import ExecutingAgent
+from backend.agents.planner import PlanningAgent
+from backend.tools import wiki_tool
+from backend.tools.image_tools import encode_image
 from backend.tools.pdf_tools import extract_text_from_pdf
-from backend.tools.wiki_tool import fetch_wikipedia_summary
+from backend.tools.wiki_tool import WikiCache, search_wikipedia, fetch_full_page, afetch_full_page
+from stubs import MediaWikiStub
+
+ASSETS = os.path.join(os.path.dirname(__file__), "..", "assets")
 
 @pytest.fixture
 def sample_pdf():
     """Load a sample PDF for testing."""
-    with open(r"assests\cureus-0015-00000037574.pdf", "rb") as pdf_file:
+    with open(os.path.join(ASSETS, "cureus-0015-00000037574.pdf"), "rb") as pdf_file:
         return pdf_file.read()
 
 @pytest.fixture
 def sample_image():
     """Load a sample image for testing."""
-    with open(r"assests\pest-and-disease_turkey-tail_banner_1440x500.jpeg", "rb") as img_file:
+    with open(os.path.join(ASSETS, "pest-and-disease_turkey-tail_banner_1440x500.jpeg"), "rb") as img_file:
         return img_file.read()
 
-def test_process_image(sample_image):
-    """Test that image processing returns a response."""
-    response = process_image(sample_image)
-    assert isinstance(response, str), "Response should be a string"
-    assert len(response) > 0, "Response should not be empty"
+@pytest.fixture
+def wikipedia(monkeypatch):
+    """A local MediaWiki stand-in with an empty in-memory cache."""
+    stub = MediaWikiStub(latency=0)
+    monkeypatch.setattr(wiki_tool, "WIKIPEDIA_API", f"{stub.url}/w/api.php")
+    monkeypatch.setattr(wiki_tool, "wiki_cache", WikiCache(path=""))
+    yield stub
+    stub.close()
+
+def test_encode_image(sample_image):
+    """Test that images are encoded as base64 data URLs."""
+    url = encode_image(sample_image, "image/jpeg")
+    assert url.startswith("data:image/jpeg;base64,")
+    assert base64.b64decode(url.split(",", 1)[1]) == sample_image
 
 def test_extract_text_from_pdf(sample_pdf):
     """Test that text extraction from a PDF works."""
     text = extract_text_from_pdf(sample_pdf)
     assert isinstance(text, str), "Extracted text should be a string"
     assert len(text) > 0, "Extracted text should not be empty"
+    assert not text.startswith("❌")
+
+def test_search_wikipedia(wikipedia):
+    """Test the Wikipedia summary lookup end to end over HTTP."""
+    response = search_wikipedia("Red Fox")
+    assert response["title"] == "Red Fox"
+    assert len(response["summary"]) > 0, "Wikipedia summary should not be empty"
+    assert search_wikipedia("red fox") == response  # Cached
+    assert wikipedia.requests == 1
+
+def test_fetch_full_page(wikipedia):
+    """Test that full pages come back as clean text with their sections."""
+    response = fetch_full_page("Red fox")
+    assert "<" not in response["content"] and "Red fox lead paragraph." in response["content"]
+    assert len(response["content"]) <= wiki_tool.WIKI_FULL_PAGE_CHARS
+    assert response["sections"][0] == "Etymology"
+
+def test_fetch_full_page_sections(wikipedia):
+    """Only the lead and the sections the query asks about are fetched, without references or scripts."""
+    for response in (fetch_full_page("Red fox", "What does the red fox eat? Diet please"),
+                     asyncio.run(afetch_full_page("Red fox", "red fox diet"))):
+        content = response["content"]
+        assert content.startswith("Red fox lead paragraph.")
+        assert "Red fox diet paragraph 5.0." in content and "etymology" not in content
+        assert "[" not in content and "mw.loader" not in content and "Journal" not in content
+
+def test_whole_page_fetch_cleans_html(wikipedia):
+    response = fetch_full_page("Red fox", sections=False)
+    assert "Red fox conservation paragraph 8.2." in response["content"]
+    assert "Infobox" not in response["content"] and "Animalia" not in response["content"]
+    assert "mw.loader" not in response["content"] and "Journal of Stub Ecology" not in response["content"]
 
-# def test_fetch_wikipedia_summary():
-#     """Test Wikipedia API call."""
-#     response = fetch_wikipedia_summary("Red Fox")
-#     assert isinstance(response, str), "Response should be a string"
-#     assert len(response) > 0, "Wikipedia summary should not be empty"
+def test_full_article_question_fetches_only_the_asked_section(wikipedia):
+    """The planner separates the page from the question, so the executor fetches one section, not the page."""
+    plan = PlanningAgent()._create_wiki_plan("Show me the full article on the Red fox's diet", full_page=True)
+    assert plan["tool"] == "wiki_full" and plan["data"] == "Red fox"
+    for run in (lambda: ExecutingAgent().execute(plan), lambda: asyncio.run(ExecutingAgent().aexecute(plan))):
+        wiki_tool.wiki_cache.clear()
+        before = wikipedia.requests
+        response = run()["response"]
+        assert "Red fox diet paragraph 5.0." in response and "Red fox etymology paragraph" not in response
+        assert wikipedia.requests - before == 3  # Section index, lead, Diet
@@ -0,0 +1,165 @@
+import sys
+import os
+
+# Add the project root and backend directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import asyncio
+import io
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import backend.tools.openai_client as openai_client
+from backend.tools import image_tools
+from backend.tools.document_store import DocumentStore
+from backend.utils import uploads
+from backend.utils.conversation_store import MemoryConversationStore
+from backend.utils.uploads import UploadLimitMiddleware, UploadRejected, UploadStore
+
+ASSETS = os.path.join(os.path.dirname(__file__), "..", "assets")
+
+
+def test_repeat_upload_is_known_by_hash(tmp_path):
+    store = UploadStore(str(tmp_path / "uploads"))
+    first = store.save(io.BytesIO(b"%PDF-1.4 field notes"), "application/pdf")
+    second = store.save(io.BytesIO(b"%PDF-1.4 field notes"), "application/pdf")
+
+    assert not first["known"] and second["known"]
+    assert first["upload_id"] == second["upload_id"] == DocumentStore.document_id(b"%PDF-1.4 field notes")
+    assert open(first["path"], "rb").read() == b"%PDF-1.4 field notes"
+    assert store.get(first["upload_id"])["content_type"] == "application/pdf"
+    assert store.get("../../etc/passwd") is None
+    assert store.stats()["stored"] == 1 and store.stats()["dedup_rate"] == 0.5
+
+
+def test_oversized_upload_is_rejected_before_it_is_stored(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_MAX_IMAGE_BYTES", 1000)
+    monkeypatch.setattr(uploads, "UPLOAD_CHUNK_SIZE", 256)
+    store = UploadStore(str(tmp_path / "uploads"))
+    with pytest.raises(UploadRejected) as e:
+        store.save(io.BytesIO(b"\xff\xd8\xff" + bytes(2000)), "image/jpeg")
+    assert e.value.status == 413
+    assert not os.path.exists(store.root)
+    assert store.stats()["rejected"] == 1
+
+
+def test_least_recently_used_uploads_are_evicted(tmp_path):
+    store = UploadStore(str(tmp_path / "uploads"), max_bytes=350)
+    ids = []
+    for i in range(3):
+        ids.append(store.save(io.BytesIO(bytes([i]) * 100), "image/png")["upload_id"])
+        os.utime(store.path(ids[-1]), (i, i))
+    store.get(ids[0])  # Used again: now the most recent
+    store.save(io.BytesIO(b"x" * 100), "image/png")
+    assert [store.get(i) is not None for i in ids] == [True, False, True]
+
+
+def test_files_in_use_are_not_evicted(tmp_path, monkeypatch):
+    store = UploadStore(str(tmp_path / "uploads"), max_bytes=250)
+    pinned = store.save(io.BytesIO(b"a" * 100), "image/png", pin=True)["upload_id"]
+    recent = store.save(io.BytesIO(b"b" * 100), "image/png")["upload_id"]
+    os.utime(store.path(pinned), (0, 0))  # Oldest, but a request is still using it
+    listings = []
+    scandir = os.scandir
+    monkeypatch.setattr(uploads.os, "scandir", lambda path: listings.append(path) or scandir(path))
+
+    store.save(io.BytesIO(b"c" * 100), "image/png")
+    assert os.path.exists(store.path(pinned)) and os.path.exists(store.path(recent))  # recent: used within min_age
+    store.release(pinned)
+    store.save(io.BytesIO(b"d" * 100), "image/png")
+    assert not os.path.exists(store.path(pinned)) and store.stats()["evictions"] == 1
+
+    listings.clear()
+    store.max_bytes = 10_000
+    store.save(io.BytesIO(b"e" * 100), "image/png")
+    assert listings == []  # Under the limit: the directory is not listed
+
+
+def test_image_tools_accept_a_path():
+    path = os.path.join(ASSETS, "biotrove-test.jpeg")
+    with open(path, "rb") as f:
+        content = f.read()
+    assert image_tools.encode_image(path, "image/jpeg") == image_tools.encode_image(content, "image/jpeg")
+    from_path, from_bytes = image_tools.PreparedImage(path, "image/jpeg"), image_tools.PreparedImage(content, "image/jpeg")
+    assert from_path.original_bytes == len(content)
+    assert from_path.data_url("low") == from_bytes.data_url("low")
+
+
+class EchoCompletions:
+    def __init__(self):
+        self.prompts = []
+
+    async def create(self, **kwargs):
+        self.prompts.append(kwargs["messages"][-1]["content"])
+        message = SimpleNamespace(content=f"Answer {len(self.prompts)}.")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """The API with temporary upload/document stores, stubbed OpenAI and counted PDF extraction."""
+    import main
+    planner_module = sys.modules[type(main.planner).__module__]  # main imports the agents as top-level modules
+    documents = DocumentStore(str(tmp_path / "documents"))
+    extracted = []
+
+    def extract(source):
+        extracted.append(source)
+        return ["Badgers dig setts in woodland."]
+
+    monkeypatch.setattr(main, "upload_store", UploadStore(str(tmp_path / "uploads")))
+    monkeypatch.setattr(main, "document_store", documents)
+    monkeypatch.setattr(planner_module, "document_store", documents)
+    monkeypatch.setattr(planner_module, "extract_pages_from_pdf", extract)
+    monkeypatch.setattr(main, "conversations", MemoryConversationStore())
+    monkeypatch.setattr(openai_client, "_async_client", SimpleNamespace(chat=SimpleNamespace(completions=EchoCompletions())))
+    return SimpleNamespace(main=main, extracted=extracted)
+
+
+def test_reposted_pdf_skips_all_reprocessing(app):
+    pdf = ("notes.pdf", b"%PDF-1.4 badger survey", "application/pdf")
+
+    async def run():
+        transport = httpx.ASGITransport(app=app.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://ecobot") as http:
+            first = (await http.post("/query/", data={"query": "Where do badgers live?"}, files={"file": pdf})).json()
+            data = {"query": "What do badgers dig?", "session_id": first["session_id"]}
+            second = (await http.post("/query/", data=data, files={"file": pdf})).json()
+            by_id = (await http.post("/query/", data=dict(data, upload_id=first["upload_id"]))).json()
+            unknown = await http.post("/query/", data={"query": "Summarise", "upload_id": "0" * 64})
+            return first, second, by_id, unknown
+
+    first, second, by_id, unknown = asyncio.run(run())
+    assert len(app.extracted) == 1 and isinstance(app.extracted[0], str)  # Extracted from the stored file's path
+    assert first["doc_id"] == second["doc_id"] == first["upload_id"]
+    assert by_id["memoised"] is True and by_id["response"] == second["response"]
+    assert unknown.status_code == 404 and "Unknown upload" in unknown.json()["error"]
+    assert app.main.upload_store.stats()["known"] == 1
+    assert app.main.upload_store._pins == {}  # Released when each request finished
+
+
+def test_oversized_request_gets_413(app):
+    limited = UploadLimitMiddleware(app.main.app, max_bytes=10_000)
+
+    async def run():
+        transport = httpx.ASGITransport(app=limited)
+        async with httpx.AsyncClient(transport=transport, base_url="http://ecobot") as http:
+            declared = await http.post("/query/", data={"query": "Identify"},
+                                       files={"file": ("big.jpg", bytes(20_000), "image/jpeg")})
+
+            async def chunks():  # No Content-Length: counted as it streams in
+                yield b"--b\r\nContent-Disposition: form-data; name=\"query\"\r\n\r\nhi\r\n"
+                for _ in range(10):
+                    yield bytes(4096)
+
+            streamed = await http.post("/query/", content=chunks(),
+                                       headers={"content-type": "multipart/form-data; boundary=b"})
+            return declared, streamed
+
+    declared, streamed = asyncio.run(run())
+    assert declared.status_code == streamed.status_code == 413
+    assert "too large" in streamed.json()["error"]
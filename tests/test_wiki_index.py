@@ -0,0 +1,128 @@
+import sys
+import os
+
+# Add the project root and benchmarks directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "benchmarks")))
+import bz2
+import json
+import time
+import pytest
+from backend.tools import wiki_tool
+from backend.tools.wiki_index import WikiIndex, build_index, wikitext_sections
+from backend.tools.wiki_tool import WikiCache
+from stubs import write_wikipedia_dump
+
+
+@pytest.fixture
+def dump(tmp_path):
+    path = tmp_path / "dump.xml.bz2"
+    with bz2.open(path, "wb") as f:
+        write_wikipedia_dump(f, species=30, other=10)
+    return str(path)
+
+
+@pytest.fixture
+def index(dump, tmp_path):
+    path = str(tmp_path / "wiki_index.db")
+    build_index(dump, path, batch=7)
+    return WikiIndex(path)
+
+
+@pytest.fixture
+def offline(index, monkeypatch, tmp_path):
+    """wiki_tool backed by the built index, with every HTTP call failing."""
+    def no_network(*args, **kwargs):
+        raise AssertionError("live API called")
+
+    monkeypatch.setattr(wiki_tool, "wiki_index", index)
+    monkeypatch.setattr(wiki_tool.requests, "get", no_network)
+    monkeypatch.setattr(wiki_tool, "wiki_cache", WikiCache(path=str(tmp_path / "wiki.db"), ttl=60))
+    return index
+
+
+def test_build_keeps_taxa_and_their_redirects(index):
+    assert index.stats()["pages"] == 30
+    assert index.stats()["redirects"] == 30
+    assert index.title("Town 3") is None
+    assert index.title("Stubia fox")["title"] == "Stub fox"
+    assert index.title("stub_FOX")["url"] == "https://en.wikipedia.org/wiki/Stub_fox"
+
+
+def test_interrupted_build_resumes(dump, tmp_path):
+    path = str(tmp_path / "wiki_index.db")
+    first = build_index(dump, path, batch=5, limit=25)
+    assert not first["done"]
+    second = build_index(dump, path, batch=5)
+    assert second["done"] and second["resumed_at"] > 0
+    assert second["pages"] == 30 and second["skipped"] == 10
+    assert build_index(dump, path)["seconds"] == 0.0  # Already finished
+    assert WikiIndex(path).stats()["pages"] == 30
+
+
+def test_search_free_text(index):
+    assert index.search("What is the habitat of the stub fox?")["title"] == "Stub fox"
+    assert index.search("animal12 forests")["title"] == "Stub animal12"  # All terms, in title or lead
+    assert index.search("quokka marsupial") is None
+    assert index.search("arctic fox") is None  # Only "fox" matches: left to the live API
+    assert wiki_tool._offline(index.search, "arctic fox", 3) is None
+    summary = index.search("Stub fox", sentences=1)["summary"]
+    assert summary.startswith("The stub fox") and "{{" not in summary and "[[" not in summary
+
+
+def test_wikitext_sections_drop_markup():
+    lead, sections = wikitext_sections(
+        "{{Speciesbox|name=X}}\n'''X''' is a [[fox|small fox]].<ref>cite</ref>\n"
+        "== Diet ==\nEats {{convert|2|kg}} of [[vole]]s.\n== References ==\n{{reflist}}\n"
+    )
+    assert lead == "X is a small fox."
+    assert sections == [("Diet", "Eats of voles.")]
+
+
+def test_cirrussearch_json_dump(tmp_path):
+    path = tmp_path / "cirrus.json"
+    docs = [
+        {"index": {"_id": "7"}},
+        {"title": "Snow leopard", "namespace": 0, "version": 70, "timestamp": "2025-02-01T00:00:00Z",
+         "opening_text": "The snow leopard is a species of large cat.",
+         "text": "The snow leopard is a species of large cat. It lives in the mountains of Central Asia.",
+         "template": ["Template:Speciesbox"], "category": ["Felids"], "redirect": [{"namespace": 0, "title": "Ounce"}]},
+        {"index": {"_id": "8"}},
+        {"title": "Oslo", "namespace": 0, "text": "Oslo is a city.", "template": [], "category": ["Cities"]},
+    ]
+    path.write_text("\n".join(json.dumps(d) for d in docs) + "\n")
+    index_path = str(tmp_path / "wiki_index.db")
+    assert build_index(str(path), index_path)["pages"] == 1
+    index = WikiIndex(index_path)
+    result = index.title("Ounce")
+    assert result["pageid"] == 7 and result["title"] == "Snow leopard"
+    assert index.document("snow leopard")["sections"] == [["Article", "It lives in the mountains of Central Asia."]]
+
+
+def test_wiki_tool_answers_offline(offline):
+    assert wiki_tool.search_wikipedia("stub animal5")["title"] == "Stub animal5"
+    pageid = offline.title("Stub fox")["pageid"]
+    assert wiki_tool.get_page_details(pageid, 3)["title"] == "Stub fox"
+    batch = wiki_tool.batch_page_details(["Stubia fox", pageid])
+    assert all(result["title"] == "Stub fox" for result in batch.values())
+
+
+def test_full_page_offline_picks_sections(offline):
+    result = wiki_tool.fetch_full_page("Stub fox", "stub fox diet")
+    assert result["sections"][0] == "Etymology"
+    assert "Diet\n\n" in result["content"] and "Etymology\n\n" not in result["content"]
+    whole = wiki_tool.fetch_full_page("Stub fox", max_chars=300)
+    assert len(whole["content"]) == 300
+
+
+def test_miss_without_live_fallback_is_404(offline, monkeypatch):
+    monkeypatch.setattr(wiki_tool, "WIKI_LIVE_FALLBACK", False)
+    assert wiki_tool.search_wikipedia("quokka marsupial")["status"] == 404
+
+
+def test_lookups_are_sub_millisecond(index):
+    index.search("Stub fox")
+    start = time.perf_counter()
+    for i in range(1, 30):
+        assert index.search(f"Stub animal{i}") is not None
+    assert (time.perf_counter() - start) / 29 < 0.001
@@ -0,0 +1,146 @@
+import sys
+import os
+
+# Add the project root to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import json
+import re
+import pytest
+from backend.tools import wiki_tool
+from backend.tools.wiki_tool import WikiCache
+
+SEARCH = {"query": {"search": [{"pageid": 26841}]}}
+PAGE = {"query": {"pages": {"26841": {
+    "title": "Red fox", "extract": "The red fox is the largest of the true foxes.",
+    "fullurl": "https://en.wikipedia.org/wiki/Red_fox",
+    "revisions": [{"timestamp": "2025-01-01T00:00:00Z", "revid": 1}]
+}}}}
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def calls(monkeypatch, tmp_path):
+    """Route wiki_tool's HTTP calls to canned responses and record them."""
+    made = []
+
+    def fake_get(url, params=None, **kwargs):
+        made.append(params)
+        if params.get("list") == "search":
+            return FakeResponse(SEARCH)
+        return FakeResponse(PAGE)
+
+    monkeypatch.setattr(wiki_tool.requests, "get", fake_get)
+    monkeypatch.setattr(wiki_tool, "wiki_cache", WikiCache(path=str(tmp_path / "wiki.db"), ttl=60))
+    return made
+
+
+def test_search_is_single_round_trip(calls):
+    result = wiki_tool.search_wikipedia("red fox")
+    assert result["pageid"] == 26841
+    assert len(calls) == 1
+    assert calls[0]["generator"] == "search"
+
+
+def test_legacy_two_step_search(calls):
+    result = wiki_tool.search_wikipedia("red fox", single_request=False)
+    assert result["title"] == "Red fox"
+    assert len(calls) == 2
+
+
+def test_repeat_query_served_from_cache(calls):
+    first = wiki_tool.search_wikipedia("Red  Fox")
+    second = wiki_tool.search_wikipedia("red fox")
+    assert first == second
+    assert len(calls) == 1
+    assert wiki_tool.wiki_cache_stats()["memory_hits"] == 1
+
+
+def test_disk_tier_survives_restart(calls, tmp_path):
+    wiki_tool.search_wikipedia("red fox")
+    wiki_tool.wiki_cache = WikiCache(path=str(tmp_path / "wiki.db"), ttl=60)
+    wiki_tool.search_wikipedia("red fox")
+    assert len(calls) == 1
+    assert wiki_tool.wiki_cache_stats()["disk_hits"] == 1
+
+
+def test_stale_entry_revalidated_by_revision(calls):
+    wiki_tool.wiki_cache.ttl = 0
+    wiki_tool.search_wikipedia("red fox")
+    calls.clear()
+    result = wiki_tool.search_wikipedia("red fox")
+    assert result["title"] == "Red fox"
+    assert [c["prop"] for c in calls] == ["revisions"]
+    assert wiki_tool.wiki_cache_stats()["revalidated"] == 1
+
+
+def test_batch_resolves_redirects_and_missing(calls, monkeypatch):
+    batch = {"query": {
+        "normalized": [{"from": "red fox", "to": "Red fox"}],
+        "redirects": [{"from": "Vulpes lagopus", "to": "Arctic fox"}],
+        "pages": {
+            "26841": PAGE["query"]["pages"]["26841"] | {"pageid": 26841},
+            "1234": PAGE["query"]["pages"]["26841"] | {"pageid": 1234, "title": "Arctic fox"},
+            "-1": {"title": "Nonexistent fox", "missing": ""},
+        }
+    }}
+    monkeypatch.setattr(wiki_tool.requests, "get", lambda url, params=None, **kw: calls.append(params) or FakeResponse(batch))
+
+    results = wiki_tool.batch_page_details(["red fox", "Vulpes lagopus", "Nonexistent fox"])
+    assert len(calls) == 1
+    assert calls[0]["titles"] == "red fox|Vulpes lagopus|Nonexistent fox"
+    assert results["red fox"]["pageid"] == 26841
+    assert results["Vulpes lagopus"]["title"] == "Arctic fox"
+    assert results["Nonexistent fox"]["status"] == 404
+
+    wiki_tool.batch_page_details(["red fox"])
+    assert len(calls) == 1  # served from cache
+
+
+def test_lru_eviction_counted():
+    cache = WikiCache(path="", max_entries=2)
+    for i in range(3):
+        cache.set(f"k{i}", {"value": i})
+    assert cache.get("k0") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_streamed_field_survives_chunk_boundaries():
+    """Escapes and surrogate pairs split across chunks decode the same as in one piece."""
+    text = 'Vulpes "vulpes" \\ café 🦊\nnext line' * 3
+    body = json.dumps({"query": {"pages": [{"title": "Red fox", "extract": text}]}}).encode()
+    reader = wiki_tool._StreamedField("extract", 10_000, html=False)
+    done = False
+    for i in range(len(body)):
+        done = reader.feed(body[i:i + 1])
+        if done:
+            break
+    assert done and not reader.stopped_early
+    assert reader.text() == re.sub(r'\n\s*\n\s*', '\n\n', text).strip()
+
+
+def test_streamed_field_stops_at_budget():
+    html = "<p>" + "word " * 20000 + "</p>"
+    body = json.dumps({"parse": {"title": "Red fox", "text": html}}).encode()
+    reader = wiki_tool._StreamedField("text", 500, html=True)
+    chunks = [body[i:i + 4096] for i in range(0, len(body), 4096)]
+    read = next(n for n, chunk in enumerate(chunks, 1) if reader.feed(chunk))
+    assert read == 1 and reader.stopped_early
+    assert len(reader.text()) <= 500
+
+
+def test_clean_html_drops_scripts_styles_and_references():
+    html = ('<style>.x{color:red}</style><p>The red fox<sup class="reference">[1]</sup> hunts.</p>'
+            '<script>var a = 1;</script><table><tr><td>Infobox</td></tr></table>'
+            '<div class="reflist"><ol class="references"><li>Ref</li></ol></div><p>Second &amp; last.</p>')
+    assert wiki_tool.clean_html(html) == "The red fox hunts.\n\nSecond & last."